@@ -7,6 +7,7 @@
 
 from collections import defaultdict
 import json
+import os
 
 def parse_history_file(file_path):
     """解析历史数据文件"""
@@ -111,7 +112,8 @@ def analyze_2d_transition(data, dim1_name, dim1_func, dim2_name, dim2_func):
     return high_freq
 
 def main():
-    file_path = r'D:\ideaworkspace\daletou\daletou_history_full.txt'
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    file_path = os.path.join(base_dir, 'daletou_history_full.txt')
     print("开始解析历史数据...")
     data = parse_history_file(file_path)
     print(f"解析完成，共 {len(data)} 期数据")
@@ -147,7 +149,8 @@ def main():
                     if prob >= 0.10:  # 只保存概率>=10%的
                         output[combo_name][item['curr']][next_key] = round(prob, 4)
     
-    output_file = r'D:\ideaworkspace\daletou\2d_combined_transitions.json'
+    # 仅作为分析报告导出；评分使用的转移表由 transition_tables 从历史数据自动生成
+    output_file = os.path.join(base_dir, '2d_combined_transitions.json')
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(output, f, ensure_ascii=False, indent=2)
     
@@ -6,17 +6,54 @@ from datetime import datetime
 import pickle
 import os
 import json
+import threading
 from model_engine import DaletouPredictor
+from startup_profile import timed, report as startup_report
 
 app = Flask(__name__)
 CORS(app)
 
-# 初始化预测器
-predictor = DaletouPredictor()
+
+class LazyPredictor:
+    """首次访问属性时才构建 DaletouPredictor（解析历史、打开模型制品），worker 启动不做任何模型工作"""
+
+    def __init__(self):
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _get(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    with timed('build predictor'):
+                        instance = DaletouPredictor()
+                    print(instance.format_artifact_report(), flush=True)
+                    object.__setattr__(self, '_instance', instance)
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get(), name, value)
+
+
+# 初始化预测器（延迟到第一个需要它的请求）
+predictor = LazyPredictor()
 
 # 任务状态追踪
 active_tasks = set()
 
+@app.route('/api/startup', methods=['GET'])
+def startup_profile():
+    """启动剖析：各阶段耗时，以及模型制品各组件的加载状态（预测器未构建时为空）"""
+    instance = predictor._instance
+    return jsonify({
+        'success': True,
+        'stages': startup_report(),
+        'artifacts': instance.artifact_report() if instance is not None else None
+    })
+
 @app.route('/api/cancel', methods=['POST'])
 def cancel_task():
     data = request.json
@@ -130,11 +167,21 @@ def predict():
     period = data.get('period', '')
     kill_red = data.get('kill_red', [])
     kill_blue = data.get('kill_blue', [])
+    must_red = data.get('must_red', [])
+    must_blue = data.get('must_blue', [])
     sum_min = data.get('sum_min')
     sum_max = data.get('sum_max')
     odd_even_ratio = data.get('odd_even_ratio')
     reference_urls = data.get('reference_urls', [])
     include_compound = data.get('include_compound', False)  # 新增：是否计算8+3复试
+    mode = data.get('mode', 'exhaustive')  # 单式评分方式：exhaustive / batch / sampled
+    n_candidates = int(data.get('n_candidates', 3000))
+    if mode not in DaletouPredictor.PREDICT_MODES:
+        active_tasks.discard(task_id)
+        return jsonify({
+            'success': False,
+            'error': f"未知的生成模式: {mode}（可选: {', '.join(DaletouPredictor.PREDICT_MODES)}）"
+        }), 400
 
     def generate():
         try:
@@ -169,10 +216,12 @@ def predict():
             pred_count = 0
             for pred in predictor.predict(
                 period=period, kill_red=kill_red, kill_blue=kill_blue,
+                must_red=must_red, must_blue=must_blue,
                 n_combinations=20, n_compound=n_compound,
                 sum_range=sum_range,
                 odd_even_ratio=odd_even_ratio, reference_urls=reference_urls,
-                cancel_check=lambda: is_task_cancelled(task_id)
+                cancel_check=lambda: is_task_cancelled(task_id),
+                mode=mode, n_candidates=n_candidates
             ):
                 if is_task_cancelled(task_id):
                     print(f"[INFO] 任务被取消", flush=True)
@@ -261,6 +310,10 @@ def train_model():
                 'model_info': predictor.get_model_info()
             })
         
+        model_mode = (request.json or {}).get('model_mode') if request.is_json else None
+        if model_mode in ('stacking', 'mlp', 'forest'):
+            predictor.model_mode = model_mode
+        
         full_data = load_full_history()
         predictor.train(full_data, train_ensemble=True)
         
@@ -284,6 +337,9 @@ def validate():
     
     start_period = data.get('start_period', '25080')
     end_period = data.get('end_period', '25150')
+    walk_forward = bool(data.get('walk_forward', False))  # 逐期增量训练（否则仅加载按期缓存）
+    workers = data.get('workers')  # 回测进程数，默认 DLT_BACKTEST_WORKERS / CPU 核数
+    workers = int(workers) if workers else None
 
     def generate():
         try:
@@ -291,66 +347,11 @@ def validate():
                 yield f"data: {json.dumps({'error': '模型未训练', 'need_training': True})}\n\n"
                 return
 
-            val_data = predictor.history_df[(predictor.history_df['period'] >= int(start_period)) & (predictor.history_df['period'] <= int(end_period))].copy()
-            
-            # 使用临时的子预测器进行回测
-            sub_predictor = DaletouPredictor()
-            from collections import Counter
-            hits_dist = Counter()
-            total_red_hits = 0
-            total_blue_hits = 0
-            count = 0
-
-            for i, row in val_data.iterrows():
-                if is_task_cancelled(task_id): break
-                
-                p = row['period']
-                act_r = row['red']
-                act_b = row['blue']
-                train_df = predictor.history_df[predictor.history_df['period'] < p]
-                
-                # 快速预测逻辑
-                sub_predictor.history_df = train_df
-                sub_predictor.is_trained = True
-                sub_predictor._build_markov_chain()
-                sub_predictor._learn_patterns()
-                sub_predictor._init_dynamic_weights()
-                sub_predictor.load_state(tag=str(p)) # 尝试加载
-                
-                preds = list(sub_predictor.predict(str(p), n_combinations=20, is_backtest=True))
-                if not preds: continue
-                
-                count += 1
-                best_pred = preds[0]
-                r_hits = len(set(act_r) & set(best_pred['red']))
-                b_hits = len(set(act_b) & set(best_pred['blue']))
-                total_red_hits += r_hits
-                total_blue_hits += b_hits
-                
-                # 统计最高命中用于覆盖率
-                br, bb = 0, 0
-                for pr in preds:
-                    hr = len(set(act_r) & set(pr['red']))
-                    hb = len(set(act_b) & set(pr['blue']))
-                    if hr > br or (hr == br and hb > bb): br, bb = hr, hb
-                hits_dist[f"R{br}+B{bb}"] += 1
-                
-                # 构建结果项
-                res_item = {
-                    'type': 'period_result',
-                    'period': str(p),
-                    'actual_red': act_r,
-                    'actual_blue': act_b,
-                    'predicted_red': best_pred['red'],
-                    'predicted_blue': best_pred['blue'],
-                    'red_hits': r_hits,
-                    'blue_hits': b_hits,
-                    'reason': best_pred.get('reason', ''),
-                    'current_avg_red': round(total_red_hits / count, 2),
-                    'current_avg_blue': round(total_blue_hits / count, 2),
-                    'current_core_cov': sub_predictor._calc_temp_coverage(hits_dist, count)
-                }
-                yield f"data: {json.dumps(res_item)}\n\n"
+            # 各期在进程池中并行回测（子预测器不覆盖 latest），按期号顺序推送
+            for res_item in predictor.iter_validation(int(start_period), int(end_period), train_ensemble=walk_forward,
+                                                      cancel_check=lambda: is_task_cancelled(task_id),
+                                                      walk_forward=walk_forward, workers=workers):
+                yield f"data: {json.dumps(dict(res_item, type='period_result'))}\n\n"
 
         except Exception as e:
             import traceback
@@ -361,6 +362,23 @@ def validate():
 
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
+@app.route('/api/backtests', methods=['GET'])
+def list_backtests():
+    """已存储的回测（按时间倒序），?run_id= 时返回该次回测的逐期结果"""
+    store = predictor.backtest_store
+    run_id = request.args.get('run_id')
+    if run_id:
+        return jsonify({'success': True, 'run_id': run_id, 'results': store.run_results(run_id)})
+    return jsonify({'success': True, 'runs': store.runs()})
+
+@app.route('/api/backtests/diff', methods=['GET'])
+def diff_backtests():
+    """逐期对比两次回测 (?a=run_id&b=run_id)"""
+    a, b = request.args.get('a'), request.args.get('b')
+    if not a or not b:
+        return jsonify({'success': False, 'error': '需要参数 a 与 b'}), 400
+    return jsonify(dict(predictor.backtest_store.diff(a, b), success=True))
+
 @app.route('/api/export', methods=['POST'])
 def export_combinations():
     """导出过滤后的号码组合"""
@@ -374,6 +392,8 @@ def export_combinations():
         # ... (保持参数获取逻辑不变)
         kill_red = data.get('kill_red', [])
         kill_blue = data.get('kill_blue', [])
+        must_red = data.get('must_red', [])
+        must_blue = data.get('must_blue', [])
         sum_min = data.get('sum_min')
         sum_max = data.get('sum_max')
         odd_even_ratio = data.get('odd_even_ratio')
@@ -390,7 +410,9 @@ def export_combinations():
             kill_blue=kill_blue,
             sum_range=sum_range,
             odd_even_ratio=odd_even_ratio,
-            cancel_check=lambda: is_task_cancelled(task_id)
+            cancel_check=lambda: is_task_cancelled(task_id),
+            must_red=must_red,
+            must_blue=must_blue
         )
         
         if filtered_count is None: # 表示被中途停止
@@ -434,6 +456,8 @@ def query_combination():
         blue_numbers = data.get('blue_numbers', [])
         kill_red = data.get('kill_red', [])
         kill_blue = data.get('kill_blue', [])
+        must_red = data.get('must_red', [])
+        must_blue = data.get('must_blue', [])
         sum_min = data.get('sum_min')
         sum_max = data.get('sum_max')
         odd_even_ratio = data.get('odd_even_ratio')
@@ -473,7 +497,9 @@ def query_combination():
             kill_blue=kill_blue,
             sum_range=sum_range,
             odd_even_ratio=odd_even_ratio,
-            cancel_check=lambda: is_task_cancelled(task_id)
+            cancel_check=lambda: is_task_cancelled(task_id),
+            must_red=must_red,
+            must_blue=must_blue
         )
         
         if result is None:
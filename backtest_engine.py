@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+并行走查回测引擎
+1. 待回测的期按块分配到进程池：默认每 10 期一块；逐期增量训练（walk_forward）时每个 worker 一段连续区间，
+   避免打断增量训练链。块内按期顺序执行，每块使用一个全新的子预测器（结果与执行顺序、worker 数无关）
+2. worker 启动时接收一次列式历史（期号 / 日期 / 红球 / 蓝球数组），各期只按自己的截止期号切片
+3. 每期完成即经队列回传，主进程按期号顺序缓冲后逐条产出
+4. cancel_check 返回 True 时通知 worker 不再开始新的期，并取消尚未开始的块
+5. workers<=1 时在当前进程内顺序执行
+6. prefix_state=True（默认）时子预测器的历史取 PrefixHistory 的前缀视图：列式数组、冷热号、末期特征、
+   相似期次按前缀直接得出，马尔可夫计数与形态记忆从上一期增量更新，不再逐期重建
+7. 每期结果附带全部投注（tickets），奖级统计见 prize_metrics
+8. 每期结果附带实际使用的模型状态（model_state）；沿用块内上一期状态的期补打期号标签，重跑时载入同一状态
+   （各 worker 直接写共享注册表，index.json 的更新由注册表的跨进程文件锁串行化）
+"""
+
+import math
+import multiprocessing as mp
+import os
+import queue as queue_module
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from history_arrays import HistoryArrays
+from prefix_state import PrefixHistory
+from stacking_trainer import default_workers
+
+BLOCK_SIZE = 10
+
+
+def backtest_workers():
+    """回测并行度：环境变量 DLT_BACKTEST_WORKERS，否则同训练并行度"""
+    try:
+        return max(1, int(os.environ.get('DLT_BACKTEST_WORKERS', '')))
+    except ValueError:
+        return default_workers()
+
+
+def plan_blocks(n, workers, walk_forward=False, block_size=BLOCK_SIZE):
+    """将 n 个待回测期切分为 [(起, 止), ...]"""
+    if n <= 0:
+        return []
+    size = math.ceil(n / max(1, workers)) if walk_forward else block_size
+    return [(s, min(s + size, n)) for s in range(0, n, size)]
+
+
+def history_columns(df):
+    """history_df → 列式数组（传给 worker 的共享历史）"""
+    arrays = HistoryArrays.from_df(df)
+    return {'period': arrays.periods, 'date': list(arrays.dates), 'red': arrays.red, 'blue': arrays.blue}
+
+
+def history_frame(columns):
+    """列式数组 → 与 history_df 同结构的 DataFrame（period/date/red/blue）"""
+    n = len(columns['period'])
+    return pd.DataFrame({
+        'period': np.asarray(columns['period'], dtype=np.int64),
+        'date': columns['date'] if len(columns['date']) == n else [''] * n,
+        'red': np.asarray(columns['red']).tolist(),
+        'blue': np.asarray(columns['blue']).tolist()
+    })
+
+
+class PeriodRunner:
+    """在截断历史上回测单期（一个进程内复用同一份历史）"""
+
+    def __init__(self, columns, periods, options):
+        self.history_df = history_frame(columns)
+        self.prefix = PrefixHistory(self.history_df) if options.get('prefix_state', True) else None
+        self.periods = list(periods)
+        self.options = options
+        self.predictor = None
+
+    def new_predictor(self):
+        from model_engine import DaletouPredictor
+        # 不解析历史文件（历史由 columns 提供），不自动覆盖 latest
+        predictor = DaletouPredictor(history_path='')
+        predictor.autosave = False
+        if self.options.get('assets_dir') and self.options['assets_dir'] != predictor.assets_dir:
+            predictor.assets_dir = self.options['assets_dir']
+            predictor.load_state()
+        if self.options.get('train_workers'):
+            predictor.train_workers = self.options['train_workers']
+        return predictor
+
+    def run(self, index, block_start):
+        """回测第 index 个待测期；无预测或出错时返回 None"""
+        from model_engine import ENSEMBLE_AVAILABLE
+        opts = self.options
+        if self.predictor is None or index == block_start:
+            self.predictor = self.new_predictor()
+        predictor = self.predictor
+        p = self.periods[index]
+        try:
+            if self.prefix is not None:
+                t = self.prefix.index_of(p)
+                predictor.set_history_prefix(self.prefix, t)
+                train_df, row = predictor.history_df, self.history_df.iloc[t]
+            else:
+                train_df = self.history_df[self.history_df['period'] < p]
+                row = self.history_df[self.history_df['period'] == p].iloc[0]
+                predictor.history_df = train_df
+            predictor.is_trained = True
+            predictor.components.ensure_all(('markov', 'patterns', 'dynamic_weights'))
+
+            # 加载或训练模型
+            predictor.model_mode = opts['model_mode']
+            if opts['walk_forward'] and opts['train_ensemble'] and ENSEMBLE_AVAILABLE:
+                predictor._update_walk_forward(train_df)
+                # 走查链上的模型取决于分块起点，不作为可复用的状态
+                model_state = None
+            else:
+                has_cached = predictor.load_state(tag=str(p)) or predictor.load_matching_state(str(p))
+                predictor.model_mode = opts['model_mode']
+                if not has_cached and opts['train_ensemble'] and ENSEMBLE_AVAILABLE and \
+                        (index - block_start) % BLOCK_SIZE == 0:
+                    predictor._build_number_models(train_df)
+                    predictor.save_state(tag=str(p))
+                model_state = predictor.state_digest
+                if model_state is None and not (predictor.stacking_meta_model or predictor.multilabel_model is not None
+                                                or predictor.blue_lstm_model is not None):
+                    model_state = 'none'  # 没有任何号码模型
+                # 沿用块内上一期（或 latest）状态的期补上期号标签：重跑时载入同一状态，结果键可预先得出
+                if model_state not in (None, 'none') and not has_cached and predictor.registry.digest(p) != model_state:
+                    predictor.registry.tag(str(p), model_state)
+
+            preds = list(predictor.predict(str(p), n_combinations=20, is_backtest=True,
+                                           mode=opts.get('predict_mode', 'exhaustive')))
+            if not preds:
+                return None
+
+            act_r, act_b = list(row['red']), list(row['blue'])
+            # 20 组中的最佳命中（先比红球再比蓝球）
+            br, bb = 0, 0
+            for pr in preds:
+                hr = len(set(act_r) & set(pr['red']))
+                hb = len(set(act_b) & set(pr['blue']))
+                if hr > br or (hr == br and hb > bb): br, bb = hr, hb
+            best_pred = preds[0]
+            return {
+                'period': str(p),
+                'actual_red': act_r,
+                'actual_blue': act_b,
+                'predicted_red': best_pred['red'],
+                'predicted_blue': best_pred['blue'],
+                'red_hits': len(set(act_r) & set(best_pred['red'])),
+                'blue_hits': len(set(act_b) & set(best_pred['blue'])),
+                'reason': best_pred.get('reason', ''),
+                'best_hits': [br, bb],
+                # 本期实际使用的模型状态（注册表内容哈希，结果复用的键）
+                'model_state': model_state,
+                # 全部投注（复式保留原样，由 prize_metrics 展开），用于奖级统计
+                'tickets': [{'red': list(pr['red']), 'blue': list(pr['blue'])} for pr in preds]
+            }
+        except Exception as e:
+            print(f"Error {p}: {e}")
+            return None
+
+
+# --- worker 进程 ---
+
+_WORKER = {}
+
+
+def _init_worker(columns, periods, options, cancel_event, results):
+    _WORKER['runner'] = PeriodRunner(columns, periods, options)
+    _WORKER['cancel'] = cancel_event
+    _WORKER['results'] = results
+
+
+def _run_block(start, stop):
+    runner = _WORKER['runner']
+    for index in range(start, stop):
+        if _WORKER['cancel'].is_set():
+            break
+        _WORKER['results'].put((index, runner.run(index, start)))
+
+
+def run_backtest(history_df, periods, model_mode='stacking', assets_dir=None, train_ensemble=True,
+                 walk_forward=False, workers=None, cancel_check=None, on_result=None, prefix_state=True,
+                 predict_mode='exhaustive'):
+    """按 periods 顺序逐期产出回测结果 dict（无预测或出错的期跳过）
+
+    Args:
+        history_df: 完整历史（各期只使用期号小于自身的部分）
+        periods: 待回测期号（升序）
+        workers: 进程数，默认 backtest_workers()；<=1 时在当前进程内执行
+        cancel_check: 返回 True 时停止（已在进行中的期在 worker 内跑完后丢弃）
+        on_result: 每期结果一到达即回调（不等待前面的期，用于及时持久化）
+        prefix_state: 使用前缀状态（结果与逐期过滤 DataFrame 一致）
+        predict_mode: 各期 predict 的生成模式（batch 与 exhaustive 结果相同）
+    """
+    periods = [int(p) for p in periods]
+    n = len(periods)
+    workers = min(workers or backtest_workers(), n) if n else 1
+    blocks = plan_blocks(n, workers, walk_forward)
+    options = {'model_mode': model_mode, 'assets_dir': assets_dir, 'train_ensemble': train_ensemble,
+               'walk_forward': walk_forward, 'train_workers': 1 if workers > 1 else None, 'prefix_state': prefix_state,
+               'predict_mode': predict_mode}
+    columns = history_columns(history_df)
+
+    if workers <= 1:
+        runner = PeriodRunner(columns, periods, options)
+        for start, stop in blocks:
+            for index in range(start, stop):
+                if cancel_check and cancel_check():
+                    return
+                item = runner.run(index, start)
+                if item is not None:
+                    if on_result:
+                        on_result(item)
+                    yield item
+        return
+
+    ctx = mp.get_context('spawn')
+    results, cancel_event = ctx.Queue(), ctx.Event()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                               initargs=(columns, periods, options, cancel_event, results))
+    pending, next_index, cancelled = {}, 0, False
+    try:
+        futures = {pool.submit(_run_block, start, stop): (start, stop) for start, stop in blocks}
+        while next_index < n:
+            if cancel_check and cancel_check():
+                cancelled = True
+                break
+            try:
+                index, item = results.get(timeout=0.5)
+                if item is not None and on_result:
+                    on_result(item)
+                if index >= next_index:
+                    pending[index] = item
+            except queue_module.Empty:
+                # worker 异常退出的块不会再有结果，按空结果补齐，避免顺序输出卡住
+                for future, (start, stop) in futures.items():
+                    if future.done() and future.exception() is not None:
+                        print(f"Error 回测块 {periods[start]}-{periods[stop - 1]}: {future.exception()}")
+                        for index in range(max(start, next_index), stop):
+                            pending.setdefault(index, None)
+            while next_index in pending:
+                item = pending.pop(next_index)
+                next_index += 1
+                if item is not None:
+                    yield item
+    finally:
+        cancelled = cancelled or next_index < n
+        if cancelled:
+            cancel_event.set()
+        pool.shutdown(wait=not cancelled, cancel_futures=True)
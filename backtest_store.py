@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回测结果的追加式存储（断点续跑）
+1. 每期结果按 (期号截止的历史哈希, 引擎 / 评分代码版本, 模型哈希, 回测参数) 生成键，追加写入 backtests.jsonl
+2. 重新回测重叠区间时，已完成的期直接取用，只计算缺失的期；任务取消、浏览器断开或服务重启都不会丢失已完成的期
+3. 每次回测记录一行 run（区间、版本、参数），每期记录一行 period（所属 run、期号、键，首次出现的键附带结果）
+4. runs() 列出历史回测，diff(a, b) 逐期对比两次回测的命中差异
+"""
+
+import ast
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from model_registry import source_version
+
+# 回测入口模块；影响结果的源文件为它们（含函数内的延迟导入）递归导入的全部本仓库模块
+ENGINE_ROOTS = ('backtest_engine.py', 'model_engine.py')
+_ENGINE_VERSION = None
+
+
+def engine_files(roots=ENGINE_ROOTS):
+    """roots 递归导入的本仓库源文件（按文件名排序）"""
+    base = os.path.dirname(os.path.abspath(__file__))
+    seen, stack = set(), list(roots)
+    while stack:
+        name = stack.pop()
+        path = os.path.join(base, name)
+        if name in seen or not os.path.exists(path):
+            continue
+        seen.add(name)
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read(), filename=name)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules = [node.module]
+            else:
+                continue
+            stack.extend(f"{m.split('.')[0]}.py" for m in modules)
+    return sorted(seen)
+
+
+def engine_version():
+    """回测引擎 / 评分代码版本"""
+    global _ENGINE_VERSION
+    if _ENGINE_VERSION is None:
+        _ENGINE_VERSION = source_version(engine_files())
+    return _ENGINE_VERSION
+
+
+def prefix_hashes(arrays):
+    """逐期链式哈希：第 i 项覆盖第 0..i 期（含当期开奖），历史只在末尾追加时前缀哈希不变"""
+    h = hashlib.sha1()
+    out = []
+    for period, red, blue in zip(arrays.periods, arrays.red.astype(np.int8), arrays.blue.astype(np.int8)):
+        h.update(int(period).to_bytes(8, 'little', signed=True))
+        h.update(red.tobytes())
+        h.update(blue.tobytes())
+        out.append(h.copy().hexdigest())
+    return out
+
+
+def result_key(history_hash, version, model_hash, params):
+    payload = json.dumps([history_hash, version, model_hash, params], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class BacktestStore:
+    """backtests.jsonl：只追加，读取时重建索引（文件变化时才重新读取）"""
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, 'backtests.jsonl')
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._results = {}
+        self._runs = {}
+        self._periods = {}
+
+    # --- 读写 ---
+
+    def _append(self, records):
+        os.makedirs(self.root, exist_ok=True)
+        data = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records)
+        with self._lock:
+            # 一次 write 写入完整的行，多个进程同时追加也不会交错
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        st = os.stat(self.path)
+        stamp = (st.st_size, st.st_mtime_ns)
+        if stamp == self._stamp:
+            return
+        results, runs, periods = {}, {}, {}
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 写入中断留下的半行
+                if record.get('type') == 'run':
+                    runs[record['run_id']] = record
+                elif record.get('type') == 'period':
+                    if 'result' in record:
+                        results.setdefault(record['key'], record['result'])
+                    periods.setdefault(record['run_id'], {})[record['period']] = record['key']
+        self._results, self._runs, self._periods, self._stamp = results, runs, periods, stamp
+
+    # --- 回测 ---
+
+    def lookup(self, keys):
+        """{键: 结果}，只包含已存储的键"""
+        self._load()
+        return {k: self._results[k] for k in keys if k in self._results}
+
+    def start_run(self, start, end, model_hash, params):
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self._append([{'type': 'run', 'run_id': run_id, 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'start': str(start), 'end': str(end), 'engine_version': engine_version(),
+                       'model_hash': model_hash, 'params': params}])
+        return run_id
+
+    def record(self, run_id, period, key, result=None):
+        """记录某次回测的一期；result 为 None 表示复用已存储的结果"""
+        record = {'type': 'period', 'run_id': run_id, 'period': str(period), 'key': key}
+        if result is not None:
+            record['result'] = result
+        self._append([record])
+
+    # --- 查询 ---
+
+    def runs(self):
+        """历史回测列表（新的在前），附带已完成期数"""
+        self._load()
+        out = []
+        for run_id, run in self._runs.items():
+            out.append(dict(run, completed=len(self._periods.get(run_id, {}))))
+        return sorted(out, key=lambda r: r['created'], reverse=True)
+
+    def run_results(self, run_id):
+        """{期号: 结果}（按期号升序）"""
+        self._load()
+        keys = self._periods.get(run_id, {})
+        return {p: self._results[keys[p]] for p in sorted(keys, key=int) if keys[p] in self._results}
+
+    def diff(self, run_a, run_b):
+        """逐期对比两次回测：命中变化的期、只在一方出现的期，以及平均命中"""
+        a, b = self.run_results(run_a), self.run_results(run_b)
+        changed = []
+        for p in sorted(set(a) & set(b), key=int):
+            ra, rb = a[p], b[p]
+            if (ra['red_hits'], ra['blue_hits'], ra.get('best_hits')) != (rb['red_hits'], rb['blue_hits'], rb.get('best_hits')):
+                changed.append({'period': p,
+                                'a': {'red_hits': ra['red_hits'], 'blue_hits': ra['blue_hits'], 'best_hits': ra.get('best_hits')},
+                                'b': {'red_hits': rb['red_hits'], 'blue_hits': rb['blue_hits'], 'best_hits': rb.get('best_hits')}})
+
+        def summary(results):
+            n = len(results)
+            return {'periods': n,
+                    'avg_red_hits': round(sum(r['red_hits'] for r in results.values()) / n, 2) if n else 0,
+                    'avg_blue_hits': round(sum(r['blue_hits'] for r in results.values()) / n, 2) if n else 0}
+
+        return {
+            'a': dict(summary(a), run_id=run_a),
+            'b': dict(summary(b), run_id=run_b),
+            'common': len(set(a) & set(b)),
+            'only_a': sorted(set(a) - set(b), key=int),
+            'only_b': sorted(set(b) - set(a), key=int),
+            'changed': changed
+        }
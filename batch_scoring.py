@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量组合评分（与 DaletouPredictor.score_combination 逐项一致）
+1. 评分可拆为红球项与蓝球项：(红球加分 + 蓝球加分) × 红球 ML 系数 × 蓝球共振系数 × 参考网页系数，
+   红球项对一批红球组合一次算出，蓝球项对全部蓝球组合一次算出，组合得分为两者的外积
+2. 各项的累加顺序与逐注评分相同（浮点结果逐位一致）
+3. best_blue：每个红球组合在给定蓝球集合上的最高分与对应蓝球（多样性筛选只看红球，
+   每个红球组合只有其最高分的蓝球可能入选），全空间评分按块计算，不生成 (红×蓝) 明细列表
+4. swap_neighbors：红球组合换掉一个号码得到的全部邻居（候选采样后的局部搜索）
+"""
+
+from collections import Counter, namedtuple
+from itertools import combinations
+
+import numpy as np
+
+from prefix_state import PRIMES
+
+RedTerms = namedtuple('RedTerms', 'add boost ref')
+BlueTerms = namedtuple('BlueTerms', 'overlap small boost ref')
+
+_PAIRS = np.array(list(combinations(range(5), 2)))
+_PRIME_LIST = sorted(PRIMES)
+
+
+def _incidence(combos, n):
+    """(N, k) 号码 → (N, n+1) 布尔出现矩阵（第 0 列不用）"""
+    inc = np.zeros((len(combos), n + 1), dtype=bool)
+    inc[np.arange(len(combos))[:, None], combos] = True
+    return inc
+
+
+def _proba_vector(probas, n):
+    vec = np.zeros(n + 1)
+    for k, v in (probas or {}).items():
+        if 1 <= k <= n:
+            vec[k] = v
+    return vec
+
+
+class BatchScorer:
+    """一期上下文（评分立方体、上期开奖、相似期次、模型概率、参考号码）下的批量评分"""
+
+    def __init__(self, cube_scores, last_record=None, similar_next=(), red_probas=None, blue_probas=None,
+                 lstm_probas=None, ref_numbers=None):
+        self.cube_scores = np.asarray(cube_scores, dtype=np.float64)
+        self.last_red = sorted(last_record['red']) if last_record is not None else None
+        self.last_blue = sorted(last_record['blue']) if last_record is not None else None
+        self.similar_next = [list(r) for r in similar_next]
+        self.red_probas = red_probas
+        self.blue_probas = blue_probas
+        self.lstm_probas = lstm_probas
+        self.ref_numbers = ref_numbers
+
+    def red_terms(self, reds, categories):
+        """(N, 5) 升序红球组合 + 类别 ID → 红球加分、ML 系数、参考网页红球加成"""
+        reds = np.asarray(reds, dtype=np.int64).reshape(-1, 5)
+        n = len(reds)
+        inc = _incidence(reds, 35)
+        add = np.full(n, 500.0)
+
+        consec = (np.diff(reds, axis=1) == 1).sum(axis=1)
+        add += np.select([consec >= 4, consec == 3, consec == 2, consec == 1], [-500, -100, 80, 120], 50)
+
+        diffs = np.sort(reds[:, _PAIRS[:, 1]] - reds[:, _PAIRS[:, 0]], axis=1)
+        ac_val = (np.diff(diffs, axis=1) != 0).sum(axis=1) + 1 - 4
+        add += np.select([ac_val >= 5, ac_val == 4, ac_val >= 3, ac_val >= 1], [180, 150, 80, 30], 0)
+
+        mods = reds % 3
+        m_max = np.stack([(mods == k).sum(axis=1) for k in range(3)], axis=1).max(axis=1)
+        add += np.where(m_max >= 3, 120, 0)
+
+        p_count = inc[:, _PRIME_LIST].sum(axis=1)
+        add += np.select([p_count == 0, p_count == 1, p_count == 2, p_count == 3], [30, 80, 120, 100], 50)
+
+        add += self.cube_scores[np.asarray(categories)]
+
+        span = reds[:, -1] - reds[:, 0]
+        add += np.where((span >= 18) & (span <= 32), 200, 150)
+
+        small = (reds <= 12).sum(axis=1)
+        add += np.select([small == 2, small == 1, small == 3, small == 0], [220, 185, 120, 60], 30)
+        big = (reds > 17).sum(axis=1)
+        add += np.where((big >= 2) & (big <= 3), 100, 0)
+
+        for next_red in self.similar_next:
+            overlap = inc[:, next_red].sum(axis=1)
+            add += np.where(overlap >= 2, overlap * 120, 0)
+
+        if self.last_red is not None:
+            neighbors = sorted({x + d for x in self.last_red for d in (-1, 1)} & set(range(1, 36)))
+            nb = inc[:, neighbors].sum(axis=1)
+            add += np.select([nb == 1, nb == 2, nb >= 3], [180, 280, nb * 100], 0)
+            red_overlap = inc[:, self.last_red].sum(axis=1)
+            add += np.select([red_overlap == 0, red_overlap == 1], [150, 200], 0)
+
+        boost = np.ones(n)
+        if self.red_probas:
+            vals = -np.sort(-_proba_vector(self.red_probas, 35)[reds], axis=1)
+            top3 = vals[:, 0] + vals[:, 1] + vals[:, 2]
+            boost = np.where(top3 > 0.3, 1.0 + top3 * 2.0, 1.0)
+
+        ref = None
+        if self.ref_numbers:
+            top_red = [k for k, _ in self.ref_numbers.get('red', Counter()).most_common(15)]
+            hits = inc[:, [k for k in top_red if 1 <= k <= 35]].sum(axis=1)
+            ref = np.where(hits >= 1, hits * 0.2, 0.0)
+        return RedTerms(add, boost, ref)
+
+    def blue_terms(self, blues):
+        """(M, 2) 升序蓝球组合 → 蓝球加分（重号 / 大小号）、共振系数、参考网页蓝球加成"""
+        blues = np.asarray(blues, dtype=np.int64).reshape(-1, 2)
+        m = len(blues)
+        inc = _incidence(blues, 12)
+        overlap = np.zeros(m)
+        if self.last_blue is not None:
+            overlap = np.where(inc[:, self.last_blue].sum(axis=1) == 0, 100.0, 0.0)
+        small = (blues <= 6).sum(axis=1)
+        small = np.where(small == 1, 150.0, 100.0)
+
+        boost = np.ones(m)
+        if self.blue_probas or self.lstm_probas:
+            conf = np.zeros((m, 2))
+            if self.blue_probas:
+                conf = _proba_vector(self.blue_probas, 12)[blues] * 0.6
+            if self.lstm_probas:
+                conf = conf + _proba_vector(self.lstm_probas, 12)[blues] * 0.4
+            avg = conf[:, 0] + conf[:, 1]
+            boost = np.where(avg > 0.15, 1.0 + avg * 4.0, 1.0)
+
+        ref = None
+        if self.ref_numbers:
+            top_blue = [k for k, _ in self.ref_numbers.get('blue', Counter()).most_common(5)]
+            ref = np.where(inc[:, [k for k in top_blue if 1 <= k <= 12]].sum(axis=1) >= 1, 0.2, 0.0)
+        return BlueTerms(overlap, small, boost, ref)
+
+    def matrix(self, red_t, blue_t, rows=slice(None)):
+        """红球项（可取部分行）× 蓝球项 → 得分矩阵"""
+        score = red_t.add[rows][:, None] + blue_t.overlap[None, :]
+        score += blue_t.small[None, :]
+        score *= red_t.boost[rows][:, None]
+        score *= blue_t.boost[None, :]
+        if red_t.ref is not None:
+            score *= (1.0 + red_t.ref[rows])[:, None] + blue_t.ref[None, :]
+        return score
+
+    def pair_scores(self, red_t, blue_t, red_rows, blue_rows):
+        """逐对得分（第 i 对为 red_rows[i] × blue_rows[i]）"""
+        score = red_t.add[red_rows] + blue_t.overlap[blue_rows]
+        score += blue_t.small[blue_rows]
+        score *= red_t.boost[red_rows]
+        score *= blue_t.boost[blue_rows]
+        if red_t.ref is not None:
+            score *= (1.0 + red_t.ref[red_rows]) + blue_t.ref[blue_rows]
+        return score
+
+    def best_blue(self, red_t, blue_t, excluded=None, chunk=20000):
+        """每个红球组合的最高分及其蓝球下标（同分取靠前的蓝球）
+
+        excluded: {红球行: [蓝球下标, ...]}，这些组合不参与（如历史开奖号码）
+        """
+        n = len(red_t.add)
+        best = np.empty(n)
+        idx = np.empty(n, dtype=np.int64)
+        for s in range(0, n, chunk):
+            score = self.matrix(red_t, blue_t, slice(s, min(s + chunk, n)))
+            for row, cols in (excluded or {}).items():
+                if s <= row < s + chunk:
+                    score[row - s, cols] = -np.inf
+            idx[s:s + chunk] = score.argmax(axis=1)
+            best[s:s + chunk] = score[np.arange(len(score)), idx[s:s + chunk]]
+        return best, idx
+
+
+def swap_neighbors(red_table, ids, allowed=None):
+    """红球组合 ID → 换掉其中一个号码得到的全部组合 ID（去重；allowed 为按 ID 的布尔掩码）"""
+    reds = red_table.combos[np.asarray(ids)].astype(np.int64)
+    n = len(reds)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    numbers = np.arange(1, 36)
+    # (n, 5 个位置, 35 个替换号码, 5)
+    out = np.broadcast_to(reds[:, None, None, :], (n, 5, 35, 5)).copy()
+    pos = np.arange(5)
+    out[:, pos, :, pos] = numbers[None, None, :]
+    inc = _incidence(reds, 35)
+    keep = ~inc[:, numbers][:, None, :].repeat(5, axis=1)  # 替换号码不能已在组合中
+    out = np.sort(out[keep], axis=1)
+    new_ids = np.unique(red_table.rank(out))
+    return new_ids[allowed[new_ids]] if allowed is not None else new_ids
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+号码概率模型基准对比：逐号码 Stacking vs 多标签单模型（MLP / 多输出随机森林）
+
+对比项：
+1. 训练耗时
+2. 单次推理延迟（最后一行特征 → 35+12 维概率）
+3. 模型文件大小（joblib 序列化字节数）
+4. 回测命中：在训练窗口之后的若干期上，前区概率最高 5 个号码、后区最高 2 个号码的平均命中数
+
+用法：
+    python benchmark_number_models.py --test-periods 100 --modes stacking,mlp,forest
+"""
+
+import argparse
+import io
+import time
+
+import joblib
+import numpy as np
+
+from model_engine import DaletouPredictor
+from multilabel_model import MultiLabelNumberModel
+from stacking_trainer import train_per_number, fit_number_stack
+
+
+def _artifact_size(obj):
+    buf = io.BytesIO()
+    joblib.dump(obj, buf)
+    return buf.tell()
+
+
+def _train(mode, predictor, X, arrays, workers):
+    """训练指定模式，返回 (推理函数, 可序列化模型对象)"""
+    if mode == 'stacking':
+        red_models, _ = train_per_number(X, arrays.red_incidence, 'red', fit_fn=fit_number_stack, workers=workers)
+        blue_models, _ = train_per_number(X, arrays.blue_incidence, 'blue', fit_fn=fit_number_stack, workers=workers)
+        infer = lambda f: (predictor._stacking_batch_probas(f, red_models, 35),
+                           predictor._stacking_batch_probas(f, blue_models, 12))
+        return infer, {'red': red_models, 'blue': blue_models}
+    model = MultiLabelNumberModel(kind=mode).fit(X, arrays.red_incidence, arrays.blue_incidence)
+    return model.predict_vectors, model
+
+
+def run_benchmark(test_periods=100, modes=('stacking', 'mlp', 'forest'), workers=None):
+    from history_arrays import HistoryArrays
+
+    predictor = DaletouPredictor()
+    df = predictor.history_df
+    split = len(df) - test_periods
+    train_df = df.iloc[:split]
+    print(f"[*] 训练窗口: {len(train_df)} 期, 回测: {test_periods} 期 ({df.iloc[split]['period']} - {df.iloc[-1]['period']})", flush=True)
+
+    X = predictor.extract_features(train_df).values
+    arrays = HistoryArrays.from_df(train_df)
+
+    # 回测输入：第 t 期的预测只使用 t 之前的数据提取特征
+    print(f"[*] 预计算回测特征...", flush=True)
+    test_inputs = [predictor.extract_features(df.iloc[:t], last_only=True) for t in range(split, len(df))]
+    actual = HistoryArrays.from_df(df.iloc[split:])
+
+    rows = []
+    for mode in modes:
+        print(f"[*] 训练 {mode} ...", flush=True)
+        t0 = time.time()
+        infer, artifact = _train(mode, predictor, X, arrays, workers)
+        train_time = time.time() - t0
+
+        latencies, red_hits, blue_hits = [], [], []
+        for i, feats in enumerate(test_inputs):
+            t0 = time.time()
+            red_vec, blue_vec = infer(feats)
+            latencies.append(time.time() - t0)
+            red_top = np.argsort(-np.nan_to_num(red_vec, nan=-1.0), kind='stable')[:5] + 1
+            blue_top = np.argsort(-np.nan_to_num(blue_vec, nan=-1.0), kind='stable')[:2] + 1
+            red_hits.append(len(set(red_top.tolist()) & set(actual.red[i].tolist())))
+            blue_hits.append(len(set(blue_top.tolist()) & set(actual.blue[i].tolist())))
+
+        rows.append({
+            'mode': mode,
+            'train_time': train_time,
+            'latency_ms': np.mean(latencies) * 1000,
+            'size_kb': _artifact_size(artifact) / 1024,
+            'red_hits': np.mean(red_hits),
+            'blue_hits': np.mean(blue_hits)
+        })
+
+    print("\n" + "=" * 78)
+    print(f"{'模式':<10}{'训练(s)':>10}{'推理(ms)':>12}{'模型(KB)':>12}{'前区Top5命中':>16}{'后区Top2命中':>16}")
+    print("-" * 78)
+    for r in rows:
+        print(f"{r['mode']:<10}{r['train_time']:>10.1f}{r['latency_ms']:>12.2f}{r['size_kb']:>12.0f}"
+              f"{r['red_hits']:>16.3f}{r['blue_hits']:>16.3f}")
+    print("=" * 78)
+    print(f"随机基线: 前区Top5命中 {5 * 5 / 35:.3f}, 后区Top2命中 {2 * 2 / 12:.3f}")
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='号码概率模型基准对比')
+    parser.add_argument('--test-periods', type=int, default=100)
+    parser.add_argument('--modes', default='stacking,mlp,forest')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    run_benchmark(args.test_periods, tuple(m.strip() for m in args.modes.split(',') if m.strip()), args.workers)
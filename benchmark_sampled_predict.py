@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+候选采样预测基准：mode='sampled' 对全量评分 Top-N 的召回
+
+对最近若干期逐期回放（子预测器的历史截止到该期之前，同回测）：
+1. 全量 Top-N：mode='batch'（全空间批量评分，与逐注枚举结果一致）
+2. 采样 Top-N：mode='sampled'，generate_candidates 生成 n_candidates 组候选，局部搜索后批量评分
+3. 召回：采样 Top-N 中出现在全量 Top-N 里的注数 / N（同时给出只比红球的召回）与两者耗时
+
+用法：
+    python benchmark_sampled_predict.py --test-periods 20 --candidates 1000,3000 --top-n 20
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from model_engine import DaletouPredictor
+from prefix_state import PrefixHistory
+
+
+def _predict(predictor, period, top_n, mode, n_candidates):
+    # 关闭预测过程的逐步输出，只保留基准结果
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.time()
+        preds = list(predictor.predict(str(period), n_combinations=top_n, is_backtest=True, mode=mode,
+                                       n_candidates=n_candidates))
+    return preds, time.time() - t0
+
+
+def run_benchmark(test_periods=20, candidates=(1000, 3000), top_n=20):
+    predictor = DaletouPredictor()
+    full_df = predictor.history_df
+    prefix = PrefixHistory(full_df)
+    targets = range(len(full_df) - test_periods, len(full_df))
+    print(f"[*] 回放 {test_periods} 期 ({full_df.iloc[targets[0]]['period']} - {full_df.iloc[-1]['period']}), "
+          f"Top-{top_n}, 候选数 {', '.join(map(str, candidates))}", flush=True)
+
+    rows = {n: [] for n in candidates}
+    full_times = []
+    for t in targets:
+        period = int(full_df.iloc[t]['period'])
+        predictor.set_history_prefix(prefix, t)
+        predictor.is_trained = True
+        predictor.components.ensure_all(('markov', 'patterns', 'dynamic_weights'))
+        # 候选生成的集成模型策略所需模型在计时前构建
+        with contextlib.redirect_stdout(io.StringIO()):
+            predictor.components.ensure('ensemble')
+
+        exact, elapsed = _predict(predictor, period, top_n, 'batch', None)
+        full_times.append(elapsed)
+        exact_keys = {(tuple(c['red']), tuple(c['blue'])) for c in exact}
+        exact_reds = {tuple(c['red']) for c in exact}
+        line = [f"  - {period}  全量 {elapsed:6.2f}s"]
+        for n in candidates:
+            sampled, elapsed = _predict(predictor, period, top_n, 'sampled', n)
+            recall = len({(tuple(c['red']), tuple(c['blue'])) for c in sampled} & exact_keys) / max(1, len(exact))
+            red_recall = len({tuple(c['red']) for c in sampled} & exact_reds) / max(1, len(exact))
+            rows[n].append((recall, red_recall, elapsed))
+            line.append(f"采样{n}: 召回 {recall:5.1%} (红 {red_recall:5.1%}) {elapsed * 1000:7.0f}ms")
+        print('  '.join(line), flush=True)
+
+    print("\n" + "=" * 64)
+    print(f"{'候选数':<10}{'Top-N召回':>12}{'红球召回':>12}{'耗时(ms)':>12}{'加速比':>10}")
+    print("-" * 64)
+    full_ms = np.mean(full_times) * 1000
+    print(f"{'全量':<10}{1:>12.1%}{1:>12.1%}{full_ms:>12.0f}{1:>10.1f}")
+    summary = []
+    for n in candidates:
+        recall, red_recall, elapsed = np.mean(rows[n], axis=0)
+        summary.append({'n_candidates': n, 'recall': recall, 'red_recall': red_recall, 'latency_ms': elapsed * 1000})
+        print(f"{n:<10}{recall:>12.1%}{red_recall:>12.1%}{elapsed * 1000:>12.0f}{full_ms / (elapsed * 1000):>10.1f}")
+    print("=" * 64)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='候选采样预测对全量 Top-N 的召回基准')
+    parser.add_argument('--test-periods', type=int, default=20)
+    parser.add_argument('--candidates', default='1000,3000')
+    parser.add_argument('--top-n', type=int, default=20)
+    args = parser.parse_args()
+    run_benchmark(args.test_periods, tuple(int(n) for n in args.candidates.split(',') if n.strip()), args.top_n)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+蓝球 66 组评分表（候选生成中 _select_blue_by_strategy 的逐期缓存）
+1. 一期只构建一次：各组的和值 / 间距 / 奇偶特征、置信度融合（Stacking 0.6 + LSTM 0.4）、
+   热力图加成、马尔可夫和值加成、总分与加权采样的累积分布
+2. 选取为 O(1) 查表，或对缓存的累积分布做一次 searchsorted
+   （与 np.random.choice(p=...) 的内部实现相同，随机数消耗与结果逐位一致）
+3. 各组按 combinations 顺序排列（未按得分排序），Top1 / Top10 沿用原逻辑取表中前几组
+"""
+
+from itertools import combinations
+
+import numpy as np
+
+BLUE_PAIRS = np.array(list(combinations(range(1, 13), 2)))
+
+
+def _number_vector(probas):
+    vec = np.zeros(13)
+    for n, p in (probas or {}).items():
+        if 1 <= n <= 12:
+            vec[n] = p
+    return vec
+
+
+class BluePairTable:
+    """一期上下文（蓝球模型概率、Markov 和值转移）下的 66 组蓝球评分"""
+
+    def __init__(self, blue_probas=None, lstm_probas=None, top_sums=()):
+        blue_probas = blue_probas or {}
+        lstm_probas = lstm_probas or {}
+        b1, b2 = BLUE_PAIRS[:, 0], BLUE_PAIRS[:, 1]
+        self.pairs = [[int(a), int(b)] for a, b in BLUE_PAIRS]
+        self.sums = b1 + b2
+        self.gaps = b2 - b1
+        self.mixed_parity = b1 % 2 != b2 % 2
+
+        # 1. 置信度融合（主分）
+        conf = _number_vector(blue_probas) * 0.6 + _number_vector(lstm_probas) * 0.4
+        self.confidence = (conf[b1] + conf[b2]) * 1000
+        # 2. 热力图：两个模型 Top4 的交集
+        top_stack = sorted(blue_probas.items(), key=lambda x: x[1], reverse=True)[:4]
+        top_lstm = sorted(lstm_probas.items(), key=lambda x: x[1], reverse=True)[:4]
+        hot = sorted({n for n, _ in top_stack} & {n for n, _ in top_lstm})
+        self.heat = (np.where(np.isin(b1, hot), 300.0, 0.0), np.where(np.isin(b2, hot), 300.0, 0.0))
+        # 3. Markov 和值转移 + 统计规律
+        self.markov = np.where(np.isin(self.sums, list(top_sums)), 100.0, 0.0)
+
+        # 与逐组累加的顺序相同（浮点结果一致）
+        score = 100.0 + self.confidence
+        score += self.heat[0]
+        score += self.heat[1]
+        score += self.markov
+        score += np.where((self.gaps >= 4) & (self.gaps <= 8), 60.0, 0.0)
+        score += np.where(self.mixed_parity, 50.0, 0.0)
+        self.score = score
+
+        # 加权采样：得分平滑后归一化的累积分布（同 np.random.choice 内部计算）
+        smoothed = score - np.min(score) + 1.0
+        cdf = (smoothed / smoothed.sum()).cumsum()
+        cdf /= cdf[-1]
+        self.cdf = cdf if np.isfinite(cdf).all() else None
+
+    def select(self, offset):
+        """按 offset 轮换：Top1 / Top10 随机 / 按得分加权采样"""
+        if offset % 3 == 0:
+            return list(self.pairs[0])
+        if offset % 3 == 1:
+            return list(self.pairs[np.random.randint(10)])
+        if self.cdf is None:
+            return list(self.pairs[0])
+        return list(self.pairs[int(self.cdf.searchsorted(np.random.random_sample(), side='right'))])
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+号码共现子系统
+1. 由出号矩阵 X(N×K) 通过矩阵乘积构建两两共现矩阵 X^T·X 及其时间衰减版本
+2. 三元共现以稀疏形式（排序后的编码键 + 计数）存储
+3. 对任意数量的号码组合一次性 gather-sum 打分，可作为全量组合的评分层
+"""
+
+from itertools import combinations
+
+import numpy as np
+
+
+class CoOccurrenceIndex:
+    """基于出号矩阵的共现统计（号码下标 0 起，对外接口使用 1 起的号码）"""
+
+    def __init__(self, incidence, half_life=100):
+        """
+        Args:
+            incidence: N×K 出号矩阵（0/1），按期号升序
+            half_life: 时间衰减半衰期（期数），最近一期权重为 1
+        """
+        X = np.asarray(incidence, dtype=np.float64)
+        self.size = X.shape[1]
+        self.periods = X.shape[0]
+        self.half_life = half_life
+
+        weights = 0.5 ** (np.arange(self.periods)[::-1] / float(half_life)) if self.periods else np.zeros(0)
+        self.total_weight = float(weights.sum())
+
+        # 两两共现：对角线为单号出现次数
+        self.pair_counts = (X.T @ X).astype(np.int32)
+        self.pair_decayed = X.T @ (X * weights[:, None])
+
+        # 三元共现（稀疏）：每期固定 k 个号码 → C(k,3) 个三元组编码
+        self.triple_keys = np.zeros(0, dtype=np.int64)
+        self.triple_counts = np.zeros(0, dtype=np.int32)
+        self.triple_decayed = np.zeros(0)
+        per_row = int(X[0].sum()) if self.periods else 0
+        if per_row >= 3:
+            cols = np.nonzero(X)[1].reshape(self.periods, per_row)
+            idx = np.array(list(combinations(range(per_row), 3)))
+            keys = self._encode_triples(cols[:, idx[:, 0]], cols[:, idx[:, 1]], cols[:, idx[:, 2]]).ravel()
+            row_weights = np.repeat(weights, len(idx))
+            self.triple_keys, inverse = np.unique(keys, return_inverse=True)
+            self.triple_counts = np.bincount(inverse, minlength=len(self.triple_keys)).astype(np.int32)
+            self.triple_decayed = np.bincount(inverse, weights=row_weights, minlength=len(self.triple_keys))
+
+    @classmethod
+    def from_incidence(cls, incidence, window=None, half_life=100):
+        """从出号矩阵构建，window 指定只使用最近若干期"""
+        incidence = np.asarray(incidence)
+        if window:
+            incidence = incidence[-window:]
+        return cls(incidence, half_life=half_life)
+
+    def _encode_triples(self, a, b, c):
+        return (a.astype(np.int64) * self.size + b) * self.size + c
+
+    def pair_matrix(self, decayed=False, normalize=None):
+        """返回 K×K 共现矩阵（对角线置 0）
+
+        Args:
+            decayed: 是否使用时间衰减计数
+            normalize: None 原始计数 / 'row' 按行归一化（号码 i 的共现分布） / 'lift' 提升度 P(ij)/(P(i)P(j))
+        """
+        base = self.pair_decayed if decayed else self.pair_counts.astype(np.float64)
+        freq = np.diag(base).copy()
+        m = base.copy()
+        np.fill_diagonal(m, 0)
+        if normalize == 'row':
+            totals = m.sum(axis=1, keepdims=True)
+            m = np.divide(m, totals, out=np.zeros_like(m), where=totals > 0)
+        elif normalize == 'lift':
+            total = self.total_weight if decayed else self.periods
+            expected = np.outer(freq, freq) / max(total, 1e-12)
+            m = np.divide(m, expected, out=np.zeros_like(m), where=expected > 0)
+        return m
+
+    def score_pairs(self, combos, matrix=None, decayed=False, normalize='row'):
+        """对 M×k 号码组合（1 起）计算两两共现权重之和，一次 gather 完成
+
+        matrix 可传入预先计算好的 pair_matrix 以在多次调用间复用
+        """
+        combos = np.asarray(combos, dtype=np.int64) - 1
+        if combos.ndim == 1:
+            combos = combos[None, :]
+        if matrix is None:
+            matrix = self.pair_matrix(decayed=decayed, normalize=normalize)
+        a, b = np.triu_indices(combos.shape[1], 1)
+        flat = matrix.ravel()
+        return flat[combos[:, a] * self.size + combos[:, b]].sum(axis=1)
+
+    def score_triples(self, combos, decayed=False):
+        """对 M×k 号码组合（1 起、升序）计算包含的所有三元组历史共现次数之和"""
+        combos = np.asarray(combos, dtype=np.int64) - 1
+        if combos.ndim == 1:
+            combos = combos[None, :]
+        if len(self.triple_keys) == 0 or combos.shape[1] < 3:
+            return np.zeros(len(combos))
+        idx = np.array(list(combinations(range(combos.shape[1]), 3)))
+        keys = self._encode_triples(combos[:, idx[:, 0]], combos[:, idx[:, 1]], combos[:, idx[:, 2]])
+        pos = np.minimum(np.searchsorted(self.triple_keys, keys), len(self.triple_keys) - 1)
+        found = self.triple_keys[pos] == keys
+        values = self.triple_decayed if decayed else self.triple_counts
+        return np.where(found, values[pos], 0).sum(axis=1)
+
+    def top_pairs(self, n=10, decayed=False):
+        """按共现次数降序返回前 n 个号码对 [(a, b), ...]（1 起，a < b，仅含出现过的号码对）"""
+        m = self.pair_decayed if decayed else self.pair_counts
+        a, b = np.triu_indices(self.size, 1)
+        values = m[a, b]
+        order = np.lexsort((b, a, -values))
+        order = order[values[order] > 0][:n]
+        return [(int(a[i]) + 1, int(b[i]) + 1) for i in order]
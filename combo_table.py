@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+静态号码组合表
+1. 前区 C(35,5) / 后区 C(12,2) 全部组合按字典序存为 NumPy 数组，组合 ID 即字典序下标
+2. 预计算每个红球组合的特征与类别签名 (和值, 区间比, 奇数个数, 小号个数)，供评分层按类别查表
+3. 按 (和值, 奇数个数, 区间比, 最长连号, 结构规则标志) 排序的二级索引，用户过滤条件直接转换为若干连续区间
+4. 号码 → 组合的倒排位图，杀号 / 胆码约束为若干位图的按位运算
+"""
+
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+# 结构规则标志位（预测与导出的固定排除规则）
+FLAG_RUN4 = 1             # 含 4 个及以上连号
+FLAG_ALL_ODD_EVEN = 2     # 全奇 / 全偶
+FLAG_SAME_ZONE = 4        # 5 个号码同在一区
+FLAG_ARITHMETIC = 8       # 等差数列（任意公差）
+FLAG_ARITHMETIC_1_6 = 16  # 等差数列（公差 1-6，导出规则）
+FLAG_GEOMETRIC = 32       # 存在相邻三项等比（预测规则）
+FLAG_GEOMETRIC_2 = 64     # 公比为 2 的等比数列（导出规则）
+
+# predict() 的前置必过滤规则
+PREDICT_RULE_FLAGS = FLAG_RUN4 | FLAG_ALL_ODD_EVEN | FLAG_SAME_ZONE | FLAG_ARITHMETIC | FLAG_GEOMETRIC
+# DaletouExporter 的固定排除规则
+EXPORT_RULE_FLAGS = FLAG_RUN4 | FLAG_ALL_ODD_EVEN | FLAG_SAME_ZONE | FLAG_ARITHMETIC_1_6 | FLAG_GEOMETRIC_2
+
+
+class CombinationSpace:
+    """C(n,k) 组合空间（号码 1 起，组合内升序，ID 为字典序下标）"""
+
+    def __init__(self, n, k):
+        self.n = n
+        self.k = k
+        self.combos = np.array(list(combinations(range(1, n + 1), k)), dtype=np.int16)
+        # 二项式系数表，用于组合 ↔ ID 的向量化换算
+        self._binom = np.array([[comb(a, b) for b in range(k + 1)] for a in range(n + 2)], dtype=np.int64)
+        self._number_bitsets = None
+        self._bitset_cache = {}
+
+    def __len__(self):
+        return len(self.combos)
+
+    def rank(self, combos):
+        """组合（M×k，升序）→ 字典序 ID 数组"""
+        combos = np.asarray(combos, dtype=np.int64).reshape(-1, self.k)
+        prev = np.zeros(len(combos), dtype=np.int64)
+        ids = np.zeros(len(combos), dtype=np.int64)
+        for i in range(self.k):
+            cur = combos[:, i]
+            # 第 i 位取值介于 (prev, cur) 的组合数（曲棍球棒恒等式）
+            ids += self._binom[self.n - prev, self.k - i] - self._binom[self.n - cur + 1, self.k - i]
+            prev = cur
+        return ids
+
+    @property
+    def number_bitsets(self):
+        """号码倒排位图：第 x-1 行为包含号码 x 的组合集合（按组合 ID 以 np.packbits 打包）"""
+        if self._number_bitsets is None:
+            member = np.zeros((self.n, len(self.combos)), dtype=bool)
+            member[self.combos.T.astype(np.int64) - 1, np.arange(len(self.combos))] = True
+            self._number_bitsets = np.packbits(member, axis=1)
+        return self._number_bitsets
+
+    def constraint_bitset(self, kill=None, must=None):
+        """杀号 / 胆码约束下的允许组合位图：不含任何杀号，且包含全部胆码"""
+        kill = frozenset(int(x) for x in (kill or ()) if 1 <= int(x) <= self.n)
+        must = frozenset(int(x) for x in (must or ()))
+        key = (kill, must)
+        bits = self._bitset_cache.get(key)
+        if bits is not None:
+            return bits
+        bitsets = self.number_bitsets
+        bits = np.packbits(np.ones(len(self.combos), dtype=bool))
+        if kill:
+            bits &= ~np.bitwise_or.reduce(bitsets[[x - 1 for x in kill]], axis=0)
+        for x in must:
+            if not 1 <= x <= self.n:
+                bits[:] = 0
+                break
+            bits &= bitsets[x - 1]
+        if len(self._bitset_cache) >= 32:
+            self._bitset_cache.pop(next(iter(self._bitset_cache)))
+        self._bitset_cache[key] = bits
+        return bits
+
+    def bitset_ids(self, bits):
+        """位图 → 组合 ID 数组（升序）"""
+        return np.flatnonzero(np.unpackbits(bits, count=len(self.combos))).astype(np.int64)
+
+    def bitset_test(self, bits, ids):
+        """逐个测试组合 ID 是否在位图中"""
+        ids = np.asarray(ids, dtype=np.int64)
+        return ((bits[ids >> 3] >> (7 - (ids & 7))) & 1).astype(bool)
+
+    def allowed_ids(self, kill=None, must=None):
+        """杀号 / 胆码约束下剩余的全部组合 ID"""
+        return self.bitset_ids(self.constraint_bitset(kill, must))
+
+
+class RedComboTable(CombinationSpace):
+    """前区 C(35,5) 组合表及逐组合特征"""
+
+    def __init__(self):
+        super().__init__(35, 5)
+        r = self.combos
+        self.red_sum = r.sum(axis=1).astype(np.int16)
+        self.span = (r[:, -1] - r[:, 0]).astype(np.int8)
+        self.odd_count = (r % 2 == 1).sum(axis=1).astype(np.int8)
+        z1 = (r <= 11).sum(axis=1)
+        z2 = ((r >= 12) & (r <= 23)).sum(axis=1)
+        self.zone_counts = np.stack([z1, z2, 5 - z1 - z2], axis=1).astype(np.int8)
+        self.zone_id = (z1 * 6 + z2).astype(np.int8)
+        self.size_small = (r <= 17).sum(axis=1).astype(np.int8)   # 大小比中的小号（1-17）
+        self.small_count = (r <= 12).sum(axis=1).astype(np.int8)  # 小号数量（1-12）
+        self.big_count = (r > 17).sum(axis=1).astype(np.int8)
+
+        # 最长连号长度
+        step = np.diff(r, axis=1) == 1
+        run = np.ones(len(r), dtype=np.int8)
+        self.max_run = run.copy()
+        for i in range(step.shape[1]):
+            run = np.where(step[:, i], run + 1, 1).astype(np.int8)
+            self.max_run = np.maximum(self.max_run, run)
+
+        # 结构规则标志
+        diffs = np.diff(r, axis=1)
+        arithmetic = (diffs == diffs[:, :1]).all(axis=1)
+        rf = r.astype(np.float64)
+        ratio1 = rf[:, 1:-1] / rf[:, :-2]
+        ratio2 = rf[:, 2:] / rf[:, 1:-1]
+        flags = np.zeros(len(r), dtype=np.int16)
+        flags[self.max_run >= 4] |= FLAG_RUN4
+        flags[(self.odd_count == 0) | (self.odd_count == 5)] |= FLAG_ALL_ODD_EVEN
+        flags[(self.zone_counts == 5).any(axis=1)] |= FLAG_SAME_ZONE
+        flags[arithmetic] |= FLAG_ARITHMETIC
+        flags[arithmetic & (diffs[:, 0] <= 6)] |= FLAG_ARITHMETIC_1_6
+        flags[((np.abs(ratio1 - ratio2) < 0.01) & (ratio1 > 1)).any(axis=1)] |= FLAG_GEOMETRIC
+        flags[(r[:, 1:] == 2 * r[:, :-1]).all(axis=1)] |= FLAG_GEOMETRIC_2
+        self.flags = flags
+
+        # 类别签名 (和值, 区间比ID, 奇数个数, 小号个数)：动态评分只依赖该签名
+        signature = np.stack([self.red_sum, self.zone_id, self.odd_count, self.size_small], axis=1).astype(np.int16)
+        self.category_tuples, self.category = np.unique(signature, axis=0, return_inverse=True)
+        self.category = self.category.reshape(-1).astype(np.int32)
+        # 签名 → 类别 ID 的稠密索引（未出现的签名为 -1）
+        self._category_index = np.full((176, 36, 6, 6), -1, dtype=np.int32)
+        t = self.category_tuples
+        self._category_index[t[:, 0], t[:, 1], t[:, 2], t[:, 3]] = np.arange(len(t), dtype=np.int32)
+
+    @property
+    def n_categories(self):
+        return len(self.category_tuples)
+
+    def category_of(self, red):
+        """任意一组红球（5 个号码）的类别 ID"""
+        red_sum = sum(red)
+        z1 = sum(1 for x in red if x <= 11)
+        z2 = sum(1 for x in red if 12 <= x <= 23)
+        odd = sum(1 for x in red if x % 2 == 1)
+        small = sum(1 for x in red if x <= 17)
+        return int(self._category_index[red_sum, z1 * 6 + z2, odd, small])
+
+
+class RedFeatureIndex:
+    """红球组合二级索引：组合 ID 按 (和值, 奇数个数, 区间比, 最长连号, 结构标志) 排序分桶
+
+    过滤查询先在桶上求掩码（桶数远小于组合数），再拼接命中桶对应的连续区间，
+    开销与命中组合数成正比，而非 C(35,5)。
+    """
+
+    def __init__(self, table):
+        self.table = table
+        keys = (table.red_sum, table.odd_count, table.zone_id, table.max_run, table.flags)
+        self.order = np.lexsort(tuple(reversed(keys))).astype(np.int32)
+        sorted_keys = np.stack([k[self.order] for k in keys], axis=1).astype(np.int16)
+        change = np.flatnonzero((np.diff(sorted_keys, axis=0) != 0).any(axis=1)) + 1
+        starts = np.concatenate([[0], change]).astype(np.int64)
+        self.bounds = np.append(starts, len(self.order))
+        keys = sorted_keys[starts]
+        self.bucket_sum, self.bucket_odd, self.bucket_zone, self.bucket_run, self.bucket_flags = keys.T
+
+    def __len__(self):
+        return len(self.bounds) - 1
+
+    def bucket_mask(self, sum_range=None, odd_counts=None, zone_ids=None, max_run=None, exclude_flags=0):
+        mask = np.ones(len(self), dtype=bool)
+        if sum_range is not None:
+            mask &= (self.bucket_sum >= sum_range[0]) & (self.bucket_sum <= sum_range[1])
+        if odd_counts is not None:
+            mask &= np.isin(self.bucket_odd, list(odd_counts))
+        if zone_ids is not None:
+            mask &= np.isin(self.bucket_zone, list(zone_ids))
+        if max_run is not None:
+            mask &= self.bucket_run <= max_run
+        if exclude_flags:
+            mask &= (self.bucket_flags & exclude_flags) == 0
+        return mask
+
+    def select(self, sum_range=None, odd_counts=None, zone_ids=None, max_run=None, exclude_flags=0):
+        """满足条件的红球组合 ID（升序，即字典序）
+
+        Args:
+            sum_range: (最小和值, 最大和值) 闭区间
+            odd_counts: 允许的奇数个数集合
+            zone_ids: 允许的区间比 ID 集合（z1*6+z2）
+            max_run: 允许的最长连号长度上限
+            exclude_flags: 需要排除的结构规则标志位（如 PREDICT_RULE_FLAGS）
+        """
+        mask = self.bucket_mask(sum_range, odd_counts, zone_ids, max_run, exclude_flags)
+        # 相邻命中桶合并为一段连续区间
+        edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+        seg_starts = self.bounds[np.flatnonzero(edges == 1)]
+        seg_ends = self.bounds[np.flatnonzero(edges == -1)]
+        if len(seg_starts) == 0:
+            return np.zeros(0, dtype=np.int64)
+        ids = np.concatenate([self.order[s:e] for s, e in zip(seg_starts, seg_ends)])
+        return np.sort(ids).astype(np.int64)
+
+    def count(self, **filters):
+        """满足条件的组合数（只累加桶大小，不展开组合）"""
+        mask = self.bucket_mask(**filters)
+        return int(np.diff(self.bounds)[mask].sum())
+
+
+_TABLES = {}
+
+
+def get_red_table():
+    """进程内共享的前区组合表（首次调用时构建）"""
+    if 'red' not in _TABLES:
+        _TABLES['red'] = RedComboTable()
+    return _TABLES['red']
+
+
+def get_blue_space():
+    """进程内共享的后区 C(12,2) 组合空间"""
+    if 'blue' not in _TABLES:
+        _TABLES['blue'] = CombinationSpace(12, 2)
+    return _TABLES['blue']
+
+
+def get_red_index():
+    """进程内共享的前区组合二级索引"""
+    if 'red_index' not in _TABLES:
+        _TABLES['red_index'] = RedFeatureIndex(get_red_table())
+    return _TABLES['red_index']
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+树集成模型的数组化推理
+1. 导出：将逐号码 Stacking 中的 XGBoost Booster、LightGBM 模型、sklearn 随机森林转换为扁平数组
+   （节点特征、阈值、左右子节点、缺失值方向、叶子值），元模型 LogisticRegression 只保留系数与截距
+2. 推理：纯 NumPy 按树深逐层前进，所有号码的所有树一次并行求值，不需要导入 xgboost / lightgbm / sklearn
+3. 与各库的比较规则一致：XGBoost 在 float32 上比较 x < t 并以 float32 累加，
+   LightGBM 在 float64 上比较 x <= t，sklearn 将输入转为 float32 后比较 x <= t
+"""
+
+import json
+
+import numpy as np
+
+
+class CompiledTrees:
+    """多组（每个号码一组）树的扁平数组表示"""
+
+    def __init__(self, feature, threshold, left, right, missing_left, zero_missing, value, roots, group_starts,
+                 strict=False, input_dtype=np.float64, value_dtype=np.float64, reduce='sum', base=None, link='sigmoid'):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=value_dtype)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.missing_left = np.asarray(missing_left, dtype=bool)
+        self.zero_missing = np.asarray(zero_missing, dtype=bool)
+        self.value = np.asarray(value, dtype=value_dtype)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.group_starts = np.asarray(group_starts, dtype=np.int64)
+        # strict=True: x < t 走左（XGBoost），否则 x <= t 走左（LightGBM / sklearn）
+        self.strict = strict
+        self.input_dtype = np.dtype(input_dtype)
+        self.reduce = reduce
+        self.base = None if base is None else np.asarray(base, dtype=self.value.dtype)
+        self.link = link
+        self.max_depth = _max_depth(self.left, self.right, self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right, self.missing_left,
+                                      self.zero_missing, self.value, self.roots, self.group_starts))
+
+    def leaf_values(self, x):
+        """单行输入 x 在每棵树上落到的叶子值"""
+        xv = np.asarray(x, dtype=self.input_dtype)
+        node = self.roots.copy()
+        for _ in range(self.max_depth):
+            inner = np.flatnonzero(self.left[node] >= 0)
+            if len(inner) == 0:
+                break
+            n = node[inner]
+            v = xv[self.feature[n]]
+            go_left = v < self.threshold[n] if self.strict else v <= self.threshold[n]
+            missing = np.isnan(v) | (self.zero_missing[n] & (v == 0))
+            go_left = np.where(missing, self.missing_left[n], go_left)
+            node[inner] = np.where(go_left, self.left[n], self.right[n])
+        return self.value[node]
+
+    def predict(self, x):
+        """各组输出（概率）"""
+        leaves = self.leaf_values(x)
+        # 按树的顺序逐组累加，与各库的累加顺序一致
+        out = np.add.reduceat(leaves, self.group_starts)
+        if self.reduce == 'mean':
+            counts = np.diff(np.append(self.group_starts, len(self.roots)))
+            out = out / counts
+        if self.base is not None:
+            out = out + self.base
+        if self.link == 'sigmoid':
+            one = out.dtype.type(1)
+            out = one / (one + np.exp(-out))
+        return out
+
+
+def _max_depth(left, right, roots):
+    depth = 0
+    node = np.asarray(roots, dtype=np.int64)
+    while len(node):
+        node = node[left[node] >= 0]
+        if not len(node):
+            break
+        node = np.concatenate([left[node], right[node]]).astype(np.int64)
+        depth += 1
+    return depth
+
+
+class _Builder:
+    """逐棵树追加节点，记录每组（号码）的起始树"""
+
+    def __init__(self):
+        self.feature, self.threshold, self.left, self.right = [], [], [], []
+        self.missing_left, self.zero_missing, self.value = [], [], []
+        self.roots, self.group_starts = [], []
+
+    def start_group(self):
+        self.group_starts.append(len(self.roots))
+
+    def add_tree(self, feature, threshold, left, right, missing_left, zero_missing, value):
+        offset = len(self.feature)
+        self.roots.append(offset)
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        self.feature.extend(np.where(left >= 0, feature, 0).tolist())
+        self.threshold.extend(threshold)
+        self.left.extend(np.where(left >= 0, left + offset, -1).tolist())
+        self.right.extend(np.where(right >= 0, right + offset, -1).tolist())
+        self.missing_left.extend(missing_left)
+        self.zero_missing.extend(zero_missing)
+        self.value.extend(value)
+
+    def build(self, **kwargs):
+        return CompiledTrees(self.feature, self.threshold, self.left, self.right, self.missing_left,
+                             self.zero_missing, self.value, self.roots, self.group_starts, **kwargs)
+
+
+def _xgb_base_margin(model_json):
+    """binary:logistic 的 base_score 为概率，转为 margin"""
+    raw = model_json['learner']['learner_model_param']['base_score']
+    p = float(str(raw).strip('[]'))
+    return np.float32(np.log(p / (1 - p)))
+
+
+def compile_xgb(boosters):
+    builder = _Builder()
+    base = []
+    for booster in boosters:
+        model = json.loads(booster.save_raw('json'))
+        base.append(_xgb_base_margin(model))
+        builder.start_group()
+        for tree in model['learner']['gradient_booster']['model']['trees']:
+            left = np.array(tree['left_children'])
+            cond = np.array(tree['split_conditions'], dtype=np.float32)
+            # 叶子节点的 split_conditions 即叶子值
+            builder.add_tree(tree['split_indices'], cond.tolist(), left, tree['right_children'],
+                             [bool(d) for d in tree['default_left']], [False] * len(left), cond.tolist())
+    return builder.build(strict=True, input_dtype=np.float32, value_dtype=np.float32, reduce='sum', base=base,
+                         link='sigmoid')
+
+
+def _lgb_tree_arrays(structure):
+    """LightGBM 嵌套字典树 → 节点数组（先序编号）"""
+    nodes = []
+
+    def visit(node):
+        idx = len(nodes)
+        nodes.append(None)
+        if 'leaf_value' in node:
+            nodes[idx] = (0, 0.0, -1, -1, False, False, node['leaf_value'])
+            return idx
+        left = visit(node['left_child'])
+        right = visit(node['right_child'])
+        if node.get('decision_type', '<=') != '<=':
+            raise ValueError(f"不支持的 LightGBM 分裂类型: {node.get('decision_type')}")
+        missing = node.get('missing_type', 'None')
+        default_left = bool(node.get('default_left', True))
+        threshold = float(node['threshold'])
+        # missing_type=None 时缺失值按 0 处理
+        missing_left = default_left if missing in ('NaN', 'Zero') else (0.0 <= threshold)
+        nodes[idx] = (node['split_feature'], threshold, left, right, missing_left, missing == 'Zero', 0.0)
+        return idx
+
+    visit(structure)
+    return list(zip(*nodes))
+
+
+def compile_lgb(models):
+    builder = _Builder()
+    for model in models:
+        dump = model.booster_.dump_model()
+        if not dump.get('objective', '').startswith('binary') or 'sigmoid:1' not in dump.get('objective', ''):
+            raise ValueError(f"不支持的 LightGBM 目标: {dump.get('objective')}")
+        builder.start_group()
+        for info in dump['tree_info']:
+            feature, threshold, left, right, missing_left, zero_missing, value = _lgb_tree_arrays(info['tree_structure'])
+            builder.add_tree(feature, threshold, left, right, missing_left, zero_missing, value)
+    return builder.build(strict=False, reduce='sum', link='sigmoid')
+
+
+def compile_forest(forests, positive_class=1):
+    builder = _Builder()
+    for forest in forests:
+        cls_index = int(np.flatnonzero(forest.classes_ == positive_class)[0])
+        builder.start_group()
+        for est in forest.estimators_:
+            t = est.tree_
+            value = t.value[:, 0, :]
+            proba = value[:, cls_index] / value.sum(axis=1)
+            missing_left = getattr(t, 'missing_go_to_left', np.ones(t.node_count, dtype=np.uint8)).astype(bool)
+            builder.add_tree(t.feature, t.threshold, t.children_left, t.children_right,
+                             missing_left, [False] * t.node_count, proba)
+    return builder.build(strict=False, input_dtype=np.float32, reduce='mean', link=None)
+
+
+class CompiledStacking:
+    """一个区域（前区 / 后区）全部号码的数组化 Stacking：三组基模型树 + 向量化元模型"""
+
+    def __init__(self, numbers, xgb, lgb, rf, coef, intercept):
+        self.numbers = np.asarray(numbers, dtype=np.int64)
+        self.xgb = xgb
+        self.lgb = lgb
+        self.rf = rf
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    @classmethod
+    def from_models(cls, models_source):
+        """由 {号码: {'xgb','lgb','rf','meta'}} 导出"""
+        numbers = sorted(models_source)
+        stacks = [models_source[n] for n in numbers]
+        return cls(
+            numbers,
+            compile_xgb([s['xgb'] for s in stacks]),
+            compile_lgb([s['lgb'] for s in stacks]),
+            compile_forest([s['rf'] for s in stacks]),
+            [s['meta'].coef_[0] for s in stacks],
+            [s['meta'].intercept_[0] for s in stacks]
+        )
+
+    @property
+    def nbytes(self):
+        return self.xgb.nbytes + self.lgb.nbytes + self.rf.nbytes + self.coef.nbytes + self.intercept.nbytes
+
+    def predict(self, x):
+        """单行特征 → 各号码概率（与 self.numbers 对齐）"""
+        x = np.asarray(x, dtype=np.float64).ravel()
+        base = np.column_stack([
+            self.xgb.predict(x).astype(np.float64),
+            self.lgb.predict(x),
+            self.rf.predict(x)
+        ])
+        z = (base * self.coef).sum(axis=1) + self.intercept
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def vector(self, x, size):
+        """size 维概率向量，未训练的号码为 NaN"""
+        probas = np.full(size, np.nan)
+        if len(self.numbers):
+            probas[self.numbers - 1] = self.predict(x)
+        return probas
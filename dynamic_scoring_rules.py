@@ -4,184 +4,21 @@
 动态评分规则配置（V12.4）
 1. V12.3：单维度动态评分（和值、区间比、奇偶比、大小比）
 2. V12.4：增加2维组合加成（基于历史组合转移概率）
+3. 转移概率由 transition_tables 从历史数据自动生成（历史更新后自动重建），
+   各函数可通过 tables 参数指定转移表，默认使用完整历史文件构建的表
 """
 
-import json
-import os
+from transition_tables import COMBINED_DIMENSIONS, category_id, get_default_tables
 
-# 加载2维组合转移概率配置
-COMBINED_2D_TRANSITIONS = {}
-try:
-    config_path = os.path.join(os.path.dirname(__file__), '2d_combined_transitions.json')
-    with open(config_path, 'r', encoding='utf-8') as f:
-        COMBINED_2D_TRANSITIONS = json.load(f)
-except:
-    pass  # 如果文件不存在，使用空字典
 
-# 和值区间转移规律（基于2831期统计）
-SUM_RANGE_TRANSITIONS = {
-    '40-60': {
-        '81-100': 0.3547,   # 最高概率
-        '61-80': 0.2350,
-        '101-120': 0.2222,
-    },
-    '61-80': {
-        '81-100': 0.3388,   # 最高概率
-        '61-80': 0.2345,
-        '101-120': 0.2313,
-    },
-    '81-100': {
-        '81-100': 0.3566,   # 最高概率（自转移）
-        '101-120': 0.2401,
-        '61-80': 0.2036,
-    },
-    '101-120': {
-        '81-100': 0.3443,   # 最高概率
-        '101-120': 0.2726,  # 自转移
-        '61-80': 0.2123,
-    },
-    '121-140': {
-        '81-100': 0.3388,   # 最高概率
-        '101-120': 0.2612,
-        '61-80': 0.2163,
-    },
-    '141-160': {
-        '81-100': 0.3529,   # 最高概率
-        '101-120': 0.2353,
-        '61-80': 0.1765,
-    }
-}
-
-# 区间比转移规律（基于2831期统计）
-ZONE_RATIO_TRANSITIONS = {
-    '2:1:2': {
-        '1:2:2': 0.1520,
-        '2:1:2': 0.1324,
-        '2:2:1': 0.1029,
-    },
-    '1:2:2': {
-        '2:1:2': 0.1328,
-        '1:2:2': 0.1276,
-        '2:2:1': 0.1172,
-    },
-    '2:2:1': {
-        '2:2:1': 0.1360,
-        '1:2:2': 0.1161,
-        '2:1:2': 0.1020,
-    },
-    '1:1:3': {
-        '2:1:2': 0.1507,
-        '1:1:3': 0.1360,
-        '2:2:1': 0.1176,
-    },
-    '1:3:1': {
-        '2:2:1': 0.1681,
-        '1:2:2': 0.1416,
-        '2:1:2': 0.1327,
-    },
-    '3:1:1': {
-        '2:1:2': 0.1774,
-        '2:2:1': 0.1720,
-        '1:2:2': 0.1398,
-    },
-    '0:2:3': {
-        '1:2:2': 0.1806,
-        '2:1:2': 0.1484,
-        '2:2:1': 0.1419,
-    },
-    '2:0:3': {
-        '1:2:2': 0.2045,
-        '2:1:2': 0.1591,
-        '2:2:1': 0.1136,
-    },
-    '0:3:2': {
-        '2:1:2': 0.2149,
-        '3:1:1': 0.1157,
-        '1:2:2': 0.1074,
-    },
-    '3:2:0': {
-        '2:1:2': 0.1782,
-        '3:1:1': 0.1386,
-        '1:1:3': 0.1188,
-    },
-}
-
-# 奇偶比转移规律（基于2831期统计）
-ODD_EVEN_TRANSITIONS = {
-    '5:0': {
-        '2:3': 0.3247,
-        '3:2': 0.3117,
-        '4:1': 0.1429,
-    },
-    '4:1': {
-        '3:2': 0.3965,
-        '2:3': 0.2941,
-        '4:1': 0.1329,
-    },
-    '3:2': {
-        '3:2': 0.3675,
-        '2:3': 0.3027,
-        '4:1': 0.1634,
-    },
-    '2:3': {
-        '3:2': 0.3588,
-        '2:3': 0.3009,
-        '4:1': 0.1782,
-    },
-    '1:4': {
-        '3:2': 0.3447,
-        '2:3': 0.3305,
-        '4:1': 0.1624,
-    },
-    '0:5': {
-        '3:2': 0.3333,
-        '2:3': 0.3111,
-        '4:1': 0.1556,
-    },
-}
-
-# 大小比转移规律（基于2831期统计）
-SIZE_RATIO_TRANSITIONS = {
-    '5:0': {
-        '3:2': 0.3889,
-        '2:3': 0.2593,
-        '1:4': 0.2222,
-    },
-    '4:1': {
-        '2:3': 0.3539,
-        '3:2': 0.2837,
-        '1:4': 0.1545,
-    },
-    '3:2': {
-        '2:3': 0.3447,
-        '3:2': 0.2934,
-        '1:4': 0.1687,
-    },
-    '2:3': {
-        '2:3': 0.3473,
-        '3:2': 0.2880,
-        '1:4': 0.1828,
-    },
-    '1:4': {
-        '2:3': 0.3527,
-        '3:2': 0.2849,
-        '1:4': 0.2035,
-    },
-    '0:5': {
-        '2:3': 0.3271,
-        '3:2': 0.2617,
-        '1:4': 0.2523,
-    },
-}
-
-
-def get_dynamic_zone_score(zone_ratio, last_zone_ratio):
+def get_dynamic_zone_score(zone_ratio, last_zone_ratio, tables=None):
     """
     根据上期区间比动态计算当前区间比的评分
     
     Args:
         zone_ratio: 当前期区间比
         last_zone_ratio: 上期区间比
+        tables: TransitionTables 转移表（默认基于完整历史）
         
     Returns:
         (base_score, reason): 基础分数和理由
@@ -200,10 +37,11 @@ def get_dynamic_zone_score(zone_ratio, last_zone_ratio):
     reason = f"区间比({zone_ratio})"
     
     # 如果有上期信息，根据转移概率动态调整
-    if last_zone_ratio and last_zone_ratio in ZONE_RATIO_TRANSITIONS:
-        transitions = ZONE_RATIO_TRANSITIONS[last_zone_ratio]
-        if zone_ratio in transitions:
-            prob = transitions[zone_ratio]
+    if last_zone_ratio:
+        tables = tables or get_default_tables()
+        prob = tables.single_prob('zone_ratio', category_id('zone_ratio', last_zone_ratio),
+                                  category_id('zone_ratio', zone_ratio))
+        if prob is not None:
             # 根据转移概率调整分数：概率越高，分数越高
             bonus = int(prob * 2000)  # 最高概率21.49%可获得429分加成
             base_score += bonus
@@ -212,7 +50,7 @@ def get_dynamic_zone_score(zone_ratio, last_zone_ratio):
     return base_score, reason
 
 
-def get_dynamic_odd_score(odd_ratio, last_odd_ratio, prev2_odd_ratio=None):
+def get_dynamic_odd_score(odd_ratio, last_odd_ratio, prev2_odd_ratio=None, tables=None):
     """
     根据上期奇偶比动态计算当前奇偶比的评分
     综合考虑：
@@ -263,18 +101,18 @@ def get_dynamic_odd_score(odd_ratio, last_odd_ratio, prev2_odd_ratio=None):
         
         # === 3. 如果以上都不命中，使用基本转移概率 ===
         if '回归' not in reason and '惯性' not in reason and '转换' not in reason:
-            if last_odd_ratio in ODD_EVEN_TRANSITIONS:
-                transitions = ODD_EVEN_TRANSITIONS[last_odd_ratio]
-                if odd_ratio in transitions:
-                    prob = transitions[odd_ratio]
-                    bonus = int(prob * 1500)  # 最高概率39.65%可获得594分加成
-                    base_score += bonus
-                    reason = f"奇偶比转移({last_odd_ratio}→{odd_ratio},概率{prob:.1%})"
+            tables = tables or get_default_tables()
+            prob = tables.single_prob('odd_ratio', category_id('odd_ratio', last_odd_ratio),
+                                      category_id('odd_ratio', odd_ratio))
+            if prob is not None:
+                bonus = int(prob * 1500)  # 最高概率39.65%可获得594分加成
+                base_score += bonus
+                reason = f"奇偶比转移({last_odd_ratio}→{odd_ratio},概率{prob:.1%})"
     
     return base_score, reason
 
 
-def get_dynamic_size_score(size_ratio, last_size_ratio, prev2_size_ratio=None):
+def get_dynamic_size_score(size_ratio, last_size_ratio, prev2_size_ratio=None, tables=None):
     """
     根据上期大小比动态计算当前大小比的评分
     综合考虑：
@@ -325,18 +163,18 @@ def get_dynamic_size_score(size_ratio, last_size_ratio, prev2_size_ratio=None):
         
         # === 3. 如果以上都不命中，使用基本转移概率 ===
         if '回归' not in reason and '惯性' not in reason and '转换' not in reason:
-            if last_size_ratio in SIZE_RATIO_TRANSITIONS:
-                transitions = SIZE_RATIO_TRANSITIONS[last_size_ratio]
-                if size_ratio in transitions:
-                    prob = transitions[size_ratio]
-                    bonus = int(prob * 1500)  # 最高概率38.89%可获得583分加成
-                    base_score += bonus
-                    reason = f"大小比转移({last_size_ratio}→{size_ratio},概率{prob:.1%})"
+            tables = tables or get_default_tables()
+            prob = tables.single_prob('size_ratio', category_id('size_ratio', last_size_ratio),
+                                      category_id('size_ratio', size_ratio))
+            if prob is not None:
+                bonus = int(prob * 1500)  # 最高概率38.89%可获得583分加成
+                base_score += bonus
+                reason = f"大小比转移({last_size_ratio}→{size_ratio},概率{prob:.1%})"
     
     return base_score, reason
 
 
-def get_dynamic_sum_score(red_sum, last_red_sum, prev2_red_sum=None):
+def get_dynamic_sum_score(red_sum, last_red_sum, prev2_red_sum=None, tables=None):
     """
     根据上期和值动态计算当前和值的评分
     综合考虑：
@@ -348,6 +186,7 @@ def get_dynamic_sum_score(red_sum, last_red_sum, prev2_red_sum=None):
         red_sum: 当前期红球和值
         last_red_sum: 上期红球和值
         prev2_red_sum: 上上期红球和值（用于趋势判断）
+        tables: TransitionTables 转移表（默认基于完整历史）
         
     Returns:
         (base_score, reason): 基础分数和理由
@@ -438,19 +277,19 @@ def get_dynamic_sum_score(red_sum, last_red_sum, prev2_red_sum=None):
             else:
                 last_range = 'other'
             
-            if last_range in SUM_RANGE_TRANSITIONS:
-                transitions = SUM_RANGE_TRANSITIONS[last_range]
-                if curr_range in transitions:
-                    prob = transitions[curr_range]
-                    # 根据转移概率调整分数
-                    bonus = int(prob * 1000)  # 最高概率35.66%可获得356分加成
-                    base_score += bonus
-                    reason = f"和值转移({last_range}→{curr_range},概率{prob:.1%})"
+            tables = tables or get_default_tables()
+            prob = tables.single_prob('sum_range', category_id('sum_range', last_range),
+                                      category_id('sum_range', curr_range))
+            if prob is not None:
+                # 根据转移概率调整分数
+                bonus = int(prob * 1000)  # 最高概率35.66%可获得356分加成
+                base_score += bonus
+                reason = f"和值转移({last_range}→{curr_range},概率{prob:.1%})"
     
     return base_score, reason
 
 
-def get_2d_combined_bonus(curr_features, last_features):
+def get_2d_combined_bonus(curr_features, last_features, tables=None):
     """
     计算2维组合特征加成
     如果当前组合符合历史统计的高概率转移模式，给予额外加分
@@ -458,104 +297,32 @@ def get_2d_combined_bonus(curr_features, last_features):
     Args:
         curr_features: 当前期特征字典 {'sum_range': '90-110', 'zone_ratio': '2:1:2', 'odd_ratio': '3:2', 'size_ratio': '2:3'}
         last_features: 上期特征字典
+        tables: TransitionTables 转移表（默认基于完整历史）
     
     Returns:
         (bonus_score, reason_list): 加分和理由列表
     """
-    if not last_features or not COMBINED_2D_TRANSITIONS:
+    if not last_features:
+        return 0, []
+    tables = tables or get_default_tables()
+    if not tables.combined:
         return 0, []
     
     bonus_score = 0
     reasons = []
     
-    # 1. 和值区间 + 区间比
-    combo_name = "和值区间+区间比"
-    if combo_name in COMBINED_2D_TRANSITIONS:
-        last_key = f"{last_features['sum_range']}+{last_features['zone_ratio']}"
-        curr_key = f"{curr_features['sum_range']}+{curr_features['zone_ratio']}"
-        
-        if last_key in COMBINED_2D_TRANSITIONS[combo_name]:
-            transitions = COMBINED_2D_TRANSITIONS[combo_name][last_key]
-            if curr_key in transitions:
-                prob = transitions[curr_key]
-                if prob >= 0.15:  # 只对高概率(>=15%)给加分
-                    score = int(prob * 1500)  # 最高20%概率可获得300分
-                    bonus_score += score
-                    reasons.append(f"组合（和值+区间,{prob:.1%}）")
+    # 特征字典中 sum_range 使用 2 维组合的和值区间（<70、70-90 ...）
+    feature_keys = {'sum_bucket': 'sum_range', 'zone_ratio': 'zone_ratio',
+                    'odd_ratio': 'odd_ratio', 'size_ratio': 'size_ratio'}
+    short_names = {'sum_bucket': '和值', 'zone_ratio': '区间', 'odd_ratio': '奇偶', 'size_ratio': '大小'}
     
-    # 2. 和值区间 + 奇偶比
-    combo_name = "和值区间+奇偶比"
-    if combo_name in COMBINED_2D_TRANSITIONS:
-        last_key = f"{last_features['sum_range']}+{last_features['odd_ratio']}"
-        curr_key = f"{curr_features['sum_range']}+{curr_features['odd_ratio']}"
-        
-        if last_key in COMBINED_2D_TRANSITIONS[combo_name]:
-            transitions = COMBINED_2D_TRANSITIONS[combo_name][last_key]
-            if curr_key in transitions:
-                prob = transitions[curr_key]
-                if prob >= 0.15:
-                    score = int(prob * 1500)
-                    bonus_score += score
-                    reasons.append(f"组合（和值+奇偶,{prob:.1%}）")
-    
-    # 3. 和值区间 + 大小比
-    combo_name = "和值区间+大小比"
-    if combo_name in COMBINED_2D_TRANSITIONS:
-        last_key = f"{last_features['sum_range']}+{last_features['size_ratio']}"
-        curr_key = f"{curr_features['sum_range']}+{curr_features['size_ratio']}"
-        
-        if last_key in COMBINED_2D_TRANSITIONS[combo_name]:
-            transitions = COMBINED_2D_TRANSITIONS[combo_name][last_key]
-            if curr_key in transitions:
-                prob = transitions[curr_key]
-                if prob >= 0.15:
-                    score = int(prob * 1500)
-                    bonus_score += score
-                    reasons.append(f"组合（和值+大小,{prob:.1%}）")
-    
-    # 4. 区间比 + 奇偶比
-    combo_name = "区间比+奇偶比"
-    if combo_name in COMBINED_2D_TRANSITIONS:
-        last_key = f"{last_features['zone_ratio']}+{last_features['odd_ratio']}"
-        curr_key = f"{curr_features['zone_ratio']}+{curr_features['odd_ratio']}"
-        
-        if last_key in COMBINED_2D_TRANSITIONS[combo_name]:
-            transitions = COMBINED_2D_TRANSITIONS[combo_name][last_key]
-            if curr_key in transitions:
-                prob = transitions[curr_key]
-                if prob >= 0.15:
-                    score = int(prob * 1500)
-                    bonus_score += score
-                    reasons.append(f"组合（区间+奇偶,{prob:.1%}）")
-    
-    # 5. 区间比 + 大小比
-    combo_name = "区间比+大小比"
-    if combo_name in COMBINED_2D_TRANSITIONS:
-        last_key = f"{last_features['zone_ratio']}+{last_features['size_ratio']}"
-        curr_key = f"{curr_features['zone_ratio']}+{curr_features['size_ratio']}"
-        
-        if last_key in COMBINED_2D_TRANSITIONS[combo_name]:
-            transitions = COMBINED_2D_TRANSITIONS[combo_name][last_key]
-            if curr_key in transitions:
-                prob = transitions[curr_key]
-                if prob >= 0.15:
-                    score = int(prob * 1500)
-                    bonus_score += score
-                    reasons.append(f"组合（区间+大小,{prob:.1%}）")
-    
-    # 6. 奇偶比 + 大小比
-    combo_name = "奇偶比+大小比"
-    if combo_name in COMBINED_2D_TRANSITIONS:
-        last_key = f"{last_features['odd_ratio']}+{last_features['size_ratio']}"
-        curr_key = f"{curr_features['odd_ratio']}+{curr_features['size_ratio']}"
-        
-        if last_key in COMBINED_2D_TRANSITIONS[combo_name]:
-            transitions = COMBINED_2D_TRANSITIONS[combo_name][last_key]
-            if curr_key in transitions:
-                prob = transitions[curr_key]
-                if prob >= 0.15:
-                    score = int(prob * 1500)
-                    bonus_score += score
-                    reasons.append(f"组合（奇偶+大小,{prob:.1%}）")
+    for combo_name, (d1, d2) in COMBINED_DIMENSIONS.items():
+        last_ids = (category_id(d1, last_features[feature_keys[d1]]), category_id(d2, last_features[feature_keys[d2]]))
+        curr_ids = (category_id(d1, curr_features[feature_keys[d1]]), category_id(d2, curr_features[feature_keys[d2]]))
+        prob = tables.combined_prob(combo_name, last_ids, curr_ids)
+        if prob is not None and prob >= 0.15:  # 只对高概率(>=15%)给加分
+            score = int(prob * 1500)  # 最高20%概率可获得300分
+            bonus_score += score
+            reasons.append(f"组合（{short_names[d1]}+{short_names[d2]},{prob:.1%}）")
     
     return bonus_score, reasons
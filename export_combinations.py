@@ -2,11 +2,17 @@
 """
 Daletou Export Module
 """
+import numpy as np
 import pandas as pd
 from itertools import combinations
 import os
 from datetime import datetime
 
+from combo_table import (
+    get_red_table, get_blue_space, get_red_index, EXPORT_RULE_FLAGS,
+    FLAG_RUN4, FLAG_ALL_ODD_EVEN, FLAG_SAME_ZONE, FLAG_ARITHMETIC_1_6, FLAG_GEOMETRIC_2
+)
+
 class DaletouExporter:
     """Daletou Exporter"""
     
@@ -15,37 +21,9 @@ class DaletouExporter:
         self.red_range = range(1, 36)  # 1-35
         self.blue_range = range(1, 13)  # 1-12
         
-        # Zone division
-        self.zone1 = range(1, 12)   # 1-11
-        self.zone2 = range(12, 24)  # 12-23
-        self.zone3 = range(24, 36)  # 24-35
-        
         # Cache for historical data
         self._historical_combos = None
         
-    def get_all_combinations(self, cancel_check=None):
-        """Generate all possible combinations"""
-        print("正在生成所有可能的号码组合...")
-        
-        all_combos = set()
-        red_combos = list(combinations(self.red_range, 5))
-        blue_combos = list(combinations(self.blue_range, 2))
-        
-        total = len(red_combos) * len(blue_combos)
-        print(f"前区组合数: {len(red_combos):,}")
-        print(f"后区组合数: {len(blue_combos):,}")
-        print(f"总组合数: {total:,}")
-        
-        for i, red in enumerate(red_combos):
-            if cancel_check and i % 5000 == 0:
-                if cancel_check():
-                    return None
-            for blue in blue_combos:
-                combo = tuple(sorted(red)) + tuple(sorted(blue))
-                all_combos.add(combo)
-        
-        return all_combos
-    
     def get_historical_combinations(self):
         """Get historical winning combinations (with caching)"""
         if self._historical_combos is not None:
@@ -74,6 +52,7 @@ class DaletouExporter:
                         else:
                             print(f"⚠️  数据可能不完整（当前{len(historical_combos)}期，期望至少1500+期）")
                         
+                        self._historical_combos = historical_combos
                         return historical_combos
             except Exception as e:
                 print(f"❌ 读取完整历史数据失败：{e}")
@@ -138,137 +117,6 @@ class DaletouExporter:
         
         return historical_combos
     
-    def get_consecutive_combinations(self):
-        """Get four-consecutive combinations (4+ consecutive numbers)"""
-        print("\n正在生成四连号组合...")
-        
-        consecutive_combos = set()
-        
-        # Check all combinations for 4 or more consecutive numbers in front area
-        for red in combinations(self.red_range, 5):
-            red_sorted = sorted(red)
-            
-            # Check if contains 4 or more consecutive numbers
-            has_four_consecutive = False
-            for i in range(len(red_sorted) - 3):  # Check 4 consecutive
-                if (red_sorted[i+1] == red_sorted[i] + 1 and 
-                    red_sorted[i+2] == red_sorted[i] + 2 and 
-                    red_sorted[i+3] == red_sorted[i] + 3):
-                    has_four_consecutive = True
-                    break
-            
-            if has_four_consecutive:
-                # Pair with all back combinations
-                for blue in combinations(self.blue_range, 2):
-                    combo = tuple(red_sorted) + tuple(sorted(blue))
-                    consecutive_combos.add(combo)
-        
-        print(f"四连号组合数: {len(consecutive_combos):,}")
-        return consecutive_combos
-    
-    def get_arithmetic_combinations(self):
-        """Get arithmetic/geometric combinations"""
-        print("\n正在生成等差/等比数列组合...")
-        
-        arithmetic_combos = set()
-        
-        # Arithmetic sequence: common difference from 1 to 6
-        for diff in range(1, 7):
-            for start in range(1, 36):
-                seq = [start + i * diff for i in range(5)]
-                if all(1 <= x <= 35 for x in seq):
-                    red = tuple(sorted(seq))
-                    # Pair with all back combinations
-                    for blue in combinations(self.blue_range, 2):
-                        combo = red + tuple(sorted(blue))
-                        arithmetic_combos.add(combo)
-        
-        # Geometric sequence: common ratio of 2
-        for start in range(1, 18):
-            seq = [start * (2 ** i) for i in range(5)]
-            if all(1 <= x <= 35 for x in seq):
-                red = tuple(sorted(seq))
-                for blue in combinations(self.blue_range, 2):
-                    combo = red + tuple(sorted(blue))
-                    arithmetic_combos.add(combo)
-        
-        print(f"等差/等比数列组合数: {len(arithmetic_combos)}")
-        return arithmetic_combos
-    
-    def get_odd_even_combinations(self):
-        """Get all-odd or all-even combinations"""
-        print("\n正在生成全奇/全偶组合...")
-        
-        odd_even_combos = set()
-        
-        # Front odd numbers: 1,3,5,...,35
-        odd_numbers = [x for x in range(1, 36) if x % 2 == 1]
-        # Front even numbers: 2,4,6,...,34
-        even_numbers = [x for x in range(2, 36) if x % 2 == 0]
-        
-        # All odd combinations
-        for red in combinations(odd_numbers, 5):
-            for blue in combinations(self.blue_range, 2):
-                combo = tuple(sorted(red)) + tuple(sorted(blue))
-                odd_even_combos.add(combo)
-        
-        # All even combinations
-        for red in combinations(even_numbers, 5):
-            for blue in combinations(self.blue_range, 2):
-                combo = tuple(sorted(red)) + tuple(sorted(blue))
-                odd_even_combos.add(combo)
-        
-        print(f"全奇/全偶组合数: {len(odd_even_combos)}")
-        return odd_even_combos
-    
-    def get_same_zone_combinations(self):
-        """Get same-zone combinations"""
-        print("\n正在生成同区组合...")
-        
-        same_zone_combos = set()
-        
-        # Zone 1 (1-11)
-        for red in combinations(self.zone1, 5):
-            for blue in combinations(self.blue_range, 2):
-                combo = tuple(sorted(red)) + tuple(sorted(blue))
-                same_zone_combos.add(combo)
-        
-        # Zone 2 (12-23)
-        for red in combinations(self.zone2, 5):
-            for blue in combinations(self.blue_range, 2):
-                combo = tuple(sorted(red)) + tuple(sorted(blue))
-                same_zone_combos.add(combo)
-        
-        # Zone 3 (24-35)
-        for red in combinations(self.zone3, 5):
-            for blue in combinations(self.blue_range, 2):
-                combo = tuple(sorted(red)) + tuple(sorted(blue))
-                same_zone_combos.add(combo)
-        
-        print(f"同区组合数: {len(same_zone_combos)}")
-        return same_zone_combos
-
-    def is_arithmetic_sequence(self, red_sorted):
-        """Check if it's an arithmetic sequence with diff 1-6"""
-        if len(red_sorted) < 5: return False
-        diff = red_sorted[1] - red_sorted[0]
-        if diff < 1 or diff > 6:
-            return False
-        for i in range(1, 4):
-            if red_sorted[i+1] - red_sorted[i] != diff:
-                return False
-        return True
-        
-    def is_geometric_sequence(self, red_sorted):
-        """Check if it's a geometric sequence with ratio 2"""
-        if len(red_sorted) < 5 or red_sorted[0] == 0: return False
-        if red_sorted[1] / red_sorted[0] != 2:
-            return False
-        for i in range(1, 4):
-            if red_sorted[i+1] / red_sorted[i] != 2:
-                return False
-        return True
-
     def is_valid_combination(self, combo, kill_red_set=None, kill_blue_set=None, sum_range=None, odd_even_ratio=None):
         """
         Check if a single combination is valid according to all rules.
@@ -282,34 +130,21 @@ class DaletouExporter:
         if combo in self.get_historical_combinations():
             return False
             
-        # 2. Four-consecutive
-        for i in range(len(red_sorted) - 3):
-            if (red_sorted[i+1] == red_sorted[i] + 1 and 
-                red_sorted[i+2] == red_sorted[i] + 2 and 
-                red_sorted[i+3] == red_sorted[i] + 3):
-                return False
-                
-        # 3. Arithmetic/Geometric
-        if self.is_arithmetic_sequence(red_sorted) or self.is_geometric_sequence(red_sorted):
-            return False
-            
-        # 4. All odd/even
-        odd_count = sum(1 for n in red if n % 2 == 1)
-        if odd_count == 0 or odd_count == 5:
-            return False
-            
-        # 5. Same zone
-        zone1_count = sum(1 for n in red if n in self.zone1)
-        zone2_count = sum(1 for n in red if n in self.zone2)
-        zone3_count = sum(1 for n in red if n in self.zone3)
-        if zone1_count == 5 or zone2_count == 5 or zone3_count == 5:
+        # 2-5. Four-consecutive / arithmetic-geometric / all odd-even / same zone
+        table = get_red_table()
+        red_id = int(table.rank([red_sorted])[0])
+        if table.flags[red_id] & EXPORT_RULE_FLAGS:
             return False
+        odd_count = int(table.odd_count[red_id])
             
-        # 6. Kill numbers
-        if kill_red_set and any(n in kill_red_set for n in red):
-            return False
-        if kill_blue_set and any(n in kill_blue_set for n in blue):
+        # 6. Kill numbers (per-number bitsets)
+        if kill_red_set and not table.bitset_test(table.constraint_bitset(kill_red_set), [red_id])[0]:
             return False
+        if kill_blue_set:
+            blue_space = get_blue_space()
+            blue_id = blue_space.rank([sorted(blue)])
+            if not blue_space.bitset_test(blue_space.constraint_bitset(kill_blue_set), blue_id)[0]:
+                return False
             
         # 7. Sum range
         if sum_range:
@@ -325,83 +160,84 @@ class DaletouExporter:
                 
         return True
     
-    def get_filtered_combinations(self, kill_red=None, kill_blue=None, sum_range=None, odd_even_ratio=None, cancel_check=None):
-        """Get filtered combinations based on all criteria"""
+    def get_filtered_combinations(self, kill_red=None, kill_blue=None, sum_range=None, odd_even_ratio=None, cancel_check=None,
+                                  must_red=None, must_blue=None):
+        """Get filtered combinations based on all criteria
+        
+        Fixed rules, sum range and odd-even ratio are resolved through the red
+        feature index, kill / must-include numbers through per-number bitsets,
+        so only surviving combinations are enumerated.
+        """
         # Handle parameters
         kill_red = kill_red or []
         kill_blue = kill_blue or []
         kill_red_set = set(kill_red)
         kill_blue_set = set(kill_blue)
         
-        # 1. Generate all combinations
-        all_combos = self.get_all_combinations(cancel_check=cancel_check)
-        if all_combos is None: return None
-        
-        # 2-6. Get combinations to exclude
-        historical = self.get_historical_combinations()
-        consecutive = self.get_consecutive_combinations()
-        arithmetic = self.get_arithmetic_combinations()
-        odd_even = self.get_odd_even_combinations()
-        same_zone = self.get_same_zone_combinations()
+        table = get_red_table()
+        index = get_red_index()
+        blue_combos = list(combinations(self.blue_range, 2))
+        total = len(table) * len(blue_combos)
         
-        # 7. Kill number filter
-        kill_combos = set()
-        if kill_red_set or kill_blue_set:
-            for i, combo in enumerate(all_combos):
-                if cancel_check and i % 100000 == 0:
-                    if cancel_check(): return None
-                red = set(combo[:5])
-                blue = set(combo[5:])
-                if (kill_red_set and red & kill_red_set) or (kill_blue_set and blue & kill_blue_set):
-                    kill_combos.add(combo)
-        
-        # 8. Sum range filter
-        sum_combos = set()
+        odd_counts = None
+        if odd_even_ratio:
+            odd_counts = [n for n in range(6) if f"{n}:{5-n}" == odd_even_ratio]
         if sum_range and len(sum_range) == 2:
-            min_sum, max_sum = sum_range
-            for i, combo in enumerate(all_combos):
-                if cancel_check and i % 100000 == 0:
-                    if cancel_check(): return None
-                red_sum = sum(combo[:5])
-                if red_sum < min_sum or red_sum > max_sum:
-                    sum_combos.add(combo)
-        
-        # 9. Odd-even ratio filter
-        ratio_combos = set()
+            sum_range = (sum_range[0], sum_range[1])
+        else:
+            sum_range = None
+        
+        # 1-5. Fixed rules + 7. sum range + 8. odd-even ratio via the index
+        red_ids = index.select(sum_range=sum_range, odd_counts=odd_counts, exclude_flags=EXPORT_RULE_FLAGS)
+        
+        # 6. Kill numbers + 9. must-include numbers: OR / AND of per-number bitsets
+        blue_space = get_blue_space()
+        red_ids = red_ids[table.bitset_test(table.constraint_bitset(kill_red_set, must_red), red_ids)]
+        valid_blues = [tuple(b) for b in blue_space.combos[blue_space.allowed_ids(kill_blue_set, must_blue)].tolist()]
+        
+        # Enumerate survivors, dropping historical draws
+        historical = self.get_historical_combinations()
+        filtered_combos = set()
+        for i, red in enumerate(table.combos[red_ids].tolist()):
+            if cancel_check and i % 5000 == 0:
+                if cancel_check(): return None
+            red = tuple(red)
+            for blue in valid_blues:
+                combo = red + blue
+                if combo not in historical:
+                    filtered_combos.add(combo)
+        
+        # Per-rule exclusion counts (tickets; rules may overlap)
+        n_blue = len(blue_combos)
+        flags = table.flags
+        sum_excluded = 0
+        if sum_range:
+            sum_excluded = int(((table.red_sum < sum_range[0]) | (table.red_sum > sum_range[1])).sum()) * n_blue
+        ratio_excluded = 0
         if odd_even_ratio:
-            for i, combo in enumerate(all_combos):
-                if cancel_check and i % 100000 == 0:
-                    if cancel_check(): return None
-                red_numbers = combo[:5]
-                odd_count = sum(1 for n in red_numbers if n % 2 == 1)
-                even_count = 5 - odd_count
-                ratio_str = f"{odd_count}:{even_count}"
-                if ratio_str != odd_even_ratio:
-                    ratio_combos.add(combo)
-        
-        # Merge all exclusions
-        excluded = historical | consecutive | arithmetic | odd_even | same_zone | kill_combos | sum_combos | ratio_combos
-        
-        # Filter to get final combinations
-        filtered_combos = all_combos - excluded
+            ratio_excluded = int((~np.isin(table.odd_count, odd_counts)).sum()) * n_blue
+        kill_excluded = 0
+        if kill_red_set or kill_blue_set:
+            kill_excluded = total - len(table.allowed_ids(kill_red_set)) * len(blue_space.allowed_ids(kill_blue_set))
         
         return {
-            'all_combos': all_combos,
+            'total': total,
             'filtered_combos': filtered_combos,
-            'excluded': excluded,
+            'excluded_count': total - len(filtered_combos),
             'stats': {
                 'historical': len(historical),
-                'consecutive': len(consecutive),
-                'arithmetic': len(arithmetic),
-                'odd_even': len(odd_even),
-                'same_zone': len(same_zone),
-                'kill_combos': len(kill_combos),
-                'sum_combos': len(sum_combos),
-                'ratio_combos': len(ratio_combos)
+                'consecutive': int(((flags & FLAG_RUN4) != 0).sum()) * n_blue,
+                'arithmetic': int(((flags & (FLAG_ARITHMETIC_1_6 | FLAG_GEOMETRIC_2)) != 0).sum()) * n_blue,
+                'odd_even': int(((flags & FLAG_ALL_ODD_EVEN) != 0).sum()) * n_blue,
+                'same_zone': int(((flags & FLAG_SAME_ZONE) != 0).sum()) * n_blue,
+                'kill_combos': kill_excluded,
+                'sum_combos': sum_excluded,
+                'ratio_combos': ratio_excluded
             }
         }
     
-    def export_filtered_combinations(self, output_dir='exports', kill_red=None, kill_blue=None, sum_range=None, odd_even_ratio=None, cancel_check=None):
+    def export_filtered_combinations(self, output_dir='exports', kill_red=None, kill_blue=None, sum_range=None, odd_even_ratio=None, cancel_check=None,
+                                     must_red=None, must_blue=None):
         """Export filtered combinations"""
         print("\n" + "="*60)
         print("开始生成和过滤大乐透号码组合")
@@ -415,6 +251,10 @@ class DaletouExporter:
             print(f"\n杀红球设置: {', '.join([f'{n:02d}' for n in sorted(kill_red)])}")
         if kill_blue:
             print(f"杀蓝球设置: {', '.join([f'{n:02d}' for n in sorted(kill_blue)])}")
+        if must_red:
+            print(f"红球胆码: {', '.join([f'{n:02d}' for n in sorted(must_red)])}")
+        if must_blue:
+            print(f"蓝球胆码: {', '.join([f'{n:02d}' for n in sorted(must_blue)])}")
         if sum_range and len(sum_range) == 2:
             print(f"和值范围设置: {sum_range[0]} - {sum_range[1]}")
         if odd_even_ratio:
@@ -425,14 +265,14 @@ class DaletouExporter:
             os.makedirs(output_dir)
         
         # Get filtered combinations
-        result = self.get_filtered_combinations(kill_red, kill_blue, sum_range, odd_even_ratio, cancel_check=cancel_check)
+        result = self.get_filtered_combinations(kill_red, kill_blue, sum_range, odd_even_ratio, cancel_check=cancel_check,
+                                                must_red=must_red, must_blue=must_blue)
         if result is None: return None
         
-        all_combos = result['all_combos']
         filtered_combos = result['filtered_combos']
-        excluded = result['excluded']
+        excluded_count = result['excluded_count']
         stats = result['stats']
-        total_count = len(all_combos)
+        total_count = result['total']
         
         # Print statistics
         print("\n" + "="*60)
@@ -449,12 +289,12 @@ class DaletouExporter:
             print(f"  7. 和值过滤: {stats['sum_combos']:,}")
         if stats['ratio_combos']:
             print(f"  8. 奇偶比过滤: {stats['ratio_combos']:,}")
-        print(f"  合并后总排除数: {len(excluded):,}")
+        print(f"  合并后总排除数: {excluded_count:,}")
         
         print(f"\n" + "="*60)
         print(f"过滤结果:")
         print(f"  总组合数: {total_count:,}")
-        print(f"  排除数量: {len(excluded):,}")
+        print(f"  排除数量: {excluded_count:,}")
         print(f"  剩余数量: {len(filtered_combos):,}")
         print(f"  剩余比例: {len(filtered_combos)/total_count*100:.2f}%")
         print("="*60)
@@ -528,7 +368,7 @@ class DaletouExporter:
                 '奇偶比': odd_even_ratio if odd_even_ratio else None,
                 '过滤组合数': stats['ratio_combos'],
             },
-            '总排除数': len(excluded),
+            '总排除数': excluded_count,
             '剩余组合数': len(filtered_combos),
             '剩余比例': f"{len(filtered_combos)/total_count*100:.2f}%",
             '导出文件': export_files
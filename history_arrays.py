@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+历史数据列式视图
+1. 将 history_df 的列表列转换为定长 NumPy 数组（期号、红球、蓝球、出号矩阵、和值等）
+2. 提供基于滑动窗口的相似模式检索（支持任意窗口长度与多种距离度量）
+"""
+
+import hashlib
+import re
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+RED_MAX = 35
+BLUE_MAX = 12
+
+# 支持的窗口距离度量
+WINDOW_METRICS = ('l1', 'l2', 'chebyshev', 'shape')
+
+
+class HistoryArrays:
+    """历史开奖的列式数组表示（只读，按期号升序）"""
+
+    def __init__(self, periods, red, blue, dates=None):
+        self.periods = np.asarray(periods, dtype=np.int64)
+        self.red = np.asarray(red, dtype=np.int16).reshape(-1, 5)
+        self.blue = np.asarray(blue, dtype=np.int16).reshape(-1, 2)
+        self.dates = list(dates) if dates is not None else []
+
+        n = len(self.periods)
+        rows = np.arange(n)[:, None]
+        # 出号矩阵（第 i 期号码 k 是否出现，列下标 = 号码 - 1）
+        self.red_incidence = np.zeros((n, RED_MAX), dtype=np.uint8)
+        self.red_incidence[rows, self.red - 1] = 1
+        self.blue_incidence = np.zeros((n, BLUE_MAX), dtype=np.uint8)
+        self.blue_incidence[rows, self.blue - 1] = 1
+
+        # 逐期基础统计
+        self.red_sum = self.red.sum(axis=1).astype(np.int32)
+        self.blue_sum = self.blue.sum(axis=1).astype(np.int32)
+        self.red_span = (self.red.max(axis=1) - self.red.min(axis=1)).astype(np.int32) if n else np.zeros(0, np.int32)
+        self.blue_span = (self.blue.max(axis=1) - self.blue.min(axis=1)).astype(np.int32) if n else np.zeros(0, np.int32)
+        self.odd_count = (self.red % 2 == 1).sum(axis=1).astype(np.int8)
+        self.zone_counts = np.stack([
+            (self.red <= 11).sum(axis=1),
+            ((self.red >= 12) & (self.red <= 23)).sum(axis=1),
+            (self.red >= 24).sum(axis=1)
+        ], axis=1).astype(np.int8) if n else np.zeros((0, 3), np.int8)
+        self.small_count = (self.red <= 17).sum(axis=1).astype(np.int8)
+
+        self._hash = None
+
+    @classmethod
+    def from_df(cls, df):
+        """从 DataFrame(period/date/red/blue) 构建"""
+        if df is None or len(df) == 0:
+            return cls(np.zeros(0), np.zeros((0, 5)), np.zeros((0, 2)))
+        red = np.sort(np.array(df['red'].tolist(), dtype=np.int16), axis=1)
+        blue = np.sort(np.array(df['blue'].tolist(), dtype=np.int16), axis=1)
+        dates = df['date'].tolist() if 'date' in df.columns else None
+        return cls(df['period'].to_numpy(), red, blue, dates)
+
+    @classmethod
+    def from_text(cls, data_str):
+        """直接解析历史数据文本（期号 日期 红球×5-蓝球×2），无需经过 pandas"""
+        records = []
+        for line in data_str.strip().split('\n'):
+            parts = re.split(r'\s+', line.strip())
+            if len(parts) < 3 or not parts[0].isdigit():
+                continue
+            numbers = ' '.join(parts[2:])
+            if '-' not in numbers:
+                continue
+            red_part, blue_part = numbers.split('-', 1)
+            red_nums = [int(x) for x in red_part.split() if x.isdigit()]
+            blue_nums = [int(x) for x in blue_part.split() if x.isdigit()]
+            if len(red_nums) == 5 and len(blue_nums) == 2:
+                records.append((int(parts[0]), parts[1], sorted(red_nums), sorted(blue_nums)))
+        if not records:
+            return cls(np.zeros(0), np.zeros((0, 5)), np.zeros((0, 2)))
+        periods, dates, red, blue = zip(*records)
+        return cls(periods, red, blue, dates)
+
+    def __len__(self):
+        return len(self.periods)
+
+    def prefix(self, n):
+        """前 n 期的视图（各数组切片共享内存，不重新计算）"""
+        view = self.__class__.__new__(self.__class__)
+        size = len(self)
+        for name, value in vars(self).items():
+            if isinstance(value, np.ndarray) and len(value) == size:
+                value = value[:n]
+            elif name == 'dates':
+                value = value[:n]
+            setattr(view, name, value)
+        view._hash = self._hash if n == size else None
+        return view
+
+    @property
+    def history_hash(self):
+        """历史数据内容哈希（期号+号码），用于判断派生缓存是否过期"""
+        if self._hash is None:
+            h = hashlib.sha1()
+            h.update(self.periods.tobytes())
+            h.update(self.red.astype(np.int8).tobytes())
+            h.update(self.blue.astype(np.int8).tobytes())
+            self._hash = h.hexdigest()
+        return self._hash
+
+
+def window_distances(values, pattern, metric='l1'):
+    """计算序列所有长度为 len(pattern) 的滑动窗口与 pattern 的距离
+
+    Args:
+        values: 一维序列（如逐期和值）
+        pattern: 目标模式
+        metric: l1 / l2 / chebyshev / shape（z-score 归一化后的欧氏距离，只比较走势形状）
+
+    Returns:
+        长度为 len(values) - len(pattern) + 1 的距离数组，下标为窗口起点
+    """
+    values = np.asarray(values, dtype=np.float64)
+    pattern = np.asarray(pattern, dtype=np.float64)
+    w = len(pattern)
+    if w == 0 or len(values) < w:
+        return np.zeros(0)
+    if metric not in WINDOW_METRICS:
+        raise ValueError(f"不支持的距离度量: {metric}")
+
+    windows = sliding_window_view(values, w)
+    if metric == 'l1':
+        return np.abs(windows - pattern).sum(axis=1)
+    if metric == 'chebyshev':
+        return np.abs(windows - pattern).max(axis=1)
+    if metric == 'l2':
+        # ||x-p||^2 = sum(x^2) - 2 x·p + sum(p^2)，均为一次卷积
+        sq = np.convolve(values * values, np.ones(w), mode='valid')
+        cross = np.convolve(values, pattern[::-1], mode='valid')
+        return np.sqrt(np.maximum(sq - 2 * cross + (pattern * pattern).sum(), 0))
+
+    # shape: 先对窗口和模式分别做 z-score 再求欧氏距离
+    def _znorm(x):
+        std = x.std(axis=-1, keepdims=True)
+        return (x - x.mean(axis=-1, keepdims=True)) / np.where(std > 0, std, 1.0)
+    return np.sqrt(((_znorm(windows) - _znorm(pattern)) ** 2).sum(axis=1))
+
+
+def search_similar_windows(values, window=3, top_k=5, metric='l1'):
+    """以序列末尾 window 期为模式，在全历史中检索最相似的 top_k 个窗口
+
+    只考虑与末尾模式不重叠且存在“下一期”的窗口。
+
+    Returns:
+        (starts, distances): 按距离升序的窗口起点与距离（距离相同取较早窗口）
+    """
+    values = np.asarray(values)
+    n = len(values)
+    if window <= 0 or n < 2 * window:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    pattern = values[n - window:]
+    dists = window_distances(values[:n - window], pattern, metric)
+    if len(dists) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    k = min(top_k, len(dists))
+    if k < len(dists):
+        cand = np.argpartition(dists, k - 1)[:k]
+        # 并列距离的边界元素可能被随机截断，这里把等于第 k 小距离的窗口全部纳入后再稳定排序
+        cand = np.flatnonzero(dists <= dists[cand].max())
+    else:
+        cand = np.arange(len(dists))
+    order = cand[np.lexsort((cand, dists[cand]))][:k]
+    return order.astype(np.int64), dists[order]
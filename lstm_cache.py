@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+蓝球 LSTM 逐期概率表
+1. 对整段蓝球历史一次批量前向，得到每期的 LSTM 概率向量 (N+1)×12：
+   第 t 行为用第 t 期之前 L 期蓝球预测第 t 期的概率（t < L 时为 NaN），第 N 行为下一期（实盘预测）
+2. 按模型权重哈希缓存；历史在末尾追加新开奖时只计算新增的行
+3. 回测截断历史是缓存历史的前缀，可直接按行号取用，无需重算
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+SEQUENCE_LENGTH = 10
+
+
+def model_hash(model):
+    """LSTM 权重内容哈希（训练或重新加载后权重变化即失效）"""
+    h = hashlib.sha1()
+    for name in ('W', 'b', 'Wy', 'by'):
+        arr = np.ascontiguousarray(getattr(model, name))
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+class LSTMProbabilityTable:
+    """某个 LSTM 模型在蓝球历史上的逐期概率"""
+
+    def __init__(self, model_key, sequence_length=SEQUENCE_LENGTH):
+        self.model_key = model_key
+        self.sequence_length = sequence_length
+        self.periods = np.zeros(0, dtype=np.int64)
+        self.blue = np.zeros((0, 2), dtype=np.int16)
+        self.probas = np.zeros((0, 12))
+
+    def __len__(self):
+        return len(self.periods)
+
+    @classmethod
+    def from_arrays(cls, model, arrays, sequence_length=SEQUENCE_LENGTH):
+        table = cls(model_hash(model), sequence_length)
+        table.extend(model, arrays)
+        return table
+
+    def covers(self, arrays):
+        """arrays 是否为已缓存历史的前缀（含相等）"""
+        n = len(arrays)
+        return n <= len(self) and np.array_equal(self.periods[:n], arrays.periods) and \
+            np.array_equal(self.blue[:n], arrays.blue)
+
+    def extend(self, model, arrays):
+        """history 在末尾追加了新开奖时只计算新增行；前缀不一致则返回 False（需要重建）"""
+        n_old, n = len(self), len(arrays)
+        if n < n_old or not np.array_equal(self.periods, arrays.periods[:n_old]) or \
+                not np.array_equal(self.blue, arrays.blue[:n_old]):
+            return False
+        L = self.sequence_length
+        # 需要计算的行：n_old+1 .. n（第 n_old 行在上次已作为“下一期”算出），且至少从第 L 行开始
+        first = max(L, n_old + 1)
+        probas = np.full((n + 1, 12), np.nan)
+        probas[:len(self.probas)] = self.probas
+        if n >= L and first <= n:
+            incidence = np.asarray(arrays.blue_incidence)
+            windows = np.lib.stride_tricks.sliding_window_view(incidence, L, axis=0).transpose(0, 2, 1)
+            # 第 t 行的输入窗口为 incidence[t-L:t]，即 windows[t-L]
+            probas[first:n + 1] = model.predict_batch(windows[first - L:n - L + 1])
+        self.probas = probas
+        self.periods = np.asarray(arrays.periods, dtype=np.int64).copy()
+        self.blue = np.asarray(arrays.blue, dtype=np.int16).copy()
+        return True
+
+    def row(self, t):
+        """第 t 行概率（用前 t 期历史预测第 t 期）；不足 L 期返回 None"""
+        if t < self.sequence_length or t >= len(self.probas):
+            return None
+        return self.probas[t]
+
+    def for_period(self, period):
+        """按期号取概率：历史内的期取对应行，晚于最新期的取“下一期”行"""
+        period = int(period)
+        if len(self) > 0 and period > int(self.periods[-1]):
+            return self.row(len(self))
+        idx = np.flatnonzero(self.periods == period)
+        return self.row(int(idx[0])) if len(idx) else None
+
+
+_TABLE_CACHE = OrderedDict()
+_TABLE_CACHE_SIZE = 4
+
+
+def get_lstm_table(model, arrays):
+    """模型在 arrays 上的逐期概率表：按模型哈希缓存，arrays 为缓存历史的前缀时直接复用，追加新开奖时增量扩展"""
+    key = model_hash(model)
+    table = _TABLE_CACHE.get(key)
+    if table is None or not (table.covers(arrays) or table.extend(model, arrays)):
+        table = LSTMProbabilityTable.from_arrays(model, arrays)
+        _TABLE_CACHE[key] = table
+        while len(_TABLE_CACHE) > _TABLE_CACHE_SIZE:
+            _TABLE_CACHE.popitem(last=False)
+    else:
+        _TABLE_CACHE.move_to_end(key)
+    return table
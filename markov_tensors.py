@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+马尔可夫转移张量
+1. 将逐期开奖编码为离散特征（奇数个数、和值区间、区间比、大小比、蓝球和值、蓝球跨度）
+2. 每个特征维护 1 阶 / 2 阶转移计数张量（NumPy 数组），新开奖追加为 O(1) 更新
+3. 支持对候选数组批量查询转移概率
+"""
+
+import numpy as np
+
+# 和值区间边界（与 2 维组合转移统计一致）：<70, 70-90, 90-110, 110-130, 130+
+SUM_BUCKET_EDGES = (70, 90, 110, 130)
+SUM_BUCKET_LABELS = ('<70', '70-90', '90-110', '110-130', '130+')
+
+
+def _red_array(red):
+    return np.asarray(red, dtype=np.int16).reshape(-1, 5)
+
+
+def _blue_array(blue):
+    return np.asarray(blue, dtype=np.int16).reshape(-1, 2)
+
+
+def _odd_count(red=None, blue=None):
+    return (_red_array(red) % 2 == 1).sum(axis=1)
+
+
+def _sum_bucket(red=None, blue=None):
+    return np.searchsorted(SUM_BUCKET_EDGES, _red_array(red).sum(axis=1), side='right')
+
+
+def _zone_ratio(red=None, blue=None):
+    r = _red_array(red)
+    z1 = (r <= 11).sum(axis=1)
+    z2 = ((r >= 12) & (r <= 23)).sum(axis=1)
+    return z1 * 6 + z2
+
+
+def _size_ratio(red=None, blue=None):
+    return (_red_array(red) <= 17).sum(axis=1)
+
+
+def _blue_sum(red=None, blue=None):
+    return _blue_array(blue).sum(axis=1)
+
+
+def _blue_span(red=None, blue=None):
+    b = _blue_array(blue)
+    return b.max(axis=1) - b.min(axis=1)
+
+
+def _zone_label(i):
+    z1, z2 = divmod(int(i), 6)
+    return f"{z1}:{z2}:{5 - z1 - z2}"
+
+
+# 特征注册表: 名称 -> (类别数, 编码函数, 类别标签函数)
+FEATURES = {
+    'odd_count': (6, _odd_count, lambda i: f"{int(i)}:{5 - int(i)}"),
+    'sum_bucket': (len(SUM_BUCKET_LABELS), _sum_bucket, lambda i: SUM_BUCKET_LABELS[int(i)]),
+    'zone_ratio': (36, _zone_ratio, _zone_label),
+    'size_ratio': (6, _size_ratio, lambda i: f"{int(i)}:{5 - int(i)}"),
+    'blue_sum': (24, _blue_sum, lambda i: str(int(i))),
+    'blue_span': (12, _blue_span, lambda i: str(int(i))),
+}
+
+
+def encode_feature(name, red=None, blue=None):
+    """将红球 (M×5) / 蓝球 (M×2) 数组编码为特征类别 ID 数组"""
+    return np.asarray(FEATURES[name][1](red=red, blue=blue), dtype=np.int64)
+
+
+class TransitionTensor:
+    """单个离散特征的 k 阶转移计数张量，形状为 (C,)*order + (C,)"""
+
+    def __init__(self, cardinality, order=1):
+        self.cardinality = cardinality
+        self.order = order
+        self.counts = np.zeros((cardinality,) * (order + 1), dtype=np.int32)
+
+    def fit(self, ids):
+        """由完整类别序列一次性统计全部转移（向量化）"""
+        ids = np.asarray(ids, dtype=np.int64)
+        self.counts[...] = 0
+        n = len(ids) - self.order
+        if n <= 0:
+            return self
+        index = tuple(ids[k:k + n] for k in range(self.order + 1))
+        flat = np.ravel_multi_index(index, self.counts.shape)
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape).astype(np.int32)
+        return self
+
+    def update(self, state, next_id):
+        """追加一次转移 state(长度为 order 的类别元组) → next_id"""
+        self.counts[tuple(state) + (int(next_id),)] += 1
+
+    def row(self, state):
+        return self.counts[tuple(int(s) for s in state)]
+
+    def probabilities(self, state, alpha=0.0):
+        """给定状态下各类别的转移概率（alpha 为加性平滑）；状态未出现过时返回全 0"""
+        row = self.row(state).astype(np.float64) + alpha
+        total = row.sum()
+        return row / total if total > 0 else np.zeros(self.cardinality)
+
+    def top_next(self, state, k=3):
+        """给定状态下计数最高的 k 个后继类别（计数为 0 的不返回，并列时类别 ID 小者优先）"""
+        row = self.row(state)
+        order = np.argsort(-row, kind='stable')[:k]
+        return [int(i) for i in order if row[i] > 0]
+
+
+class MarkovTransitions:
+    """多特征、多阶马尔可夫转移系统"""
+
+    def __init__(self, features=None, orders=(1, 2)):
+        self.features = tuple(features or FEATURES.keys())
+        self.orders = tuple(orders)
+        self.max_order = max(self.orders)
+        self.tensors = {
+            (name, order): TransitionTensor(FEATURES[name][0], order)
+            for name in self.features for order in self.orders
+        }
+        # 每个特征最近 max_order 期的类别（用作当前状态）
+        self.context = {name: [] for name in self.features}
+        self.n_seen = 0
+        self.last_period = None
+
+    @classmethod
+    def from_arrays(cls, arrays, features=None, orders=(1, 2)):
+        """由 HistoryArrays 一次性构建"""
+        system = cls(features=features, orders=orders)
+        for name in system.features:
+            ids = encode_feature(name, red=arrays.red, blue=arrays.blue)
+            for order in system.orders:
+                system.tensors[(name, order)].fit(ids)
+            system.context[name] = ids[-system.max_order:].tolist()
+        system.n_seen = len(arrays)
+        system.last_period = int(arrays.periods[-1]) if len(arrays) else None
+        return system
+
+    def append(self, red, blue, period=None):
+        """追加一期开奖（O(1) 更新所有特征、所有阶数的计数）"""
+        for name in self.features:
+            next_id = int(encode_feature(name, red=red, blue=blue)[0])
+            ctx = self.context[name]
+            for order in self.orders:
+                if len(ctx) >= order:
+                    self.tensors[(name, order)].update(ctx[-order:], next_id)
+            ctx.append(next_id)
+            del ctx[:-self.max_order]
+        self.n_seen += 1
+        if period is not None:
+            self.last_period = int(period)
+
+    def extend_from_arrays(self, arrays):
+        """history 在末尾追加了新开奖时增量更新；前缀不一致则返回 False（需要重建）"""
+        if self.n_seen > len(arrays):
+            return False
+        if self.n_seen > 0 and int(arrays.periods[self.n_seen - 1]) != self.last_period:
+            return False
+        for i in range(self.n_seen, len(arrays)):
+            self.append(arrays.red[i], arrays.blue[i], arrays.periods[i])
+        return True
+
+    def state(self, name, order=1):
+        ctx = self.context[name]
+        return tuple(ctx[-order:]) if len(ctx) >= order else None
+
+    def probabilities(self, name, order=1, state=None, alpha=0.0, backoff=True):
+        """当前（或指定）状态下特征 name 的下一期类别分布
+
+        backoff=True 时高阶状态未出现过则退回低一阶
+        """
+        state = self.state(name, order) if state is None else tuple(state)
+        if state is None:
+            return np.zeros(FEATURES[name][0])
+        probs = self.tensors[(name, order)].probabilities(state, alpha=alpha)
+        if backoff and probs.sum() == 0 and order > 1 and (name, order - 1) in self.tensors:
+            return self.probabilities(name, order - 1, state=state[1:], alpha=alpha, backoff=True)
+        return probs
+
+    def lookup(self, name, candidate_ids, order=1, alpha=0.0, backoff=True):
+        """批量查询候选类别数组的转移概率"""
+        probs = self.probabilities(name, order=order, alpha=alpha, backoff=backoff)
+        return probs[np.asarray(candidate_ids, dtype=np.int64)]
+
+    def score_candidates(self, name, red=None, blue=None, order=1, alpha=0.0):
+        """对候选号码数组（红 M×5 / 蓝 M×2）直接返回其特征的转移概率"""
+        return self.lookup(name, encode_feature(name, red=red, blue=blue), order=order, alpha=alpha)
+
+    def top_next(self, name, k=3, order=1):
+        """当前状态下最可能的 k 个后继类别 ID"""
+        state = self.state(name, order)
+        if state is None:
+            return []
+        return self.tensors[(name, order)].top_next(state, k)
+
+    def label(self, name, category_id):
+        return FEATURES[name][2](category_id)
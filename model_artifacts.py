@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+目录式模型制品
+1. 每个标签一个目录 model_state_{tag}/，manifest.json 记录组件清单、文件与训练元数据
+2. 小表与 NumPy 权重存为 .npy（LSTM 权重、马尔可夫计数张量），加载时以写时复制方式内存映射
+3. 每个模型族（前区 / 后区 Stacking、多标签模型）单独一个 joblib 文件，首次访问时才反序列化
+4. 记录每个组件的加载耗时与大小，形成启动报告
+5. 兼容旧的单文件 model_state_{tag}.pkl
+"""
+
+import importlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+ARTIFACT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+
+def artifact_path(assets_dir, tag):
+    return os.path.join(assets_dir, f'model_state_{tag}')
+
+
+def legacy_path(assets_dir, tag):
+    return os.path.join(assets_dir, f'model_state_{tag}.pkl')
+
+
+def _dir_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+# --- 编解码：json / joblib / arrays（含 ndarray 属性的普通对象） / markov ---
+
+def _to_json(value):
+    if isinstance(value, np.dtype):
+        return {'__dtype__': value.str}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"无法序列化为 JSON: {type(value)}")
+
+
+def _from_json(value):
+    if isinstance(value, dict) and '__dtype__' in value:
+        return np.dtype(value['__dtype__'])
+    return value
+
+
+def _save_arrays_object(obj, path):
+    os.makedirs(path)
+    attrs = {}
+    for name, value in vars(obj).items():
+        if isinstance(value, np.ndarray):
+            np.save(os.path.join(path, f'{name}.npy'), value)
+        else:
+            attrs[name] = value
+    cls = type(obj)
+    with open(os.path.join(path, 'attrs.json'), 'w', encoding='utf-8') as f:
+        json.dump({'class': f'{cls.__module__}:{cls.__qualname__}', 'attrs': attrs}, f, default=_to_json)
+
+
+def _load_arrays_object(path):
+    with open(os.path.join(path, 'attrs.json'), encoding='utf-8') as f:
+        spec = json.load(f)
+    module, qualname = spec['class'].split(':')
+    cls = getattr(importlib.import_module(module), qualname)
+    obj = cls.__new__(cls)
+    for name, value in spec['attrs'].items():
+        setattr(obj, name, _from_json(value))
+    for fname in os.listdir(path):
+        if fname.endswith('.npy'):
+            # 写时复制映射：原地更新（如增量训练）只影响内存中的副本
+            setattr(obj, fname[:-4], np.load(os.path.join(path, fname), mmap_mode='c'))
+    return obj
+
+
+def _save_markov(markov, path):
+    os.makedirs(path)
+    tensors = []
+    for (name, order), tensor in markov.tensors.items():
+        fname = f'{name}_{order}.npy'
+        np.save(os.path.join(path, fname), tensor.counts)
+        tensors.append([name, order, tensor.cardinality, fname])
+    meta = {'features': list(markov.features), 'orders': list(markov.orders), 'context': markov.context,
+            'n_seen': markov.n_seen, 'last_period': markov.last_period, 'tensors': tensors}
+    with open(os.path.join(path, 'markov.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, default=_to_json)
+
+
+def _load_markov(path):
+    from markov_tensors import MarkovTransitions, TransitionTensor
+    with open(os.path.join(path, 'markov.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    markov = MarkovTransitions.__new__(MarkovTransitions)
+    markov.features = tuple(meta['features'])
+    markov.orders = tuple(meta['orders'])
+    markov.max_order = max(markov.orders)
+    markov.context = {k: list(v) for k, v in meta['context'].items()}
+    markov.n_seen = meta['n_seen']
+    markov.last_period = meta['last_period']
+    markov.tensors = {}
+    for name, order, cardinality, fname in meta['tensors']:
+        tensor = TransitionTensor.__new__(TransitionTensor)
+        tensor.cardinality, tensor.order = cardinality, order
+        tensor.counts = np.load(os.path.join(path, fname), mmap_mode='c')
+        markov.tensors[(name, order)] = tensor
+    return markov
+
+
+def _save_json(value, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(value, f, ensure_ascii=False, default=_to_json)
+
+
+def _load_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_joblib(value, path):
+    import joblib
+    joblib.dump(value, path)
+
+
+def _load_joblib(path):
+    import joblib
+    return joblib.load(path)
+
+
+CODECS = {
+    'json': ('.json', _save_json, _load_json),
+    'joblib': ('.joblib', _save_joblib, _load_joblib),
+    'arrays': ('', _save_arrays_object, _load_arrays_object),
+    'markov': ('', _save_markov, _load_markov),
+}
+MMAP_KINDS = ('arrays', 'markov')
+
+
+def save_artifact(path, components, meta=None):
+    """写入制品目录（先写临时目录再替换，避免读到半成品）
+
+    Args:
+        components: {组件名: (编码类型, 值)}，值为 None 的组件不写入
+        meta: 训练元数据（最新期号、历史哈希等），写入 manifest
+    """
+    tmp = f'{path}.tmp{os.getpid()}'
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    entries = {}
+    for name, (kind, value) in components.items():
+        if value is None:
+            continue
+        ext, save, _ = CODECS[kind]
+        fname = f'{name}{ext}'
+        save(value, os.path.join(tmp, fname))
+        entries[name] = {'kind': kind, 'file': fname, 'bytes': _dir_size(os.path.join(tmp, fname))}
+    manifest = {'version': ARTIFACT_VERSION, 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'meta': meta or {}, 'components': entries}
+    _save_json(manifest, os.path.join(tmp, MANIFEST))
+    if os.path.exists(path):
+        # 旧目录先改名再删除：其中的 .npy 可能仍被内存映射，删除失败时留给下次清理
+        old = f'{path}.old{os.getpid()}'
+        os.replace(path, old)
+        shutil.rmtree(old, ignore_errors=True)
+    os.replace(tmp, path)
+    return manifest
+
+
+class ModelArtifact:
+    """已打开的制品目录：启动时只读 manifest，各组件首次 load() 时才反序列化"""
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.meta = manifest.get('meta', {})
+        self._loaded = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path):
+        """打开制品目录；不存在或版本不兼容时返回 None"""
+        manifest_path = os.path.join(path, MANIFEST)
+        if not os.path.exists(manifest_path):
+            return None
+        manifest = _load_json(manifest_path)
+        if manifest.get('version') != ARTIFACT_VERSION:
+            return None
+        return cls(path, manifest)
+
+    def has(self, name):
+        return name in self.manifest['components']
+
+    def load(self, name):
+        with self._lock:
+            if name not in self._loaded:
+                entry = self.manifest['components'][name]
+                t0 = time.time()
+                self._loaded[name] = CODECS[entry['kind']][2](os.path.join(self.path, entry['file']))
+                self._stats[name] = time.time() - t0
+            return self._loaded[name]
+
+    def report(self):
+        """各组件：编码类型、磁盘大小、是否内存映射、是否已加载及加载耗时"""
+        out = {}
+        for name, entry in self.manifest['components'].items():
+            mmap = entry['kind'] in MMAP_KINDS
+            out[name] = {
+                'kind': entry['kind'],
+                'bytes': entry['bytes'],
+                'mmap': mmap,
+                'loaded': name in self._loaded,
+                'seconds': round(self._stats[name], 4) if name in self._stats else None,
+                # 已反序列化（非内存映射）组件的磁盘大小；只是加载量的参考，不是实际常驻内存
+                'loaded_bytes': 0 if mmap or name not in self._loaded else entry['bytes']
+            }
+        return out
+
+
+def format_report(report):
+    lines = []
+    for name, r in report.items():
+        state = f"{r['seconds']:.3f}s" if r['loaded'] else '未加载'
+        lines.append(f"  - {name:<18} {r['kind']:<7} {r['bytes'] / 1024:>9.1f} KB"
+                     f"{' (mmap)' if r['mmap'] else ''}  {state}")
+    return '\n'.join(lines)
+
+
+class LazyComponent:
+    """实例属性：未被赋值时，首次访问从实例的 _artifact 加载对应组件（不存在则取默认值）"""
+
+    def __init__(self, component, default=lambda: None):
+        self.component = component
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.slot = f'_lazy_{name}'
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        d = obj.__dict__
+        if self.slot not in d:
+            artifact = d.get('_artifact')
+            if artifact is not None and artifact.has(self.component):
+                d[self.slot] = artifact.load(self.component)
+            else:
+                d[self.slot] = self.default()
+        return d[self.slot]
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.slot] = value
+        self._bump(obj)
+
+    def reset(self, obj):
+        """丢弃当前值，下次访问时重新从 _artifact 加载"""
+        obj.__dict__.pop(self.slot, None)
+        self._bump(obj)
+
+    def version(self, obj):
+        """赋值 / 重置次数（模型变化的标记，供概率缓存作键）"""
+        return obj.__dict__.get('_lazy_versions', {}).get(self.slot, 0)
+
+    def _bump(self, obj):
+        versions = obj.__dict__.setdefault('_lazy_versions', {})
+        versions[self.slot] = versions.get(self.slot, 0) + 1
@@ -4,113 +4,193 @@ from collections import Counter, defaultdict
 from datetime import datetime
 import re
 import os
-import joblib
-import requests
-from bs4 import BeautifulSoup
-from dynamic_scoring_rules import (
-    get_dynamic_sum_score,
-    get_dynamic_zone_score,
-    get_dynamic_odd_score,
-    get_dynamic_size_score,
-    get_2d_combined_bonus
-)
+import time
+from importlib.util import find_spec
+from history_arrays import HistoryArrays, search_similar_windows
+from co_occurrence import CoOccurrenceIndex
+from markov_tensors import MarkovTransitions
+from transition_tables import get_transition_tables
+from combo_table import get_red_table, get_blue_space, get_red_index, PREDICT_RULE_FLAGS
+from score_cube import CategoryScoreCube
+from multilabel_model import MultiLabelNumberModel, MODEL_KINDS as MULTILABEL_KINDS
+from stacking_trainer import train_per_number, fit_number_stack, fit_number_ensemble, default_workers, format_report
+from training_components import ComponentRegistry
+from lstm_cache import get_lstm_table, model_hash
+from model_artifacts import (ModelArtifact, LazyComponent, artifact_path, legacy_path,
+                             format_report as format_artifact_report)
+from model_registry import ModelRegistry, code_version
+from stacking_trainer import XGB_PARAMS, XGB_ROUNDS, LGB_PARAMS, RF_PARAMS
 from itertools import combinations
+from math import comb
+from startup_profile import timed, lazy_import
+from compiled_trees import CompiledStacking
+from prefix_state import FEATURE_COLUMNS, feature_row
+from prize_metrics import core_hit, soft_hit, evaluate_results
+from batch_scoring import BatchScorer, swap_neighbors
+from probability_cache import cached, new_owner_id, proba_dict
+from blue_pairs import BluePairTable
 import warnings
 warnings.filterwarnings('ignore')
 
 # 原生 Numpy LSTM 实现（替代 TensorFlow/PyTorch 解决兼容性问题）
 class NumpyLSTM:
-    def __init__(self, input_size=12, hidden_size=64, output_size=12):
+    """批量 LSTM：输入 B×T×I，四个门融合为一次 (4H)×(I+H) 矩阵乘法"""
+
+    def __init__(self, input_size=12, hidden_size=64, output_size=12, dtype=np.float64):
         self.input_size = input_size
         self.hidden_size = hidden_size
         self.output_size = output_size
+        self.dtype = np.dtype(dtype)
         
         # 门控权重初始化 (Xavier 初始化)
         limit = np.sqrt(6 / (input_size + hidden_size))
         # 组合权重 [Wf, Wi, Wc, Wo]
-        self.W = np.random.uniform(-limit, limit, (4, hidden_size, input_size + hidden_size))
-        self.b = np.zeros((4, hidden_size))
+        self.W = np.random.uniform(-limit, limit, (4, hidden_size, input_size + hidden_size)).astype(self.dtype)
+        self.b = np.zeros((4, hidden_size), dtype=self.dtype)
         
         # 输出层权重
-        self.Wy = np.random.uniform(-limit, limit, (output_size, hidden_size))
-        self.by = np.zeros(output_size)
+        self.Wy = np.random.uniform(-limit, limit, (output_size, hidden_size)).astype(self.dtype)
+        self.by = np.zeros(output_size, dtype=self.dtype)
 
     def sigmoid(self, x):
         return 1 / (1 + np.exp(-np.clip(x, -500, 500)))
 
-    def train(self, X, y, epochs=100, lr=0.01):
-        """简单的 BPTT 训练逻辑"""
-        for _ in range(epochs):
-            for i in range(len(X)):
-                self._step(X[i], y[i], lr)
-
-    def _step(self, x_seq, y_true, lr):
-        # 简化的参数更新逻辑（用于蓝球预测已足够）
-        # 实际预测时我们会使用更稳定的预设权重或基础训练
-        h = np.zeros(self.hidden_size)
-        c = np.zeros(self.hidden_size)
-        
-        # 前向传播
-        for x in x_seq:
-            concat = np.concatenate((x, h))
-            f = self.sigmoid(np.dot(self.W[0], concat) + self.b[0])
-            i = self.sigmoid(np.dot(self.W[1], concat) + self.b[1])
-            c_hat = np.tanh(np.dot(self.W[2], concat) + self.b[2])
-            o = self.sigmoid(np.dot(self.W[3], concat) + self.b[3])
-            c = f * c + i * c_hat
+    def _fused(self):
+        """融合门权重：输入部分 (I, 4H) 与循环部分 (H, 4H)，偏置 (4H,)"""
+        W = self.W.reshape(4 * self.hidden_size, -1)
+        return W[:, :self.input_size].T, W[:, self.input_size:].T, self.b.reshape(-1)
+
+    def hidden_states(self, X):
+        """前向传播，返回最后一个时间步的隐藏状态 (B×H)"""
+        dtype = getattr(self, 'dtype', np.dtype(np.float64))
+        X = np.asarray(X, dtype=dtype)
+        B, T, _ = X.shape
+        H = self.hidden_size
+        Wx, Wh, b = self._fused()
+        # 输入投影对所有时间步一次完成，循环中每步只剩 B×H 与 H×4H 的乘法
+        Zx = X.reshape(B * T, -1) @ Wx
+        Zx = Zx.reshape(B, T, 4 * H)
+        h = np.zeros((B, H), dtype=dtype)
+        c = np.zeros((B, H), dtype=dtype)
+        z = np.empty((B, 4 * H), dtype=dtype)
+        for t in range(T):
+            np.matmul(h, Wh, out=z)
+            z += Zx[:, t]
+            z += b
+            f = self.sigmoid(z[:, :H])
+            i = self.sigmoid(z[:, H:2 * H])
+            c_hat = np.tanh(z[:, 2 * H:3 * H])
+            o = self.sigmoid(z[:, 3 * H:])
+            c *= f
+            c += i * c_hat
             h = o * np.tanh(c)
-            
-        y_pred = self.sigmoid(np.dot(self.Wy, h) + self.by)
-        
-        # 简化的梯度下降
-        dy = y_pred - y_true
-        dWy = np.outer(dy, h)
-        self.Wy -= lr * dWy
-        self.by -= lr * dy
+        return h
+
+    def train(self, X, y, epochs=100, lr=0.01, batch_size=1):
+        """逐样本 / 小批量训练（简化 BPTT：门控权重保持初始化值，只训练输出层）
+
+        门控权重不更新，各序列的最终隐藏状态在所有 epoch 中不变，只需批量前向一次；
+        默认 batch_size=1 与原逐样本更新完全一致。小批量时梯度按批内样本取平均（步长不随批大小放大），
+        训练结果与逐样本更新不同，需显式指定。
+        """
+        Hs = self.hidden_states(X)
+        Y = np.asarray(y, dtype=Hs.dtype)
+        for _ in range(epochs):
+            for s in range(0, len(Hs), batch_size):
+                h = Hs[s:s + batch_size]
+                dy = self.sigmoid(h @ self.Wy.T + self.by) - Y[s:s + batch_size]
+                self.Wy -= (lr / len(h)) * (dy.T @ h)
+                self.by -= (lr / len(h)) * dy.sum(axis=0)
+
+    def predict_batch(self, X):
+        """B×T×I 序列 → B×O 概率"""
+        return self.sigmoid(self.hidden_states(X) @ self.Wy.T + self.by)
 
     def predict(self, x_seq):
-        h = np.zeros(self.hidden_size)
-        c = np.zeros(self.hidden_size)
-        for x in x_seq:
-            concat = np.concatenate((x, h))
-            f = self.sigmoid(np.dot(self.W[0], concat) + self.b[0])
-            i = self.sigmoid(np.dot(self.W[1], concat) + self.b[1])
-            c_hat = np.tanh(np.dot(self.W[2], concat) + self.b[2])
-            o = self.sigmoid(np.dot(self.W[3], concat) + self.b[3])
-            c = f * c + i * c_hat
-            h = o * np.tanh(c)
-        return self.sigmoid(np.dot(self.Wy, h) + self.by)
-
-# 集成学习模型
-try:
-    import xgboost as xgb
-    from lightgbm import LGBMClassifier
-    from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-    from sklearn.neural_network import MLPClassifier
-    from sklearn.linear_model import LogisticRegression
-    ENSEMBLE_AVAILABLE = True
-except ImportError:
-    ENSEMBLE_AVAILABLE = False
+        return self.predict_batch(np.asarray(x_seq)[None])[0]
+
+# 集成学习模型：启动时只检测依赖是否已安装，xgboost / lightgbm / sklearn 在训练或推理时才导入
+ENSEMBLE_AVAILABLE = all(find_spec(m) is not None for m in ('xgboost', 'lightgbm', 'sklearn'))
+if not ENSEMBLE_AVAILABLE:
     print("⚠️ 集成学习库未安装，将使用基础算法")
 
 class DaletouPredictor:
     """大乐透预测引擎 - 增强版，包含更多算法"""
     
+    # train_from_df 默认构建的组件；其余组件（集成模型、共现网络）由使用方按需构建
+    BASE_COMPONENTS = ('markov', 'patterns', 'dynamic_weights', 'numbers_pool', 'adaptive_weights')
+    MODEL_COMPONENTS = ('number_models', 'blue_lstm')
+    # 随模型状态文件持久化的组件
+    PERSISTED_COMPONENTS = ('markov', 'number_models', 'blue_lstm')
+    # predict 的单式评分方式
+    PREDICT_MODES = ('exhaustive', 'batch', 'sampled')
+    
+    # 模型制品中的大组件：首次访问时才从 _artifact 加载
+    stacking_meta_model = LazyComponent('stacking_red', dict)
+    blue_stacking_meta_model = LazyComponent('stacking_blue', dict)
+    blue_lstm_model = LazyComponent('blue_lstm')
+    multilabel_model = LazyComponent('multilabel')
+    markov_transitions = LazyComponent('markov')
+    # Stacking 的数组化形式（compiled_trees），推理时无需反序列化 joblib、也不导入 xgboost / lightgbm / sklearn
+    compiled_stacking = LazyComponent('compiled_stacking')
+    LAZY_ATTRS = ('stacking_meta_model', 'blue_stacking_meta_model', 'blue_lstm_model', 'multilabel_model',
+                  'markov_transitions', 'compiled_stacking')
+    
     def __init__(self, history_path='daletou_history_full.txt'):
         self.history_path = history_path
-        self.history_df = self._load_history()
+        self._artifact = None
+        self._state_load_time = None
+        self._registry = None
+        # 当前模型对应的注册表内容哈希（加载 / 保存时更新；未入注册表的状态为 None）
+        self.state_digest = None
+        self._backtest_store = None
+        # 训练步骤结束后是否自动保存为 latest（回测用的子预测器关闭，避免覆盖实盘模型）
+        self.autosave = True
+        with timed('parse history'):
+            self.history_df = self._load_history()
         self.is_trained = False
         self.feature_weights = {}
         self.recent_errors = []
-        self.markov_transitions = {}
+        self.markov_transitions = None
         self.pattern_memory = []
         self.dynamic_weights = {}
         self.ensemble_models = {'red': {}, 'blue': {}}
+        # 概率缓存的模型键：实例编号 + 集成模型版本（其余模型版本由 LazyComponent 记录）
+        self._owner_id = new_owner_id()
+        self._ensemble_version = 0
         self.stacking_meta_model = {}
         self.blue_stacking_meta_model = {}
+        self.compiled_stacking = None
+        # 未导出的 Stacking 模型的推理次数：(模型版本, 次数)，见 predict_stacking_batch
+        self._stacking_uses = (None, 0)
         self.blue_lstm_model = None
         self.actual_numbers_pool = []
-        self.co_occurrence_graph = {}
+        self.co_occurrence = None
+        self._co_occurrence_matrix = None
+        self._history_arrays = None
+        self._history_arrays_key = None
+        # 回测前缀模式（见 set_history_prefix）
+        self._prefix = None
+        self._prefix_key = None
+        self._pattern_last_period = None
+        self._score_cube = None
+        self._score_cube_key = None
+        self._blue_table = None
+        self._blue_table_key = None
+        # 逐号码模型训练并行度（None 表示使用 default_workers()）
+        self.train_workers = None
+        self.stacking_reports = {}
+        # 号码概率模型模式: 'stacking'（47 组逐号码 Stacking）或多标签单模型 'mlp' / 'forest'
+        self.model_mode = 'stacking'
+        self.multilabel_model = None
+        # 走查式回测的增量训练状态（训练行数 / 最后期号 / 连续增量次数）
+        self._walk_forward_state = None
+        # 命名训练组件（依赖跟踪 + 按需构建 + fresh/stale/absent 状态）
+        self._train_features = None
+        self.components = ComponentRegistry(lambda: self.get_history_arrays().history_hash, self._latest_period,
+                                            rows_fn=lambda: len(self.history_df),
+                                            prefix_version_fn=lambda n: self.get_history_arrays().prefix(n).history_hash)
+        self._register_components()
         
         # 资产存储路径
         self.assets_dir = 'model_assets'
@@ -124,51 +204,229 @@ class DaletouPredictor:
         self.adaptive_weights = {'frequency': 1.0, 'missing': 1.0, 'pattern': 1.0, 'actual_weight': 1.0}
         
         # 尝试恢复持久化资产
-        self.load_state()
+        with timed('open model state'):
+            self.load_state()
+
+    def _register_components(self):
+        c = self.components
+        c.register('markov', self._build_markov_chain, label='马尔可夫转移')
+        c.register('patterns', self._learn_patterns, label='形态记忆')
+        c.register('dynamic_weights', self._init_dynamic_weights, label='动态权重')
+        c.register('numbers_pool', self._build_actual_numbers_pool, label='号码池与共现对')
+        c.register('adaptive_weights', self._init_adaptive_weights_from_history, label='自适应权重')
+        c.register('features', self._build_feature_matrix, label='训练特征矩阵')
+        c.register('number_models', lambda: self._build_number_models(self.history_df), deps=('features',),
+                   label='号码概率模型')
+        c.register('blue_lstm', self._train_blue_lstm, label='蓝球 LSTM')
+        # 以下组件只被候选生成策略 / 社区得分使用，默认训练不构建
+        # 回测逐期推进时沿用前 20 期内训练的模型（只用到目标期之前的数据），不每期重训 70 个模型
+        c.register('ensemble', self._train_ensemble_models, deps=('features',), lazy=True,
+                   label='RandomForest + GradientBoosting', refit_every=20)
+        c.register('co_occurrence', self._build_co_occurrence_network, lazy=True, label='号码共现网络')
+
+    def _latest_period(self):
+        return int(self.history_df.iloc[-1]['period']) if len(self.history_df) > 0 else None
 
     def _load_history(self):
         if not os.path.exists(self.history_path): return pd.DataFrame()
         with open(self.history_path, 'r', encoding='utf-8') as f:
             return self.parse_historical_data(f.read())
 
+    def get_history_arrays(self):
+        """返回当前 history_df 的列式数组视图（history_df 被替换后自动重建）"""
+        df = self.history_df
+        key = (id(df), len(df), int(df['period'].iat[-1]) if len(df) > 0 else None)
+        if self._history_arrays is None or self._history_arrays_key != key:
+            self._history_arrays = HistoryArrays.from_df(df)
+            self._history_arrays_key = key
+        return self._history_arrays
+
+    def set_history_prefix(self, prefix, t):
+        """回测前缀模式：history_df 取 prefix 的前 t 期，列式数组为切片视图（不重建）"""
+        df = prefix.frame(t)
+        self.history_df = df
+        self._history_arrays = prefix.arrays_at(t)
+        self._history_arrays_key = (id(df), len(df), int(df['period'].iat[-1]) if len(df) > 0 else None)
+        self._prefix = prefix
+        self._prefix_key = self._history_arrays_key
+
+    def _active_prefix(self):
+        """history_df 仍是 set_history_prefix 设置的前缀时返回 PrefixHistory，否则 None"""
+        df = self.history_df
+        if self._prefix is None or len(df) == 0:
+            return None
+        key = (id(df), len(df), int(df['period'].iat[-1]))
+        return self._prefix if key == self._prefix_key else None
+
+    def get_transition_tables(self):
+        """当前历史对应的动态评分转移表（按历史哈希缓存，历史变化后自动重建）"""
+        return get_transition_tables(self.get_history_arrays())
+
+    def _record_position(self, record):
+        """record 在 history_df 中的行号：按期号定位，没有期号时只认最后一期（红球相同）；找不到返回 None"""
+        arrays = self.get_history_arrays()
+        if len(arrays) == 0:
+            return None
+        period = record.get('period') if hasattr(record, 'get') else None
+        if period is not None:
+            rows = np.flatnonzero(arrays.periods == int(period))
+            return int(rows[0]) if len(rows) else None
+        return len(arrays) - 1 if sorted(record['red']) == sorted(arrays.red[-1].tolist()) else None
+
+    def get_score_cube(self, last_record=None):
+        """当前上下文（转移表 + 上期 / 上上期开奖）下的类别评分立方体，上下文不变时复用"""
+        tables = self.get_transition_tables()
+        last_red = tuple(sorted(last_record['red'])) if last_record is not None else None
+        prev2_red = None
+        if last_red is not None:
+            pos = self._record_position(last_record)
+            if pos is not None and pos >= 1:
+                prev2_red = tuple(sorted(self.get_history_arrays().red[pos - 1].tolist()))
+        key = (tables.history_hash, last_red, prev2_red)
+        if self._score_cube is None or self._score_cube_key != key:
+            self._score_cube = CategoryScoreCube(get_red_table(), last_red, prev2_red, tables=tables)
+            self._score_cube_key = key
+        return self._score_cube
+
     def save_state(self, tag='latest'):
-        """保存当前模型状态与权重"""
-        import joblib
-        state = {
-            'stacking_red': self.stacking_meta_model,
-            'stacking_blue': self.blue_stacking_meta_model,
-            'blue_lstm': self.blue_lstm_model,
+        """保存当前模型状态与权重（目录式制品，见 model_artifacts）"""
+        weights = {
             'scoring_weights': self.scoring_weights,
             'adaptive_weights': self.adaptive_weights,
-            'markov': self.markov_transitions,
-            'last_trained_period': int(self.history_df.iloc[-1]['period']) if len(self.history_df)>0 else 0
+            'model_mode': self.model_mode
+        }
+        markov = self.markov_transitions
+        self.compiled_stacking = self._compile_stacking()
+        components = {
+            'weights': ('json', weights),
+            'markov': ('markov', markov if isinstance(markov, MarkovTransitions) else None),
+            'stacking_red': ('joblib', self.stacking_meta_model or None),
+            'stacking_blue': ('joblib', self.blue_stacking_meta_model or None),
+            'compiled_stacking': ('joblib', self.compiled_stacking),
+            'multilabel': ('joblib', self.multilabel_model),
+            'blue_lstm': ('arrays', self.blue_lstm_model)
+        }
+        meta = {
+            'last_trained_period': int(self.history_df.iloc[-1]['period']) if len(self.history_df)>0 else 0,
+            'history_hash': self.get_history_arrays().history_hash
+        }
+        digest = self.registry.save(components, meta, self._lineage(), tags=(tag,))
+        self.state_digest = digest
+        # print(f"[*] 模型资产已持久化至: {self.registry.object_path(digest)}")
+        return digest
+
+    @property
+    def registry(self):
+        """模型注册表（model_assets/registry，按内容哈希存放各标签的状态）"""
+        root = os.path.join(self.assets_dir, 'registry')
+        if self._registry is None or self._registry.root != root:
+            self._registry = ModelRegistry(root)
+        return self._registry
+
+    def _lineage(self):
+        """当前状态的谱系：训练历史、代码版本与超参数"""
+        return {
+            'history_hash': self.get_history_arrays().history_hash,
+            'last_trained_period': int(self.history_df.iloc[-1]['period']) if len(self.history_df)>0 else 0,
+            'code_version': code_version(),
+            'model_mode': self.model_mode,
+            'hyperparameters': {
+                'xgb': dict(XGB_PARAMS, rounds=XGB_ROUNDS), 'lgb': LGB_PARAMS, 'rf': RF_PARAMS,
+                'lstm': {'hidden_size': 64, 'sequence_length': 10, 'epochs': 50}
+            }
         }
-        path = os.path.join(self.assets_dir, f'model_state_{tag}.pkl')
-        joblib.dump(state, path)
-        # print(f"[*] 模型资产已持久化至: {path}")
+
+    def load_matching_state(self, tag):
+        """按谱系复用注册表中已有的状态（相同训练历史、代码版本、模式与超参数），并为其补上标签"""
+        digest = self.registry.find(**self._lineage())
+        if digest is None:
+            return False
+        self.registry.tag(tag, digest)
+        return self.load_state(tag)
 
     def load_state(self, tag='latest'):
-        """从磁盘恢复模型状态"""
-        import joblib
-        path = os.path.join(self.assets_dir, f'model_state_{tag}.pkl')
+        """从磁盘恢复模型状态：目录式制品（注册表标签）只读取 manifest 与权重，模型在首次使用时加载；兼容旧的单文件 pkl"""
+        t0 = time.time()
+        try:
+            # 注册表标签优先，其次为未入注册表的目录式制品
+            path = self.registry.resolve(tag) or artifact_path(self.assets_dir, tag)
+            artifact = ModelArtifact.open(path)
+        except: artifact = None
+        if artifact is not None:
+            weights = artifact.load('weights') if artifact.has('weights') else {}
+            self.scoring_weights = weights.get('scoring_weights', self.scoring_weights)
+            self.adaptive_weights = weights.get('adaptive_weights', self.adaptive_weights)
+            self.model_mode = weights.get('model_mode', 'stacking')
+            self._artifact = artifact
+            in_registry = os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.registry.objects_dir)
+            self.state_digest = os.path.basename(path) if in_registry else None
+            for attr in self.LAZY_ATTRS:
+                # 制品中没有马尔可夫表时保留当前的（与旧逻辑一致），其余组件缺失即为空
+                if attr != 'markov_transitions' or artifact.has('markov'):
+                    getattr(type(self), attr).reset(self)
+            loaded = {'markov': artifact.has('markov'),
+                      'number_models': artifact.has('stacking_red') or artifact.has('multilabel'),
+                      'blue_lstm': artifact.has('blue_lstm')}
+            self._restore_components(loaded, artifact.meta.get('history_hash'), artifact.meta.get('last_trained_period'))
+            self._state_load_time = time.time() - t0
+            return True
+        
+        path = legacy_path(self.assets_dir, tag)
         if os.path.exists(path):
             try:
-                state = joblib.load(path)
+                state = lazy_import('joblib').load(path)
+                self._artifact = None
+                self.state_digest = None
                 self.stacking_meta_model = state.get('stacking_red', {})
                 self.blue_stacking_meta_model = state.get('stacking_blue', {})
+                self.compiled_stacking = None
                 self.blue_lstm_model = state.get('blue_lstm')
                 self.scoring_weights = state.get('scoring_weights', self.scoring_weights)
                 self.adaptive_weights = state.get('adaptive_weights', self.adaptive_weights)
-                self.markov_transitions = state.get('markov', {})
-                self.is_trained = True
-                # print(f"[*] 成功从磁盘恢复模型资产 ({tag})")
+                self.model_mode = state.get('model_mode', 'stacking')
+                self.multilabel_model = state.get('multilabel')
+                markov = state.get('markov')
+                if isinstance(markov, MarkovTransitions):
+                    self.markov_transitions = markov
+                loaded = {'markov': isinstance(markov, MarkovTransitions),
+                          'number_models': bool(self.stacking_meta_model) or self.multilabel_model is not None,
+                          'blue_lstm': self.blue_lstm_model is not None}
+                self._restore_components(loaded, state.get('history_hash'), state.get('last_trained_period'))
+                self._state_load_time = time.time() - t0
                 return True
             except: pass
         return False
+
+    def _restore_components(self, loaded, history_hash, period):
+        """恢复的组件按保存时的历史哈希登记（旧状态文件无哈希，视为 stale）"""
+        for name in self.PERSISTED_COMPONENTS:
+            if loaded[name]:
+                self.components.mark_built(name, history_hash, period)
+            else:
+                self.components.invalidate(name)
+        self.is_trained = True
+        # print(f"[*] 成功从磁盘恢复模型资产")
+
+    def artifact_report(self):
+        """模型制品加载报告：启动耗时与各组件大小 / 加载状态"""
+        return {
+            'path': self._artifact.path if self._artifact else None,
+            'startup_seconds': round(self._state_load_time, 4) if self._state_load_time is not None else None,
+            'components': self._artifact.report() if self._artifact else {}
+        }
+
+    def format_artifact_report(self):
+        report = self.artifact_report()
+        if not report['path']:
+            return "[*] 未使用目录式模型制品"
+        return (f"[*] 模型制品 {report['path']} (启动加载 {report['startup_seconds']:.3f}s)\n"
+                + format_artifact_report(report['components']))
         
     def _fetch_reference_numbers(self, urls):
         """从参考网页中智能提取推荐号码 - V3 增强版（支持动态渲染）"""
         if not urls: return {'red': Counter(), 'blue': Counter()}
+        requests = lazy_import('requests')
+        BeautifulSoup = lazy_import('bs4').BeautifulSoup
         
         red_counts = Counter()
         blue_counter = Counter()
@@ -459,22 +717,13 @@ class DaletouPredictor:
             'blue_span': {'min': 2, 'max': 11, 'weight': 0.5}
         }
         
-        # 构建基础数据结构
-        self._build_markov_chain()
-        self._learn_patterns()
-        self._init_dynamic_weights()
-        self._build_actual_numbers_pool()
-        self._init_adaptive_weights_from_history()
+        # 显式训练：所有组件重新构建，集成模型 / 共现网络留待使用时按需构建
+        self.components.invalidate()
+        self.components.ensure_all(self.BASE_COMPONENTS)
         
-        # 训练集成学习模型
+        # 训练号码概率模型（逐号码 Stacking 或多标签单模型）与蓝球 LSTM
         if train_ensemble and ENSEMBLE_AVAILABLE:
-            self._train_ensemble_models()
-            # 训练 Stacking 模型（已修复版本兼容问题）
-            self._build_stacking_ensemble(self.history_df)
-            # 训练蓝球 LSTM 模型
-            self._train_blue_lstm()
-            # 构建号码共现网络
-            self._build_co_occurrence_network()
+            self.components.ensure_all(self.MODEL_COMPONENTS)
         
         self.is_trained = True
         return True
@@ -516,7 +765,7 @@ class DaletouPredictor:
 
     def score_combination(self, red, blue, hot_cold_info, last_record=None, return_details=False, 
                           red_probas=None, blue_probas=None, lstm_probas=None, similar_periods_override=None,
-                          ref_numbers=None):
+                          ref_numbers=None, red_category=None):
         """对号码组合进行评分 - V12 数据驱动版（基于2829期历史统计）"""
         score = 500.0  # 基础分大幅提升
         details = []
@@ -592,22 +841,14 @@ class DaletouPredictor:
             score += 50   # 4+个质数很少见(2.48%)，小幅加分
             details.append(f"质数极多({p_count})")
         
-        # ============ 第二层：动态和值评分（V12.3 - 综合规律） ============
-        # 综合考虑：
-        # 1. 和值回归中心趋势（极端值后倾向于回归90-110）
-        # 2. 连续趋势反转规律（连续上升/下降3期同76%概率反转）
-        # 3. 基本转移概率
-        last_red_sum = sum(last_record['red']) if last_record else None
-        
-        # 获取上上期和值（用于趋势判断）
-        prev2_red_sum = None
-        if last_record and len(hc) >= 2:
-            prev2_record = hc[-2]
-            prev2_red_sum = sum(prev2_record['red'])
-        
-        sum_score, sum_reason = get_dynamic_sum_score(red_sum, last_red_sum, prev2_red_sum)
-        score += sum_score
-        details.append(sum_reason)
+        # ============ 第二层：动态和值 / 区间比 / 奇偶比 / 大小比 / 2维组合（V12.4） ============
+        # 这些动态评分只依赖红球的类别签名 (和值, 区间比, 奇数个数, 小号个数) 与上两期开奖，
+        # 按当期上下文预先求出每个签名的分数与理由（见 score_cube.py），这里直接按类别 ID 查表
+        cube = self.get_score_cube(last_record)
+        if red_category is None:
+            red_category = get_red_table().category_of(red)
+        score += float(cube.scores[red_category])
+        details.append(cube.sum_reasons[red_category])
         
         # 跨度特征（新增）
         span = red[-1] - red[0]
@@ -618,114 +859,11 @@ class DaletouPredictor:
             score += 150  # 极端跨度也给分
             details.append(f"跨度特殊({span})")
         
-        # 区间分布（V12.3动态评分 - 基于上期区间比动态调整）
-        z1 = sum(1 for x in red if x <= 11)
-        z2 = sum(1 for x in red if 12 <= x <= 23)
-        z3 = sum(1 for x in red if x >= 24)
-        zone_ratio = f"{z1}:{z2}:{z3}"
+        details.extend(cube.other_reasons[red_category])
         
-        # 上期区间比
-        last_zone_ratio = None
-        if last_record is not None:
-            last_z1 = sum(1 for x in last_record['red'] if x <= 11)
-            last_z2 = sum(1 for x in last_record['red'] if 12 <= x <= 23)
-            last_z3 = sum(1 for x in last_record['red'] if x >= 24)
-            last_zone_ratio = f"{last_z1}:{last_z2}:{last_z3}"
-        
-        # 动态评分：根据上期区间比预测下期最可能的区间比
-        zone_score, zone_reason = get_dynamic_zone_score(zone_ratio, last_zone_ratio)
-        score += zone_score
-        details.append(zone_reason)
-        
-        # 奇偶比（V12.3动态评分 - 综合规律）
-        # 综合考虑：1.极端值回归 2.自转移惯性（36.8%、30.1%） 3.连续保持 4.基本转移
-        odd_count = sum(1 for x in red if x % 2 == 1)
-        odd_ratio = f"{odd_count}:{5-odd_count}"
-        
-        # 上期奇偶比
-        last_odd_ratio = None
-        prev2_odd_ratio = None
-        if last_record is not None:
-            last_odd_count = sum(1 for x in last_record['red'] if x % 2 == 1)
-            last_odd_ratio = f"{last_odd_count}:{5-last_odd_count}"
-            
-            # 上上期奇偶比
-            if len(hc) >= 2:
-                prev2_record = hc[-2]
-                prev2_odd_count = sum(1 for x in prev2_record['red'] if x % 2 == 1)
-                prev2_odd_ratio = f"{prev2_odd_count}:{5-prev2_odd_count}"
-        
-        # 动态评分：根据上期奇偶比预测下期最可能的奇偶比
-        odd_score, odd_reason = get_dynamic_odd_score(odd_ratio, last_odd_ratio, prev2_odd_ratio)
-        score += odd_score
-        details.append(odd_reason)
-        
-        # 大小比（V12.3动态评分 - 综合规律）
-        # 综合考虑：1.极端值回归 2.自转移惯性（34.7%、29.3%） 3.连续保持 4.基本转移
         small_count = sum(1 for x in red if x <= 12)  # 1-12为小号（注意：这里是小号数量，不是大小比）
         big_count = sum(1 for x in red if x > 17)  # 18-35为大号
         
-        # 计算大小比（1-17小，18-35大）
-        size_small = sum(1 for x in red if x <= 17)
-        size_big = 5 - size_small
-        size_ratio = f"{size_small}:{size_big}"
-        
-        # 上期大小比
-        last_size_ratio = None
-        prev2_size_ratio = None
-        if last_record is not None:
-            last_size_small = sum(1 for x in last_record['red'] if x <= 17)
-            last_size_big = 5 - last_size_small
-            last_size_ratio = f"{last_size_small}:{last_size_big}"
-            
-            # 上上期大小比
-            if len(hc) >= 2:
-                prev2_record = hc[-2]
-                prev2_size_small = sum(1 for x in prev2_record['red'] if x <= 17)
-                prev2_size_big = 5 - prev2_size_small
-                prev2_size_ratio = f"{prev2_size_small}:{prev2_size_big}"
-        
-        # 动态评分：根据上期大小比预测下期最可能的大小比
-        size_score, size_reason = get_dynamic_size_score(size_ratio, last_size_ratio, prev2_size_ratio)
-        score += size_score
-        details.append(size_reason)
-        
-        # ============ V12.4 新增：2维组合加成 ============
-        # 如果当前组合符合历史统计的高概率转移模式（概率>=15%），给予额外加分
-        if last_record is not None:
-            # 获取和值区间
-            def get_sum_range_label(s):
-                if s < 70:
-                    return '<70'
-                elif s < 90:
-                    return '70-90'
-                elif s < 110:
-                    return '90-110'
-                elif s < 130:
-                    return '110-130'
-                else:
-                    return '130+'
-            
-            curr_features = {
-                'sum_range': get_sum_range_label(red_sum),
-                'zone_ratio': zone_ratio,
-                'odd_ratio': odd_ratio,
-                'size_ratio': size_ratio
-            }
-            
-            last_sum = sum(last_record['red'])
-            last_features = {
-                'sum_range': get_sum_range_label(last_sum),
-                'zone_ratio': last_zone_ratio,
-                'odd_ratio': last_odd_ratio,
-                'size_ratio': last_size_ratio
-            }
-            
-            combo_bonus, combo_reasons = get_2d_combined_bonus(curr_features, last_features)
-            if combo_bonus > 0:
-                score += combo_bonus
-                details.extend(combo_reasons)
-        
         # 小号数量评分（保留原有逻辑）
         if small_count == 2:  # 历史最高频(37.20%)
             score += 220  # 最高分
@@ -752,10 +890,12 @@ class DaletouPredictor:
         # 结论：历史相似期预测价值有限，500分/个权重严重过高，大幅降权
         sim_periods = similar_periods_override
         if not sim_periods and return_details:
+            z1 = sum(1 for x in red if x <= 11)
+            z2 = sum(1 for x in red if 12 <= x <= 23)
             current_feats = {
-                'red_sum': red_sum, 'odd_count': odd_count,
+                'red_sum': red_sum, 'odd_count': sum(1 for x in red if x % 2 == 1),
                 'red_span': span,
-                'z1': z1, 'z2': z2, 'z3': z3
+                'z1': z1, 'z2': z2, 'z3': 5 - z1 - z2
             }
             sim_periods = self._find_similar_periods(current_feats, top_k=10)  # 增加到10期
         
@@ -863,8 +1003,11 @@ class DaletouPredictor:
         return final_score
     
     def generate_candidates(self, n_candidates, available_red, available_blue, hot_cold_info, 
-                            red_probas=None, blue_probas=None, lstm_probas=None):
-        """V10 改进：增加小号和低和值组合的多样性"""
+                            red_probas=None, blue_probas=None, lstm_probas=None, with_blue=True):
+        """V10 改进：增加小号和低和值组合的多样性
+
+        with_blue=False 时只生成红球组合（按红球去重，blue 为空），供 predict(mode='sampled') 与全部蓝球组合批量评分
+        """
         candidates = []
         strategy_types = [
             'weighted_actual', 'ensemble', 'timeseries', 'missing_regression', 
@@ -880,8 +1023,8 @@ class DaletouPredictor:
             sorted_probas = sorted(red_probas.items(), key=lambda x: x[1], reverse=True)
             core_red_pool = [n for n, p in sorted_probas[:12]] # 扩大核心池
         
-        # 预计算相似度号码
-        sim_nums = self._select_by_similarity(available_red, 0)
+        # 预计算相似度号码（Top-K 相似窗口各贡献一组候选）
+        sim_candidates = self._similarity_candidates(available_red, top_k=max(1, n_candidates // len(strategy_types) + 1))
         
         max_attempts = n_candidates * 10 # 降低重试倍数，提升性能
         attempt = 0
@@ -921,7 +1064,7 @@ class DaletouPredictor:
                 others = [n for n in available_red if n not in anchors]
                 red = anchors + list(np.random.choice(others, 5 - len(anchors), replace=False))
             # ... (其他策略保持原调用)
-            elif strategy == 'ensemble' and ENSEMBLE_AVAILABLE and self.ensemble_models.get('red'):
+            elif strategy == 'ensemble' and ENSEMBLE_AVAILABLE and self.components.ensure('ensemble') and self.ensemble_models.get('red'):
                 red = self._select_by_ensemble(available_red, hot_cold_info, offset=offset)
             elif strategy == 'timeseries':
                 red = self._select_by_timeseries(available_red, hot_cold_info, offset=offset)
@@ -932,7 +1075,8 @@ class DaletouPredictor:
             elif strategy == 'modulus':
                 red = self._select_by_modulus(available_red, hot_cold_info, offset=offset)
             elif strategy == 'similarity':
-                red = sim_nums 
+                red = sim_candidates[offset % len(sim_candidates)] if sim_candidates else \
+                    self._select_by_frequency(available_red, hot_cold_info, offset=offset)
             elif strategy == 'hot_cold_mix':
                 red = self._select_by_hot_cold_mix(available_red, hot_cold_info, offset=offset)
             elif strategy == 'cold_rebound':
@@ -943,10 +1087,12 @@ class DaletouPredictor:
                 red = self._select_by_frequency(available_red, hot_cold_info, offset=offset)
                 
             # 后区策略 (传入预计算概率)
-            blue = self._select_blue_by_strategy(available_blue, hot_cold_info, 'hybrid', offset=offset,
-                                               blue_probas=blue_probas, lstm_probas=lstm_probas)
+            blue = []
+            if with_blue:
+                blue = self._select_blue_by_strategy(available_blue, hot_cold_info, 'hybrid', offset=offset,
+                                                   blue_probas=blue_probas, lstm_probas=lstm_probas)
             
-            if not red or not blue: continue
+            if not red or (with_blue and not blue): continue
             
             combo_key = tuple(sorted(red) + sorted(blue))
             if combo_key not in seen:
@@ -955,6 +1101,91 @@ class DaletouPredictor:
                 
         return candidates
     
+    def batch_scorer(self, last_record=None, red_probas=None, blue_probas=None, lstm_probas=None,
+                     similar_periods_override=None, ref_numbers=None):
+        """当前上下文下的批量评分器（与 score_combination 逐项一致，见 batch_scoring）"""
+        similar_next = []
+        for sp in similar_periods_override or []:
+            next_data = self._get_next_period_numbers(sp['period'])
+            if next_data:
+                similar_next.append(next_data['red'])
+        return BatchScorer(self.get_score_cube(last_record).scores, last_record, similar_next,
+                           red_probas=red_probas, blue_probas=blue_probas, lstm_probas=lstm_probas, ref_numbers=ref_numbers)
+
+    def _batch_combos(self, red_ids, blue_combos, hc, last, red_probas, blue_probas, lstm_probas, similar_periods,
+                      ref_numbers=None, historical_combos=None, seed_ids=None, refine_rounds=3, refine_beam=100,
+                      n_top=0):
+        """红球组合 ID × 蓝球组合批量评分
+
+        返回 (每个红球组合得分最高的一注, 全部注中得分最高的 n_top 注)，均按分数降序、同分保持枚举顺序（红球 ID 序、蓝球序）。
+        多样性筛选只比较红球：同一红球组合只有其最高分的一注可能入选；筛选不足时按全体排序补齐，
+        补齐的注只会来自前 2×n_combinations 注，由第二个列表给出，两者合起来与逐注枚举后排序筛选的结果一致。
+        seed_ids 不为 None 时（候选采样）只评分 red_ids 中的候选及其局部搜索结果：每轮取得分最高的
+        refine_beam 个红球组合，加入换掉一个号码的全部邻居，最多 refine_rounds 轮；
+        候选大多不满足杀号 / 胆码等条件时，用满足条件且红球项得分最高的组合补足种子
+        """
+        if len(red_ids) == 0 or not blue_combos:
+            return [], []
+        red_table = get_red_table()
+        scorer = self.batch_scorer(last, red_probas=red_probas, blue_probas=blue_probas, lstm_probas=lstm_probas,
+                                   similar_periods_override=similar_periods, ref_numbers=ref_numbers)
+        blue_t = scorer.blue_terms(blue_combos)
+        if seed_ids is not None:
+            allowed = np.zeros(len(red_table.combos), dtype=bool)
+            allowed[red_ids] = True
+            pool = np.unique(np.asarray(seed_ids, dtype=np.int64))
+            pool, top = pool[allowed[pool]], None
+            if len(pool) < refine_beam:
+                red_only = scorer.red_terms(red_table.combos[red_ids], red_table.category[red_ids])
+                key = red_only.add * red_only.boost * (1.0 + red_only.ref if red_only.ref is not None else 1.0)
+                pool = np.union1d(pool, red_ids[np.argsort(-key, kind='stable')[:refine_beam]])
+            for _ in range(refine_rounds):
+                best, _ = scorer.best_blue(scorer.red_terms(red_table.combos[pool], red_table.category[pool]), blue_t)
+                new_top = pool[np.argsort(-best, kind='stable')[:refine_beam]]
+                if top is not None and np.array_equal(np.sort(new_top), np.sort(top)):
+                    break
+                top = new_top
+                pool = np.union1d(pool, swap_neighbors(red_table, top, allowed))
+            red_ids = red_ids[np.isin(red_ids, pool)]
+        reds = red_table.combos[red_ids]
+        red_t = scorer.red_terms(reds, red_table.category[red_ids])
+        print(f"[*] 批量评分: {len(red_ids)}(红) × {len(blue_combos)}(蓝)", flush=True)
+
+        # 历史开奖号码（键与逐注枚举相同：升序红球元组, 升序蓝球元组）
+        excluded = {}
+        if historical_combos:
+            cols = {tuple(b): j for j, b in enumerate(blue_combos)}
+            hist = [(r, b) for r, b in historical_combos
+                    if tuple(b) in cols and len(r) == 5 and list(r) == sorted(set(r)) and 1 <= r[0] and r[-1] <= 35]
+            if hist:
+                hist_ids = red_table.rank([r for r, _ in hist])
+                rows = np.flatnonzero(np.isin(red_ids, hist_ids))
+                row_of = dict(zip(np.asarray(red_ids)[rows].tolist(), rows.tolist()))
+                for rid, (_, b) in zip(hist_ids.tolist(), hist):
+                    if rid in row_of:
+                        excluded.setdefault(row_of[rid], []).append(cols[tuple(b)])
+
+        best, idx = scorer.best_blue(red_t, blue_t, excluded)
+        order = np.argsort(-best, kind='stable')
+        order = order[np.isfinite(best[order])]
+        combos = [{'red': r, 'blue': list(blue_combos[j]), 'score': float(sc)}
+                  for r, j, sc in zip(reds[order].tolist(), idx[order].tolist(), best[order].tolist())]
+        if n_top <= 0 or len(order) == 0:
+            return combos, []
+        # 全体前 n_top 注只可能来自最高分排名前 n_top 的红球组合（同分的一并计入）
+        cut = best[order[min(n_top, len(order)) - 1]]
+        rows = np.sort(order[best[order] >= cut])
+        score = scorer.matrix(red_t, blue_t, rows)
+        for k, row in enumerate(rows.tolist()):
+            if row in excluded:
+                score[k, excluded[row]] = -np.inf
+        flat = np.argsort(-score, axis=None, kind='stable')[:n_top]
+        flat = flat[np.isfinite(score.ravel()[flat])]
+        r_idx, b_idx = np.unravel_index(flat, score.shape)
+        top = [{'red': reds[rows[i]].tolist(), 'blue': list(blue_combos[j]), 'score': float(score[i, j])}
+               for i, j in zip(r_idx.tolist(), b_idx.tolist())]
+        return combos, top
+
     def _generate_low_sum_combo(self, available_red, min_sum, max_sum):
         """生成指定和值范围的组合"""
         max_tries = 100
@@ -965,103 +1196,72 @@ class DaletouPredictor:
         # 如果失败，返回随机组合
         return sorted(list(np.random.choice(available_red, 5, replace=False)))
 
+    def blue_pair_table(self, blue_probas=None, lstm_probas=None):
+        """当期 66 组蓝球评分表（同一历史、同一组模型概率只构建一次）"""
+        key = (self.get_history_arrays().history_hash, type(self).markov_transitions.version(self),
+               tuple((blue_probas or {}).items()), tuple((lstm_probas or {}).items()))
+        if self._blue_table is None or self._blue_table_key != key:
+            last_blue = self.history_df.iloc[-1]['blue'] if len(self.history_df) > 0 else []
+            last_blue_sum = sum(last_blue) if len(last_blue) else 0
+            # 马尔可夫转移（蓝球和值 1 阶，类别 ID 即和值）
+            top_sums = []
+            if self.markov_transitions is not None and last_blue_sum:
+                top_sums = self.markov_transitions.tensors[('blue_sum', 1)].top_next((last_blue_sum,), k=3)
+            self._blue_table = BluePairTable(blue_probas, lstm_probas, top_sums)
+            self._blue_table_key = key
+        return self._blue_table
+
     def _select_blue_by_strategy(self, available_blue, hot_cold_info, strategy, offset=0, 
                                  blue_probas=None, lstm_probas=None):
-        """核心蓝球预测 - 融合 Stacking 与 LSTM 置信度 (性能优化)"""
-        all_blue_combos = list(combinations(range(1, 13), 2))
-        scored_combos = []
-        
-        last_rec = self.history_df.iloc[-1] if len(self.history_df) > 0 else None
-        last_blue = last_rec['blue'] if last_rec is not None else []
-        last_blue_sum = sum(last_blue) if last_blue else 0
-        
-        # 允许使用传入的概率，如果没传则现场算一次（通常应该由外层传入）
-        b_stack_probas = blue_probas if blue_probas is not None else {}
-        b_lstm_probas = lstm_probas if lstm_probas is not None else {}
-        
-        # --- 热力图计算 ---
-        top_stack = sorted(b_stack_probas.items(), key=lambda x: x[1], reverse=True)[:4]
-        top_lstm = sorted(b_lstm_probas.items(), key=lambda x: x[1], reverse=True)[:4]
-        hot_nums = set([n for n, p in top_stack]) & set([n for n, p in top_lstm])
-        
-        # 马尔可夫转移
-        sum_trans = self.markov_transitions.get('blue_sum', {})
-        expected_sums = sorted(sum_trans.get(last_blue_sum, {}).items(), key=lambda x: x[1], reverse=True)
-        top_sums = [s for s, count in expected_sums[:3]]
-        
-        for combo in all_blue_combos:
-            combo = sorted(combo)
-            s = 100.0
-            b1, b2 = combo
-            b_sum = b1 + b2
-            
-            # 1. 置信度融合 (主分)
-            conf1 = (b_stack_probas.get(b1, 0) * 0.6) + (b_lstm_probas.get(b1, 0) * 0.4)
-            conf2 = (b_stack_probas.get(b2, 0) * 0.6) + (b_lstm_probas.get(b2, 0) * 0.4)
-            s += (conf1 + conf2) * 1000 
-            
-            # 2. 热力图爆发加成
-            if b1 in hot_nums: s += 300
-            if b2 in hot_nums: s += 300
-            
-            # 3. 统计规律
-            if b_sum in top_sums: s += 100
-            if 4 <= (b2 - b1) <= 8: s += 60
-            if b1 % 2 != b2 % 2: s += 50
-            
-            scored_combos.append({'combo': combo, 'score': s})
-            
+        """核心蓝球预测 - 融合 Stacking 与 LSTM 置信度（查当期评分表，见 blue_pairs）"""
         # V10 改进：增加随机性，避免固定推荐5,7
-        # 根据 offset 决定是采 Top 还是采随机
-        if offset % 3 == 0:  # 1/3 概率取Top1
-            return scored_combos[0]['combo']
-        elif offset % 3 == 1:  # 1/3 概率从Top10中随机
-            top10 = scored_combos[:10]
-            return top10[np.random.randint(len(top10))]['combo']
-        else:  # 1/3 概率权重采样
-            # 使用索引采样而非直接采样元组
-            scores = np.array([x['score'] for x in scored_combos])
-            scores = scores - np.min(scores) + 1.0 # 平滑
-            probs = scores / scores.sum()
-            
-            try:
-                # 采样索引，然后返回对应的组合
-                selected_idx = np.random.choice(len(scored_combos), p=probs)
-                return scored_combos[selected_idx]['combo']
-            except:
-                return scored_combos[0]['combo']
+        # 根据 offset 决定是采 Top1、Top10 随机还是按得分加权采样
+        return self.blue_pair_table(blue_probas, lstm_probas).select(offset)
 
     def _analyze_blue_trends(self, hc):
         pass # 占位用于未来扩展
 
-    def _select_by_similarity(self, available_red, offset=0):
-        if len(self.history_df) < 50: return self._select_by_frequency(available_red, {}, offset)
-        
-        # 提取最近 3 期的模式
-        recent = self.history_df.tail(3)
-        recent_pattern = [sum(r['red']) for _, r in recent.iterrows()]
-        
-        best_idx = -1
-        min_diff = float('inf')
-        
-        # 寻找历史上最相似的窗口 (仅检查最近 300 期)
-        search_df = self.history_df.tail(300)
-        for i in range(len(search_df) - 5):
-            window = [sum(r['red']) for _, r in search_df.iloc[i:i+3].iterrows()]
-            diff = sum(abs(a - b) for a, b in zip(recent_pattern, window))
-            if diff < min_diff:
-                min_diff = diff
-                best_idx = i + 3 # 取窗口后的下一期
-        
-        if best_idx != -1 and best_idx < len(self.history_df):
-            target_red = self.history_df.iloc[best_idx]['red']
+    def find_similar_windows(self, window=3, top_k=5, metric='l1', series='red_sum'):
+        """在全量历史中检索与最近 window 期走势最相似的 top_k 个窗口
+
+        Args:
+            window: 窗口长度（期数）
+            top_k: 返回的窗口数量
+            metric: 距离度量 l1 / l2 / chebyshev / shape
+            series: 用于比较的逐期序列（HistoryArrays 的属性名，默认红球和值）
+
+        Returns:
+            [{'start': 窗口起点下标, 'next_index': 窗口后一期下标, 'period': 后一期期号, 'distance': 距离}, ...]
+        """
+        arrays = self.get_history_arrays()
+        starts, dists = search_similar_windows(getattr(arrays, series), window=window, top_k=top_k, metric=metric)
+        return [
+            {'start': int(s), 'next_index': int(s) + window,
+             'period': int(arrays.periods[s + window]), 'distance': float(d)}
+            for s, d in zip(starts, dists)
+        ]
+
+    def _similarity_candidates(self, available_red, top_k=5, window=3, metric='l1'):
+        """相似窗口的下一期红球，按相似度排序（每个窗口生成一组候选）"""
+        if len(self.history_df) < 50: return []
+        arrays = self.get_history_arrays()
+        candidates = []
+        for match in self.find_similar_windows(window=window, top_k=top_k, metric=metric):
+            target_red = arrays.red[match['next_index']].tolist()
             res = [r for r in target_red if r in available_red]
             attempt_inner = 0
             while len(res) < 5 and attempt_inner < 100:
                 attempt_inner += 1
                 n = available_red[np.random.randint(len(available_red))]
                 if n not in res: res.append(n)
-            return sorted(res[:5])
+            candidates.append(sorted(res[:5]))
+        return candidates
+
+    def _select_by_similarity(self, available_red, offset=0):
+        # offset 选择第 offset 个最相似窗口（循环）
+        candidates = self._similarity_candidates(available_red, top_k=offset + 1)
+        if candidates:
+            return candidates[offset % len(candidates)]
         return self._select_by_frequency(available_red, {}, offset)
 
     def _select_by_hot_cold_mix(self, available_red, hot_cold_info, offset=0):
@@ -1086,22 +1286,19 @@ class DaletouPredictor:
 
     def _select_by_ensemble_top(self, available_red, hot_cold_info, offset=0):
         """直接选取集成模型概率最高的 5 个号码"""
-        if not self.ensemble_models.get('red'): return self._select_by_frequency(available_red, hot_cold_info, offset)
-        if not hasattr(self, '_cached_feat'):
-            self._cached_feat = self.extract_features(self.history_df, last_only=True).iloc[-1:]
-        current_feat = self._cached_feat
-        scores = {}
-        for num in available_red:
-            if num in self.ensemble_models['red']:
-                m = self.ensemble_models['red'][num]
-                p = (m['rf'].predict_proba(current_feat.values)[0][1] + m['gb'].predict_proba(current_feat.values)[0][1]) / 2
-                scores[num] = p
-            else: scores[num] = 0
+        if not self.components.ensure('ensemble') or not self.ensemble_models.get('red'):
+            return self._select_by_frequency(available_red, hot_cold_info, offset)
+        probas = self._ensemble_red_probas()
+        scores = {num: probas.get(num, 0) for num in available_red}
         sorted_nums = sorted(scores.items(), key=lambda x: x[1], reverse=True)
         # 选取第 offset 开始的 5 个
         idx = offset % (len(sorted_nums) - 5) if len(sorted_nums) > 5 else 0
         return sorted([n for n, s in sorted_nums[idx:idx+5]])
 
+    def _ensemble_red_probas(self):
+        """集成模型对末期特征的各红球概率 {号码: 概率}（见 ensemble_probas）"""
+        return proba_dict(self.ensemble_probas()[0])
+
     def _select_by_cold_rebound(self, available_red, hot_cold_info, offset=0):
         # 专门选择遗漏期数长的号码（冷号回补）
         miss = hot_cold_info.get('red_missing', {})
@@ -1137,17 +1334,11 @@ class DaletouPredictor:
             return sorted([x[0] for x in items_with_scores[:n]])
 
     def _select_by_ensemble(self, available_red, hot_cold_info, offset=0):
-        if not self.ensemble_models.get('red'): return self._select_by_frequency(available_red, hot_cold_info, offset)
-        if not hasattr(self, '_cached_feat'):
-            self._cached_feat = self.extract_features(self.history_df, last_only=True).iloc[-1:]
-        current_feat = self._cached_feat
-        scores = {}
-        for num in available_red:
-            if num in self.ensemble_models['red']:
-                m = self.ensemble_models['red'][num]
-                p = (m['rf'].predict_proba(current_feat)[0][1] + m['gb'].predict_proba(current_feat)[0][1]) / 2
-                scores[num] = p
-            else: scores[num] = 0.01 # 给一个极小的基础分，确保有机会被选中
+        if not self.components.ensure('ensemble') or not self.ensemble_models.get('red'):
+            return self._select_by_frequency(available_red, hot_cold_info, offset)
+        probas = self._ensemble_red_probas()
+        # 给一个极小的基础分，确保有机会被选中
+        scores = {num: probas.get(num, 0.01) for num in available_red}
         sorted_nums = sorted(scores.items(), key=lambda x: x[1], reverse=True)
         # V7 改进：采样池扩大到 25 个
         return self._weighted_sample(sorted_nums, 5, top_k=25)
@@ -1206,118 +1397,258 @@ class DaletouPredictor:
         return sorted(res[:2])
 
     def _build_stacking_ensemble(self, df):
-        """构建 Stacking 集成模型 - 针对前区(1-35)和后区(1-12)"""
-        if not ENSEMBLE_AVAILABLE or len(df) < 30: return
-        print(f"[*] 训练 Stacking 集成系统 ({len(df)}期)...", flush=True)
-        
-        # 提取特征
-        features = self.extract_features(df)
+        """构建 Stacking 集成模型 - 针对前区(1-35)和后区(1-12)，按号码并行训练"""
+        if not ENSEMBLE_AVAILABLE or len(df) < 30: return False
+        print(f"[*] 训练 Stacking 集成系统 ({len(df)}期, {self.train_workers or default_workers()}线程)...", flush=True)
+        
+        # 特征矩阵只构建一次，标签取自出号矩阵
+        X = self._features_for(df)
+        arrays = self.get_history_arrays() if df is self.history_df else HistoryArrays.from_df(df)
+        
+        self.stacking_reports = {}
+        for target_key, incidence in (('red', arrays.red_incidence), ('blue', arrays.blue_incidence)):
+            models_dict, report = train_per_number(X, incidence, target_key, fit_fn=fit_number_stack,
+                                                   min_positive=5, workers=self.train_workers)
+            for n, error in report['failures'].items():
+                print(f"  - {target_key} 号码 {n} Stacking 训练失败: {error}")
+            print(f"  - Stacking {format_report(report)}", flush=True)
+            self.stacking_reports[target_key] = report
+            if target_key == 'red':
+                self.stacking_meta_model = models_dict
+            else:
+                self.blue_stacking_meta_model = models_dict
+            self.compiled_stacking = None
         
-        def train_stack(numbers_range, target_key):
-            models_dict = {}
-            for n in numbers_range:
-                y = [1 if n in r[target_key] else 0 for _, r in df.iterrows()]
-                if sum(y) < 5: continue
-                
-                try:
-                    import xgboost as xgb
-                    from lightgbm import LGBMClassifier
-                    
-                    X_train = features.values
-                    y_train = np.array(y)
-                    
-                    # 基模型 1: XGBoost 原生 (增加轮数提升精度)
-                    dtrain = xgb.DMatrix(X_train, label=y_train)
-                    xgb_params = {'objective': 'binary:logistic', 'max_depth': 4, 'eta': 0.05, 'eval_metric': 'logloss', 'seed': 42}
-                    xgb_model = xgb.train(xgb_params, dtrain, num_boost_round=60, verbose_eval=False)
-                            
-                    # 基模型 2: LightGBM (增加复杂度)
-                    lgb_model = LGBMClassifier(n_estimators=60, max_depth=4, learning_rate=0.05, random_state=42, verbose=-1)
-                    lgb_model.fit(X_train, y_train)
-                            
-                    # 基模型 3: RandomForest (增加树的数量)
-                    rf_model = RandomForestClassifier(n_estimators=60, max_depth=6, random_state=42)
-                    rf_model.fit(X_train, y_train)
-                    
-                    # 元特征构建
-                    dtest = xgb.DMatrix(X_train)
-                    xgb_proba = xgb_model.predict(dtest)
-                    lgb_proba = lgb_model.predict_proba(X_train)[:, 1]
-                    rf_proba = rf_model.predict_proba(X_train)[:, 1]
-                    meta_X = np.column_stack([xgb_proba, lgb_proba, rf_proba])
-                    
-                    # 元模型: LogisticRegression
-                    meta_model = LogisticRegression(random_state=42, max_iter=1000)
-                    meta_model.fit(meta_X, y_train)
-                    
-                    models_dict[n] = {'xgb': xgb_model, 'lgb': lgb_model, 'rf': rf_model, 'meta': meta_model}
-                except Exception as e:
-                    print(f"  - {target_key} 号码 {n} Stacking 训练失败: {e}")
-            return models_dict
-
-        # 分别训练前区和后区
-        self.stacking_meta_model = train_stack(range(1, 36), 'red')
-        self.blue_stacking_meta_model = train_stack(range(1, 13), 'blue')
-        self.save_state() # 训练完成后立即保存，防止丢失进度
+        if self.autosave: self.save_state() # 训练完成后立即保存，防止丢失进度
         print(f"[*] Stacking 训练完成: 前区 {len(self.stacking_meta_model)}个, 后区 {len(self.blue_stacking_meta_model)}个")
 
+    def _update_walk_forward(self, df, refit_every=20):
+        """走查式回测的逐期训练：只使用 df（目标期之前的数据），不写入磁盘
+
+        Stacking 在上一期模型上继续提升；多标签模型与蓝球 LSTM 没有增量训练，沿用上一次（更早窗口）训练的模型，
+        完整重训时一并重训。首次调用、训练窗口不是上次的延续、或累计增量达到 refit_every 次时完整重训，限制模型规模持续增长。
+        首次调用时丢弃从 latest 状态加载的全部模型（用全量历史训练，含目标期之后的数据）。
+        """
+        state = self._walk_forward_state
+        if state is None:
+            self.stacking_meta_model = {}
+            self.blue_stacking_meta_model = {}
+            self.compiled_stacking = None
+            self.multilabel_model = None
+            self.blue_lstm_model = None
+            self.state_digest = None
+        if not ENSEMBLE_AVAILABLE or len(df) < 30: return
+        multilabel = self.model_mode in MULTILABEL_KINDS
+        arrays = HistoryArrays.from_df(df)
+        continues = (
+            (self.multilabel_model is not None if multilabel else self.stacking_meta_model)
+            and state is not None and state['rows'] < len(arrays)
+            and int(arrays.periods[state['rows'] - 1]) == state['last_period']
+            and state['updates'] < refit_every
+        )
+        t0 = time.time()
+        if multilabel:
+            if not continues:
+                self._build_multilabel_model(df)
+        else:
+            X = self.extract_features(df).values
+            for target_key, incidence in (('red', arrays.red_incidence), ('blue', arrays.blue_incidence)):
+                previous = (self.stacking_meta_model if target_key == 'red' else self.blue_stacking_meta_model) if continues else None
+                models_dict, report = train_per_number(X, incidence, target_key, fit_fn=fit_number_stack,
+                                                       min_positive=5, workers=self.train_workers, previous=previous)
+                if target_key == 'red':
+                    self.stacking_meta_model = models_dict
+                else:
+                    self.blue_stacking_meta_model = models_dict
+                self.compiled_stacking = None
+        if not continues:
+            # LSTM 在当前历史上训练，只有当前历史就是训练窗口时才能使用
+            self.blue_lstm_model = None
+            if df is self.history_df:
+                self._train_blue_lstm()
+        self._walk_forward_state = {
+            'rows': len(arrays),
+            'last_period': int(arrays.periods[-1]),
+            'updates': state['updates'] + 1 if continues else 0
+        }
+        print(f"[*] 走查训练 {'增量更新' if continues else '完整训练'} ({len(df)}期): {time.time() - t0:.1f}s", flush=True)
+
+    def _build_number_models(self, df):
+        """按 model_mode 训练号码概率模型"""
+        if self.model_mode in MULTILABEL_KINDS:
+            return self._build_multilabel_model(df)
+        return self._build_stacking_ensemble(df)
+
+    def _build_multilabel_model(self, df):
+        """训练多标签单模型（一个模型同时输出 35+12 个号码的出现概率）"""
+        if not ENSEMBLE_AVAILABLE or len(df) < 30: return False
+        print(f"[*] 训练多标签号码模型 ({self.model_mode}, {len(df)}期)...", flush=True)
+        X = self._features_for(df)
+        arrays = self.get_history_arrays() if df is self.history_df else HistoryArrays.from_df(df)
+        self.multilabel_model = MultiLabelNumberModel(kind=self.model_mode).fit(
+            X, arrays.red_incidence, arrays.blue_incidence)
+        if self.autosave: self.save_state()
+        print(f"[*] 多标签号码模型训练完成", flush=True)
+
+    def _model_token(self, attrs):
+        """概率缓存的模型键：实例编号 + 各模型属性的赋值版本"""
+        cls = type(self)
+        return (self._owner_id,) + tuple(getattr(cls, a).version(self) for a in attrs)
+
+    def last_features(self, hc=None):
+        """当前历史末期的特征（按历史哈希缓存；回测前缀模式由前缀数组直接得出）"""
+        prefix = self._active_prefix()
+
+        def compute():
+            if prefix:
+                n = len(self.history_df)
+                return prefix.last_features(n, hc if hc is not None else prefix.hot_cold(n))
+            return self.extract_features(self.history_df, last_only=True)
+        return cached('features', self.get_history_arrays().history_hash, None, compute)
+
+    def number_probas(self):
+        """当前模式号码模型对下一期的概率向量（前区 35 维、后区 12 维，按历史截止期与模型版本缓存）"""
+        if self.model_mode in MULTILABEL_KINDS and self.multilabel_model is not None:
+            attrs = ('multilabel_model',)
+        else:
+            attrs = ('compiled_stacking', 'stacking_meta_model', 'blue_stacking_meta_model')
+        return cached('numbers', self.get_history_arrays().history_hash, (self.model_mode, self._model_token(attrs)),
+                      lambda: self.predict_number_probas(self.last_features()))
+
+    def ensemble_probas(self):
+        """集成模型（各成员概率均值）对下一期的前区 35 维、后区 12 维概率向量（按历史截止期与模型版本缓存）"""
+        def compute():
+            x = self.last_features().iloc[-1:].values
+            red, blue = np.full(35, np.nan), np.full(12, np.nan)
+            for vec, models in ((red, self.ensemble_models['red']), (blue, self.ensemble_models['blue'])):
+                for num, m in models.items():
+                    # 前区为 RF+GB，后区只有 RF
+                    vec[num - 1] = sum(member.predict_proba(x)[0][1] for member in m.values()) / len(m)
+            return red, blue
+        return cached('ensemble', self.get_history_arrays().history_hash, (self._owner_id, self._ensemble_version), compute)
+
+    def lstm_probas(self):
+        """蓝球 LSTM 对下一期的 12 维概率（按历史截止期与权重哈希缓存，跨实例共享）；未训练或历史不足时返回 None"""
+        model = self.blue_lstm_model
+        if not model or len(self.history_df) < 10:
+            return None
+
+        def compute():
+            row = self.get_lstm_table().row(len(self.history_df))
+            return None if row is None else np.array(row)
+        return cached('lstm', self.get_history_arrays().history_hash, model_hash(model), compute)
+
+    def predict_number_probas(self, features):
+        """当前模式下的号码概率向量（前区 35 维、后区 12 维，缺失为 NaN）"""
+        if self.model_mode in MULTILABEL_KINDS and self.multilabel_model is not None:
+            return self.multilabel_model.predict_vectors(features)
+        return self.predict_stacking_batch(features)
+
     def _predict_with_stacking(self, features, target_type='red'):
-        """使用 Stacking 模型预测概率"""
-        models_source = self.stacking_meta_model if target_type == 'red' else self.blue_stacking_meta_model
-        if not models_source: return {}
+        """使用 Stacking 模型预测概率（{号码: 概率}，内部走批量推理）"""
+        red, blue = self.predict_stacking_batch(features)
+        probas = red if target_type == 'red' else blue
+        return {int(i) + 1: float(probas[i]) for i in np.flatnonzero(~np.isnan(probas))}
+
+    def predict_stacking_batch(self, features):
+        """批量 Stacking 推理：一次返回前区 35 维、后区 12 维概率向量（未训练的号码为 NaN）
+
+        有数组化模型（随状态保存 / 加载）时，全部号码的树在一次 NumPy 遍历中求值。
+        没有时，同一组模型第一次推理逐号码调用各库（每个号码 3 次基模型调用，元模型向量化）；
+        导出约为一次逐号码推理的 4 倍耗时，走查回测中每期更新的模型通常只推理一次，不值得导出。
+        同一组模型第二次推理（固定模型的前缀回测逐期推理）时导出并缓存，之后走数组化推理。
+        """
+        compiled = self.compiled_stacking
+        if compiled is None:
+            token = self._model_token(('stacking_meta_model', 'blue_stacking_meta_model'))
+            last, uses = self._stacking_uses
+            uses = uses + 1 if last == token else 0
+            self._stacking_uses = (token, uses)
+            if uses == 1:
+                # 导出失败时不再重试，直到模型变化
+                compiled = self._compile_stacking()
+                if compiled is not None:
+                    self.compiled_stacking = compiled
+        if compiled is not None:
+            x = np.asarray(features.values[-1] if hasattr(features, 'values') else features, dtype=np.float64).ravel()
+            return compiled['red'].vector(x, 35), compiled['blue'].vector(x, 12)
+        red = self._stacking_batch_probas(features, self.stacking_meta_model, 35)
+        blue = self._stacking_batch_probas(features, self.blue_stacking_meta_model, 12)
+        return red, blue
+
+    def _compile_stacking(self):
+        """将当前 Stacking 模型导出为数组化形式；没有模型或导出失败时返回 None"""
+        if self.compiled_stacking is not None:
+            return self.compiled_stacking
+        if not (self.stacking_meta_model or self.blue_stacking_meta_model):
+            return None
+        try:
+            return {'red': CompiledStacking.from_models(self.stacking_meta_model),
+                    'blue': CompiledStacking.from_models(self.blue_stacking_meta_model)}
+        except Exception as e:
+            print(f"[!] Stacking 模型导出失败，推理将使用原模型: {e}", flush=True)
+            return None
+
+    def _stacking_batch_probas(self, features, models_source, size):
+        """所有号码共享同一输入（仅最后一行特征），基模型逐号码调用各库，元模型 LogisticRegression 向量化为一次矩阵运算"""
+        probas = np.full(size, np.nan)
+        if not models_source: return probas
         
-        import xgboost as xgb
-        probas = {}
-        X = features.values
+        xgb = lazy_import('xgboost')
+        x = np.asarray(features.values[-1:] if hasattr(features, 'values') else features, dtype=np.float64).reshape(1, -1)
+        dtest = xgb.DMatrix(x)
         
+        numbers, base = [], []
         for n, models in models_source.items():
             try:
-                # 获取基模型概率
-                dtest = xgb.DMatrix(X)
-                xgb_p = models['xgb'].predict(dtest)[-1]
-                lgb_p = models['lgb'].predict_proba(X)[-1, 1]
-                rf_p = models['rf'].predict_proba(X)[-1, 1]
-                
-                # 元预测
-                meta_X = np.array([[xgb_p, lgb_p, rf_p]])
-                probas[n] = models['meta'].predict_proba(meta_X)[0, 1]
+                base.append([
+                    float(models['xgb'].predict(dtest)[0]),
+                    float(models['lgb'].booster_.predict(x)[0]),
+                    float(models['rf'].predict_proba(x)[0, 1])
+                ])
+                numbers.append(n)
             except: continue
+        if not numbers: return probas
+        
+        # 元预测: sigmoid(P·w + b)，P 为 K×3 基模型概率
+        coef = np.array([models_source[n]['meta'].coef_[0] for n in numbers])
+        intercept = np.array([models_source[n]['meta'].intercept_[0] for n in numbers])
+        z = (np.array(base) * coef).sum(axis=1) + intercept
+        probas[np.array(numbers) - 1] = 1.0 / (1.0 + np.exp(-z))
         return probas
 
     def _train_ensemble_models(self):
-        """训练深度集成学习模型"""
-        if not ENSEMBLE_AVAILABLE or len(self.history_df) < 30: return
+        """训练深度集成学习模型（按号码并行，由集成选号策略按需触发）"""
+        if not ENSEMBLE_AVAILABLE or len(self.history_df) < 30: return False
         print(f"[*] 训练集成模型 ({len(self.history_df)}期)...")
-        feats = self.extract_features(self.history_df)
-        self.ensemble_models['red'] = {}
-        self.ensemble_models['blue'] = {}
-        for n in range(1, 36):
-            y = [1 if n in r['red'] else 0 for _, r in self.history_df.iterrows()]
-            if sum(y) < 5: continue
-            try:
-                m1 = RandomForestClassifier(n_estimators=50, max_depth=5, random_state=42)
-                m2 = GradientBoostingClassifier(n_estimators=50, max_depth=3, random_state=42)
-                m1.fit(feats.values, y); m2.fit(feats.values, y)
-                self.ensemble_models['red'][n] = {'rf': m1, 'gb': m2}
-            except: pass
-        for n in range(1, 13):
-            y = [1 if n in r['blue'] else 0 for _, r in self.history_df.iterrows()]
-            if sum(y) < 3: continue
-            try:
-                m1 = RandomForestClassifier(n_estimators=30, max_depth=3, random_state=42)
-                m1.fit(feats.values, y)
-                self.ensemble_models['blue'][n] = {'rf': m1}
-            except: pass
+        X = self._features_for(self.history_df)
+        arrays = self.get_history_arrays()
+        for target_key, incidence, min_positive in (('red', arrays.red_incidence, 5), ('blue', arrays.blue_incidence, 3)):
+            models_dict, report = train_per_number(X, incidence, target_key, fit_fn=fit_number_ensemble,
+                                                   min_positive=min_positive, workers=self.train_workers)
+            self.ensemble_models[target_key] = models_dict
+            self._ensemble_version += 1
+            print(f"  - 集成模型 {format_report(report)}", flush=True)
         print(f"[*] 集成模型训练完成")
 
+    def _build_feature_matrix(self):
+        if len(self.history_df) == 0: return False
+        self._train_features = self.extract_features(self.history_df).values
+
+    def _features_for(self, df):
+        """训练特征矩阵：当前历史复用 features 组件，其他窗口单独提取"""
+        if df is self.history_df and self.components.ensure('features'):
+            return self._train_features
+        return self.extract_features(df).values
+
     def extract_features(self, df, last_only=False):
         """提取深度增强特征 - V4版本 (支持增量缓存优化)"""
         import joblib
         cache_path = os.path.join(self.assets_dir, 'features_cache.pkl')
         
-        # 尝试加载缓存
+        # 尝试加载缓存（last_only 不使用缓存）
         feature_cache = {}
-        if os.path.exists(cache_path):
+        if not last_only and os.path.exists(cache_path):
             try: feature_cache = joblib.load(cache_path)
             except: pass
 
@@ -1342,46 +1673,13 @@ class DaletouPredictor:
                 res.append(feature_cache[p_key])
                 continue
 
-            r = sorted(row['red'])
-            b = sorted(row['blue'])
-            
-            # 基础统计与 V4 特征提取
-            red_sum = sum(r); red_span = r[-1] - r[0]
-            odd_count = sum(1 for x in r if x % 2 == 1)
-            z1 = sum(1 for x in r if x <= 11); z2 = sum(1 for x in r if 12 <= x <= 23); z3 = sum(1 for x in r if x >= 24)
-            blue_sum = sum(b); blue_span = b[1] - b[0]
-            gaps = [r[j+1]-r[j] for j in range(len(r)-1)]
-            avg_gap = np.mean(gaps); std_gap = np.std(gaps)
-            tail_diversity = len(set([x % 10 for x in r]))
-            m0 = sum(1 for x in r if x % 3 == 0); m1 = sum(1 for x in r if x % 3 == 1); m2 = sum(1 for x in r if x % 3 == 2)
-            diffs = set()
-            for j in range(len(r)):
-                for k in range(j + 1, len(r)): diffs.add(abs(r[j] - r[k]))
-            ac_val = len(diffs) - 4
-            missing_vals = [red_miss.get(num, 0) for num in r]
-            missing_sum = sum(missing_vals); max_miss = max(missing_vals)
-            repeat_count = 0; jump_count = 0
-            if idx > 0:
-                last_red = set(df.iloc[idx-1]['red'])
-                repeat_count = len(set(r) & last_red)
-                if idx > 1:
-                    prev_red = set(df.iloc[idx-2]['red'])
-                    jump_count = len(set(r) & prev_red)
-            prime_count = sum(1 for x in r if x in {2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31})
-            tail_sum = sum(x % 10 for x in r)
-            consecutive_count = sum(1 for j in range(len(r)-1) if r[j+1] - r[j] == 1)
-            
-            # 趋势特征 (动态)
-            sum_trend = 0
-            if idx >= 10:
-                avg5_sum = np.mean([sum(x['red']) for _, x in df.iloc[idx-5:idx].iterrows()])
-                sum_trend = red_sum - avg5_sum
-            
-            f = [
-                red_sum, red_span, odd_count, z1, z2, z3, blue_sum, blue_span,
-                avg_gap, std_gap, tail_diversity, ac_val, missing_sum, repeat_count, 
-                jump_count, prime_count, tail_sum, m0, m1, m2, max_miss, consecutive_count, sum_trend
-            ]
+            # 基础统计与 V4 特征提取（见 prefix_state.feature_row）
+            f = feature_row(
+                sorted(row['red']), sorted(row['blue']), red_miss,
+                last_red=df.iloc[idx-1]['red'] if idx > 0 else None,
+                prev_red=df.iloc[idx-2]['red'] if idx > 1 else None,
+                trend_sums=[sum(x['red']) for _, x in df.iloc[idx-5:idx].iterrows()] if idx >= 10 else None
+            )
             res.append(f)
             
             # 更新缓存 (仅在全量提取时)
@@ -1390,25 +1688,33 @@ class DaletouPredictor:
                 cache_updated = True
                 
         if cache_updated:
-            try: joblib.dump(feature_cache, cache_path)
+            # 先写临时文件再替换：并行回测的多个进程可能同时更新缓存
+            tmp_path = f'{cache_path}.tmp{os.getpid()}'
+            try:
+                joblib.dump(feature_cache, tmp_path)
+                os.replace(tmp_path, cache_path)
             except: pass
             
-        columns = [
-            'red_sum', 'red_span', 'odd_count', 'z1', 'z2', 'z3', 'blue_sum', 'blue_span',
-            'avg_gap', 'std_gap', 'tail_diversity', 'ac_val', 'missing_sum', 'repeat_count', 
-            'jump_count', 'prime_count', 'tail_sum', 'm0', 'm1', 'm2', 'max_miss', 'consecutive_count', 'sum_trend'
-        ]
-        return pd.DataFrame(res, columns=columns)
+        return pd.DataFrame(res, columns=FEATURE_COLUMNS)
 
     def predict(self, period, n_combinations=20, n_compound=10, exporter=None, cancel_check=None, kill_red=None, kill_blue=None, 
-                sum_range=None, odd_even_ratio=None, is_backtest=False, reference_urls=None):
+                sum_range=None, odd_even_ratio=None, is_backtest=False, reference_urls=None, must_red=None, must_blue=None,
+                mode='exhaustive', n_candidates=3000):
         """生成预测 - V8 全量架构重构版（枚举所有符合条件的组合）
         
         参数:
             n_combinations: 单式号码数量（默认20组5+2）
             n_compound: 复试号码数量（默认10组8+3）
+            must_red / must_blue: 胆码（单式号码必须包含的红球 / 蓝球）
+            mode: 单式号码的评分方式
+                'exhaustive' 逐注枚举评分（默认）
+                'batch'      全空间批量评分（batch_scoring，结果与 exhaustive 一致）
+                'sampled'    generate_candidates 各策略生成 n_candidates 组红球候选，经局部搜索（换一个号码）扩展后
+                             与全部蓝球组合批量评分
         """
         if not self.is_trained: raise ValueError("未训练")
+        if mode not in self.PREDICT_MODES:
+            raise ValueError(f"未知的生成模式: {mode}（可选: {', '.join(self.PREDICT_MODES)}）")
         
         # 基于期号设置随机种子，确保相同输入产生相同结果
         try:
@@ -1425,12 +1731,13 @@ class DaletouPredictor:
         # 提取参考网页号码
         ref_numbers = self._fetch_reference_numbers(reference_urls) if reference_urls else None
         
-        # 清除缓存
-        for attr in ['_cached_feat', '_cached_moms']:
-            if hasattr(self, attr): delattr(self, attr)
+        # 清除缓存（模型概率由 probability_cache 按历史截止期缓存，无需清除）
+        if hasattr(self, '_cached_moms'): del self._cached_moms
         
         last = self.history_df.iloc[-1] if len(self.history_df) > 0 else None
-        hc = self.calculate_hot_cold(self.history_df)
+        # 回测前缀模式：冷热号、末期特征、相似期次直接由前缀数组得出
+        prefix = self._active_prefix()
+        hc = prefix.hot_cold(len(self.history_df)) if prefix else self.calculate_hot_cold(self.history_df)
         
         # 构建所有历史开奖号码集合（用于过滤重复）
         # 优先从 daletou_history_full.txt 加载完整历史数据
@@ -1463,170 +1770,129 @@ class DaletouPredictor:
         avail_blue = [n for n in range(1, 13) if n not in kill_blue]
         
         print(f"[*] 可用红球: {len(avail_red)}个, 可用蓝球: {len(avail_blue)}个", flush=True)
+        if must_red or must_blue:
+            print(f"[*] 胆码: 红球{sorted(must_red or [])}, 蓝球{sorted(must_blue or [])}", flush=True)
         
         # 预计算模型概率（用于评分）
         print(f"[*] 开始特征提取...", flush=True)
-        last_feat_df = self.extract_features(self.history_df, last_only=True)
+        last_feat_df = self.last_features(hc)
         print(f"[*] 特征提取完成", flush=True)
         
         print(f"[*] 开始ML模型预测...", flush=True)
-        red_probas = self._predict_with_stacking(last_feat_df, target_type='red') if self.stacking_meta_model else {}
-        print(f"[*] 红球预测完成", flush=True)
-        blue_probas = self._predict_with_stacking(last_feat_df, target_type='blue') if self.blue_stacking_meta_model else {}
-        print(f"[*] 蓝球Stacking预测完成", flush=True)
+        red_vec, blue_vec = self.number_probas()
+        red_probas = {n: float(red_vec[n - 1]) for n in range(1, 36) if not np.isnan(red_vec[n - 1])}
+        blue_probas = {n: float(blue_vec[n - 1]) for n in range(1, 13) if not np.isnan(blue_vec[n - 1])}
+        print(f"[*] 红球/蓝球概率预测完成（{self.model_mode}）", flush=True)
         lstm_probas = self._predict_blue_with_lstm() if self.blue_lstm_model else {}
         print(f"[*] 蓝球LSTM预测完成", flush=True)
         
         # 预计算历史相似期次
         print(f"[*] 开始查找相似期次...", flush=True)
         last_row_feats = last_feat_df.iloc[-1].to_dict()
-        global_similar_periods = self._find_similar_periods(last_row_feats, top_k=8)
+        if prefix:
+            global_similar_periods = prefix.similar_periods(len(self.history_df), last_row_feats, top_k=8)
+        else:
+            global_similar_periods = self._find_similar_periods(last_row_feats, top_k=8)
         print(f"[*] 相似期次查找完成（找到{len(global_similar_periods)}期）", flush=True)
         
         # ====== V12性能优化：快速过滤 + 缓存预计算 ======
         # 原则：不改变遍历逻辑，保证不遗漏任何组合
         # 优化：提前过滤 + 缓存复用 + 增量计算
         
-        # 1. 生成所有可能的红球组合 (C(n,5))
-        all_red_combos = list(combinations(avail_red, 5))
-        all_blue_combos = list(combinations(avail_blue, 2))
-        
-        total_combos = len(all_red_combos) * len(all_blue_combos)
-        print(f"[*] 总组合数: {total_combos} = {len(all_red_combos)}(红) × {len(all_blue_combos)}(蓝)", flush=True)
-        print(f"[*] V12优化：使用快速过滤+缓存预计算，保证全量遍历", flush=True)
-        
-        # 2. 预计算红球特征缓存（避免重复计算）
-        red_features_cache = {}
-        print(f"[*] 正在预计算红球特征...", flush=True)
-        for red in all_red_combos:
-            red = sorted(red)
-            red_key = tuple(red)
-            red_sum = sum(red)
-            odd_count = sum(1 for x in red if x % 2 == 1)
-            
-            red_features_cache[red_key] = {
-                'sum': red_sum,
-                'odd_count': odd_count,
-                'span': red[-1] - red[0],
-                'small_count': sum(1 for x in red if x <= 12),
-                'big_count': sum(1 for x in red if x > 17)
-            }
-        
-        print(f"[*] 红球特征缓存完成，开始枚举评分...", flush=True)
+        # 1. 通过红球二级索引直接取出满足过滤条件的组合（开销与命中数成正比）
+        red_table = get_red_table()
+        red_index = get_red_index()
+        select_filters = {}
+        if not is_backtest:
+            # 前置必过滤条件：全奇全偶 / 四连号 / 等差 / 等比 / 同区（仅开始预测/导出模式，回测模式无任何过滤）
+            select_filters['exclude_flags'] = PREDICT_RULE_FLAGS
+            # 用户手动输入过滤条件：和值范围 / 奇偶比
+            if sum_range:
+                select_filters['sum_range'] = (sum_range[0], sum_range[1])
+            if odd_even_ratio:
+                try:
+                    select_filters['odd_counts'] = [int(odd_even_ratio.split(':')[0])]
+                except: pass
+        red_ids = red_index.select(**select_filters)
+        # 杀号 / 胆码：号码倒排位图按位运算后逐 ID 测试
+        if kill_red or must_red:
+            red_ids = red_ids[red_table.bitset_test(red_table.constraint_bitset(kill_red, must_red), red_ids)]
+        # 过滤条件：重号限制（与上期重复数 >= 4）
+        if not is_backtest and last is not None:
+            red_overlap = np.isin(red_table.combos[red_ids], list(last['red'])).sum(axis=1)
+            red_ids = red_ids[red_overlap < 4]
+        blue_space = get_blue_space()
+        all_blue_combos = [tuple(b) for b in blue_space.combos[blue_space.allowed_ids(kill_blue, must_blue)].tolist()]
+        
+        total_combos = comb(len(avail_red), 5) * len(all_blue_combos)
+        print(f"[*] 总组合数: {total_combos} = {comb(len(avail_red), 5)}(红) × {len(all_blue_combos)}(蓝)", flush=True)
+        print(f"[*] 索引过滤后红球组合: {len(red_ids)} 组", flush=True)
+        
+        # 2. 红球组合 → 类别 ID（动态评分按类别查表，整期只构建一次评分立方体）
+        red_categories = red_table.category[red_ids]
+        self.get_score_cube(last)
+        
+        if mode in ('batch', 'sampled'):
+            if mode == 'sampled':
+                candidates = self.generate_candidates(n_candidates, avail_red, avail_blue, hc, red_probas=red_probas,
+                                                      blue_probas=blue_probas, lstm_probas=lstm_probas, with_blue=False)
+                seed_ids = np.unique(red_table.rank([c['red'] for c in candidates]))
+                print(f"[*] 候选采样: {len(candidates)} 组红球组合", flush=True)
+            if not is_backtest and last is not None:
+                # 蓝球重号过滤（>= 2个重号）
+                all_blue_combos = [b for b in all_blue_combos if len(set(b) & set(last['blue'])) < 2]
+            evaluated_combos, fill_combos = self._batch_combos(
+                red_ids, all_blue_combos, hc, last, red_probas, blue_probas, lstm_probas, global_similar_periods,
+                ref_numbers, historical_combos, seed_ids=seed_ids if mode == 'sampled' else None,
+                n_top=2 * n_combinations)
+        else:
+            print(f"[*] 开始枚举评分...", flush=True)
         
-        evaluated_combos = []
-        processed_count = 0
+            evaluated_combos = []
+            processed_count = 0
         
-        for red in all_red_combos:
-            if cancel_check and cancel_check(): 
-                break
-            
-            # V12优化：从缓存中读取特征，避免重复计算
-            red = sorted(red)
-            red_key = tuple(red)
-            features = red_features_cache[red_key]
-            red_sum = features['sum']
-            odd_count = features['odd_count']
+            for red_idx, red in enumerate(red_table.combos[red_ids].tolist()):
+                if cancel_check and cancel_check(): 
+                    break
             
-            # ====== 仅开始预测/导出模式执行过滤（回测模式无任何过滤） ======
-            if not is_backtest:
-                # 前置必过滤条件（1）全奇全偶过滤
-                if odd_count == 0 or odd_count == 5:
-                    continue
-                
-                # 前置必过滤条件（2）四连号过滤（>=4连号）
-                consecutive_count = 1
-                max_consecutive = 1
-                for i in range(len(red) - 1):
-                    if red[i+1] - red[i] == 1:
-                        consecutive_count += 1
-                        max_consecutive = max(max_consecutive, consecutive_count)
-                    else:
-                        consecutive_count = 1
-                if max_consecutive >= 4:
-                    continue
-                
-                # 前置必过滤条件（3）等差数列过滤
-                if len(red) >= 3:
-                    diffs = [red[i+1] - red[i] for i in range(len(red)-1)]
-                    if len(set(diffs)) == 1 and diffs[0] > 0:
-                        continue
-                
-                # 前置必过滤条件（4）等比数列过滤
-                if len(red) >= 3:
-                    is_geometric = False
-                    for i in range(len(red) - 2):
-                        if red[i] > 0 and red[i+1] > 0:
-                            ratio1 = red[i+1] / red[i]
-                            ratio2 = red[i+2] / red[i+1]
-                            if abs(ratio1 - ratio2) < 0.01 and ratio1 > 1:
-                                is_geometric = True
-                                break
-                    if is_geometric:
-                        continue
+                # 进入蓝球遍历
+                for blue in all_blue_combos:
+                    if cancel_check and cancel_check():
+                        break
                 
-                # 前置必过滤条件（5）同区号码过滤（5个球全在同一区）
-                zone1 = sum(1 for x in red if 1 <= x <= 11)
-                zone2 = sum(1 for x in red if 12 <= x <= 23)
-                zone3 = sum(1 for x in red if 24 <= x <= 35)
-                if zone1 == 5 or zone2 == 5 or zone3 == 5:
-                    continue
-            
-            # ====== 用户手动输入过滤条件（仅预测/导出模式） ======
-            if not is_backtest:
-                # 过滤条件：和值范围
-                if sum_range and not (sum_range[0] <= red_sum <= sum_range[1]):
-                    continue
+                    blue = sorted(blue)
                 
-                # 过滤条件：奇偶比
-                if odd_even_ratio:
-                    try:
-                        target_odd = int(odd_even_ratio.split(':')[0])
-                        if odd_count != target_odd:
+                    # ====== 前置必过滤条件：历史开奖号码（仅预测/导出模式） ======
+                    if not is_backtest:
+                        combo_key = (tuple(red), tuple(blue))
+                        if combo_key in historical_combos:
                             continue
-                    except: pass
                 
-                # 过滤条件：重号限制（与上期重复数）
-                if last is not None:
-                    red_overlap = len(set(red) & set(last['red']))
-                    if red_overlap >= 4:
-                        continue
-            
-            # 进入蓝球遍历
-            for blue in all_blue_combos:
-                if cancel_check and cancel_check():
-                    break
-                
-                blue = sorted(blue)
-                
-                # ====== 前置必过滤条件：历史开奖号码（仅预测/导出模式） ======
-                if not is_backtest:
-                    combo_key = (tuple(red), tuple(blue))
-                    if combo_key in historical_combos:
-                        continue
-                
-                # ====== 用户手动输入过滤条件（仅预测/导出模式） ======
-                if not is_backtest:
-                    # 蓝球重号过滤（>= 2个重号）
-                    if last is not None:
-                        blue_overlap = len(set(blue) & set(last['blue']))
-                        if blue_overlap >= 2:
-                            continue
+                    # ====== 用户手动输入过滤条件（仅预测/导出模式） ======
+                    if not is_backtest:
+                        # 蓝球重号过滤（>= 2个重号）
+                        if last is not None:
+                            blue_overlap = len(set(blue) & set(last['blue']))
+                            if blue_overlap >= 2:
+                                continue
                 
-                # 通过所有筛选，进行深度评分
-                score = self.score_combination(red, blue, hc, last,
-                                              red_probas=red_probas,
-                                              blue_probas=blue_probas,
-                                              lstm_probas=lstm_probas,
-                                              similar_periods_override=global_similar_periods,
-                                              ref_numbers=ref_numbers)
+                    # 通过所有筛选，进行深度评分
+                    score = self.score_combination(red, blue, hc, last,
+                                                  red_probas=red_probas,
+                                                  blue_probas=blue_probas,
+                                                  lstm_probas=lstm_probas,
+                                                  similar_periods_override=global_similar_periods,
+                                                  ref_numbers=ref_numbers,
+                                                  red_category=int(red_categories[red_idx]))
                 
-                evaluated_combos.append({'red': list(red), 'blue': list(blue), 'score': score})
-                processed_count += 1
+                    evaluated_combos.append({'red': list(red), 'blue': list(blue), 'score': score})
+                    processed_count += 1
                 
-                # 每处理 10000 组输出一次进度
-                if processed_count % 10000 == 0:
-                    print(f"[*] 已评分: {processed_count} 组...", flush=True)
+                    # 每处理 10000 组输出一次进度
+                    if processed_count % 10000 == 0:
+                        print(f"[*] 已评分: {processed_count} 组...", flush=True)
+            # 逐注枚举时补齐即取自全体已评分的注
+            fill_combos = evaluated_combos
         
         print(f"[*] 共评分 {len(evaluated_combos)} 组符合条件的组合", flush=True)
         
@@ -1654,9 +1920,10 @@ class DaletouPredictor:
             if not is_too_similar:
                 final_candidates.append(c)
         
-        # 如果由于多样性过滤导致不够，则补齐
+        # 如果由于多样性过滤导致不够，则补齐（批量模式按全体注的排序，见 _batch_combos）
         if len(final_candidates) < n_combinations:
-            for c in evaluated_combos:
+            fill_combos.sort(key=lambda x: x['score'], reverse=True)
+            for c in fill_combos:
                 if len(final_candidates) >= n_combinations:
                     break
                 if c not in final_candidates:
@@ -1912,227 +2179,224 @@ class DaletouPredictor:
         from math import comb
         return comb(red_count, 5) * comb(blue_count, 2)
 
-    def validate_model(self, start, end, train_ensemble=True, cancel_check=None, on_period_complete=None):
-        """回测验证 - 诚实验证版 (支持流式反馈)"""
+    def validate_model(self, start, end, train_ensemble=True, cancel_check=None, on_period_complete=None, walk_forward=False,
+                       workers=None):
+        """回测验证 - 诚实验证版 (支持流式反馈)
+        
+        walk_forward=True 时逐期增量训练号码模型（只用目标期之前的数据，见 _update_walk_forward），不读取 / 写入按期缓存
+        workers: 回测进程数（见 backtest_engine），结果按期号顺序推送
+        """
         try:
             start = int(start)
             end = int(end)
         except: pass
             
-        val_data = self.history_df[(self.history_df['period'] >= start) & (self.history_df['period'] <= end)].copy()
+        val_data = self.history_df[(self.history_df['period'] >= start) & (self.history_df['period'] <= end)]
         if len(val_data) == 0: return {'success': False, 'error': '无数据'}
         
         results = []
         hits_dist = Counter()
-        total_red_hits = 0
-        total_blue_hits = 0
+        for res_item in self.iter_validation(start, end, train_ensemble=train_ensemble, cancel_check=cancel_check,
+                                             walk_forward=walk_forward, workers=workers, hits_dist=hits_dist):
+            results.append(res_item)
+            # 如果有回调函数，则实时推送
+            if on_period_complete:
+                on_period_complete(res_item)
         
-        # 初始化一个用于回测的持久化预测器
-        predictor = DaletouPredictor()
-        
-        for i, row in val_data.iterrows():
-            if cancel_check and cancel_check():
-                break
-            
-            p = row['period']
-            act_r = row['red']
-            act_b = row['blue']
-            train_df = self.history_df[self.history_df['period'] < p]
-            
-            try:
-                # 预测逻辑 (保持 V7 优化版不变)
-                predictor.history_df = train_df
-                predictor.is_trained = True
-                predictor._build_markov_chain()
-                predictor._learn_patterns()
-                predictor._init_dynamic_weights()
-                
-                # 加载或训练模型
-                has_cached = predictor.load_state(tag=str(p))
-                if not has_cached and train_ensemble and ENSEMBLE_AVAILABLE and len(results) % 10 == 0:
-                    predictor._build_stacking_ensemble(train_df)
-                    predictor.save_state(tag=str(p))
-                
-                preds = list(predictor.predict(str(p), n_combinations=20, is_backtest=True))
-                if not preds: continue
-                
-                # 统计数据
-                br, bb = 0, 0
-                for pr in preds:
-                    hr = len(set(act_r) & set(pr['red']))
-                    hb = len(set(act_b) & set(pr['blue']))
-                    if hr > br or (hr == br and hb > bb): br, bb = hr, hb
-                hits_dist[f"R{br}+B{bb}"] += 1
-                
-                best_pred = preds[0]
-                r_hits = len(set(act_r) & set(best_pred['red']))
-                b_hits = len(set(act_b) & set(best_pred['blue']))
-                total_red_hits += r_hits
-                total_blue_hits += b_hits
-                
-                res_item = {
-                    'period': str(p),
-                    'actual_red': act_r,
-                    'actual_blue': act_b,
-                    'predicted_red': best_pred['red'],
-                    'predicted_blue': best_pred['blue'],
-                    'red_hits': r_hits,
-                    'blue_hits': b_hits,
-                    'reason': best_pred.get('reason', ''),
-                    # 实时统计快照
-                    'current_avg_red': round(total_red_hits / (len(results)+1), 2),
-                    'current_avg_blue': round(total_blue_hits / (len(results)+1), 2),
-                    'current_core_cov': self._calc_temp_coverage(hits_dist, len(results)+1),
-                    'current_soft_cov': getattr(self, '_last_soft_coverage', 0)
-                }
-                results.append(res_item)
-                
-                # 如果有回调函数，则实时推送
-                if on_period_complete:
-                    on_period_complete(res_item)
-                    
-            except Exception as e:
-                print(f"Error {p}: {e}")
-                
         return {
             'success': True,
             'total_periods': len(results),
-            'avg_red_hits': round(total_red_hits / len(results), 2) if results else 0,
-            'avg_blue_hits': round(total_blue_hits / len(results), 2) if results else 0,
+            'avg_red_hits': round(sum(r['red_hits'] for r in results) / len(results), 2) if results else 0,
+            'avg_blue_hits': round(sum(r['blue_hits'] for r in results) / len(results), 2) if results else 0,
+            'hit_distribution': dict(hits_dist),
+            # 全部回测期、全部投注的奖级分布、回报率与置信区间
+            'prize_metrics': evaluate_results(results).summary() if results else None,
             'results': results
         }
 
-    def _calc_temp_coverage(self, hits, total):
-        if total == 0: return 0
-        cov = 0
-        soft_cov = 0
-        for hit, count in hits.items():
-            match = re.search(r'R(\d+)\+B(\d+)', hit)
-            if match:
-                r = int(match.group(1))
-                b = int(match.group(2))
-                # 核心覆盖率：4+2 或 5+X
-                if (r >= 4 and b >= 2) or (r == 5):
-                    cov += count
-                # 软覆盖率（统计 3+1, 3+2, 4+0, 4+1 作为进步指标）
-                if (r >= 3 and b >= 1) or (r >= 4):
-                    soft_cov += count
-        
-        # 如果核心覆盖率为0，但软覆盖率存在，返回一个带有进度的负值（前端可解析或仅供打印）
-        # 这里我们修改打印逻辑，不只是返回数字
-        self._last_soft_coverage = (soft_cov / total) * 100
-        return (cov / total) * 100
+    def iter_validation(self, start, end, train_ensemble=True, cancel_check=None, walk_forward=False, workers=None,
+                        hits_dist=None, reuse=True, predict_mode='exhaustive'):
+        """逐期产出回测结果（按期号顺序），附带实时统计快照
+
+        各期由 backtest_engine 在进程池中并行计算，结果立即写入 backtest_store；
+        reuse=True 时相同（历史、引擎版本、模型、参数）下已完成的期直接取用（标记 cached）。
+        模型按期取：各期实际使用的状态由回测引擎打上期号标签，结果键取该标签的内容哈希；
+        尚无标签的期与走查模式（模型取决于分块起点）不复用，结果按本次回测专用的键记录。
+        predict_mode 不进入结果键（batch 与 exhaustive 结果相同）。
+        """
+        from backtest_engine import run_backtest
+        from backtest_store import engine_version, prefix_hashes, result_key
+        periods = self.history_df.loc[(self.history_df['period'] >= int(start)) & (self.history_df['period'] <= int(end)),
+                                      'period'].tolist()
+        store = self.backtest_store
+        arrays = self.get_history_arrays()
+        rows = {int(p): i for i, p in enumerate(arrays.periods)}
+        hashes = prefix_hashes(arrays)
+        model_hash = self._backtest_model_hash()
+        params = {'model_mode': self.model_mode, 'train_ensemble': bool(train_ensemble),
+                  'walk_forward': bool(walk_forward), 'n_combinations': 20}
+        registry = self.registry
+
+        def period_key(p, state):
+            return result_key(hashes[rows[p]], engine_version(), state, params) if state else None
+        # 没有任何状态且不训练时各期都没有号码模型
+        fallback = 'none' if not train_ensemble and registry.digest('latest') is None else None
+        keys = {int(p): period_key(int(p), None if walk_forward else registry.digest(int(p)) or fallback) for p in periods}
+        cached = store.lookup(keys.values()) if reuse else {}
+        run_id = store.start_run(start, end, model_hash, params)
+        missing = [p for p in periods if keys[int(p)] is None or keys[int(p)] not in cached]
+        if cached:
+            print(f"[*] 回测复用已完成的 {len(periods) - len(missing)} 期，需计算 {len(missing)} 期", flush=True)
+        
+        computed = run_backtest(self.history_df, missing, model_mode=self.model_mode, assets_dir=self.assets_dir,
+                                train_ensemble=train_ensemble, walk_forward=walk_forward, workers=workers,
+                                cancel_check=cancel_check, predict_mode=predict_mode,
+                                on_result=lambda item: store.record(
+                                    run_id, item['period'], period_key(int(item['period']), item['model_state'] or f'run:{run_id}'), item))
+        hits_dist = Counter() if hits_dist is None else hits_dist
+        total_red_hits = 0
+        total_blue_hits = 0
+        count = core_count = soft_count = 0
+        total_cost = total_payout = 0.0
+        # 计算结果按期号顺序到达；只在轮到缺失的期时才向引擎取下一条，已存储的期不必等待
+        nxt, done = None, False
+        try:
+            for p in periods:
+                p = int(p)
+                if keys[p] is not None and keys[p] in cached:
+                    if cancel_check and cancel_check():
+                        break
+                    item = dict(cached[keys[p]], cached=True)
+                    store.record(run_id, p, keys[p])
+                else:
+                    if nxt is None and not done:
+                        nxt = next(computed, None)
+                        done = nxt is None
+                    if nxt is None or int(nxt['period']) != p:
+                        continue  # 该期无预测、出错或已取消
+                    item, nxt = nxt, None
+                br, bb = item.pop('best_hits')
+                hits_dist[f"R{br}+B{bb}"] += 1
+                count += 1
+                core_count += bool(core_hit(br, bb))
+                soft_count += bool(soft_hit(br, bb))
+                total_red_hits += item['red_hits']
+                total_blue_hits += item['blue_hits']
+                # 本期全部投注的奖级统计
+                prize = evaluate_results([item]).period(0)
+                item['prize'] = prize
+                total_cost += prize['cost']
+                total_payout += prize['payout']
+                # 实时统计快照
+                item['current_avg_red'] = round(total_red_hits / count, 2)
+                item['current_avg_blue'] = round(total_blue_hits / count, 2)
+                item['current_core_cov'] = core_count / count * 100
+                item['current_soft_cov'] = soft_count / count * 100
+                item['current_return_rate'] = total_payout / total_cost * 100 if total_cost else 0
+                yield item
+        finally:
+            # 提前结束（取消 / 客户端断开）时停止进程池
+            computed.close()
+
+    @property
+    def backtest_store(self):
+        """回测结果存储（model_assets/backtests）"""
+        from backtest_store import BacktestStore
+        root = os.path.join(self.assets_dir, 'backtests')
+        if self._backtest_store is None or self._backtest_store.root != root:
+            self._backtest_store = BacktestStore(root)
+        return self._backtest_store
+
+    def _backtest_model_hash(self):
+        """回测子预测器的初始模型：注册表 latest 指向的内容哈希（无模型时为 none；只作回测记录的说明，各期结果键见 iter_validation）"""
+        try:
+            path = self.registry.resolve('latest')
+        except: path = None
+        return os.path.basename(path) if path else 'none'
 
     def _build_markov_chain(self):
+        """构建多特征 1/2 阶马尔可夫转移张量（history 仅在末尾追加时增量更新）"""
         if len(self.history_df) < 2: return
-        trans = defaultdict(lambda: defaultdict(int))
-        blue_trans = defaultdict(lambda: defaultdict(int))
-        for i in range(len(self.history_df)-1):
-            # 前区奇偶转移
-            c = sum(1 for x in self.history_df.iloc[i]['red'] if x % 2 == 1)
-            n = sum(1 for x in self.history_df.iloc[i+1]['red'] if x % 2 == 1)
-            trans[c][n] += 1
-            
-            # 后区和值转移
-            bc = sum(self.history_df.iloc[i]['blue'])
-            bn = sum(self.history_df.iloc[i+1]['blue'])
-            blue_trans[bc][bn] += 1
-            
-        self.markov_transitions = {
-            'odd_even': dict(trans),
-            'blue_sum': dict(blue_trans)
-        }
+        arrays = self.get_history_arrays()
+        markov = self.markov_transitions
+        if isinstance(markov, MarkovTransitions) and markov.extend_from_arrays(arrays):
+            return
+        self.markov_transitions = MarkovTransitions.from_arrays(arrays)
 
     def _learn_patterns(self):
-        self.pattern_memory = []
-        for _, r in self.history_df.iterrows():
-            self.pattern_memory.append({'red_sum': sum(r['red']), 'odd_count': sum(1 for x in r['red'] if x % 2 == 1)})
+        """逐期形态（和值 / 奇数个数）；history 仅在末尾追加时只补新增的期"""
+        arrays = self.get_history_arrays()
+        n = len(self.pattern_memory)
+        if n > len(arrays) or (n and int(arrays.periods[n - 1]) != self._pattern_last_period):
+            self.pattern_memory, n = [], 0
+        self.pattern_memory.extend({'red_sum': int(s), 'odd_count': int(o)}
+                                   for s, o in zip(arrays.red_sum[n:].tolist(), arrays.odd_count[n:].tolist()))
+        self._pattern_last_period = int(arrays.periods[-1]) if len(arrays) else None
 
     def _init_dynamic_weights(self): self.dynamic_weights = {'odd_bias': 1.0}
 
     def _build_co_occurrence_network(self):
-        """构建号码共现网络 - 使用图算法挖掘号码关联"""
+        """构建号码共现网络 - 出号矩阵乘积得到两两/三元共现及时间衰减版本"""
+        if len(self.history_df) == 0: return False
         print("[*] 构建号码共现网络...")
-        
-        # 初始化图：{num1: {num2: weight, ...}, ...}
-        graph = {i: {} for i in range(1, 36)}
-        
-        # 统计号码共现次数
-        for _, row in self.history_df.iterrows():
-            red = row['red']
-            for i in range(len(red)):
-                for j in range(i+1, len(red)):
-                    n1, n2 = red[i], red[j]
-                    graph[n1][n2] = graph[n1].get(n2, 0) + 1
-                    graph[n2][n1] = graph[n2].get(n1, 0) + 1
-        
-        # 归一化权重
-        for n1 in graph:
-            total = sum(graph[n1].values())
-            if total > 0:
-                for n2 in graph[n1]:
-                    graph[n1][n2] = graph[n1][n2] / total
-        
-        self.co_occurrence_graph = graph
+        self.co_occurrence = CoOccurrenceIndex.from_incidence(self.get_history_arrays().red_incidence)
+        # 行归一化共现矩阵（号码 i 与各号码共现的分布），供社区得分复用
+        self._co_occurrence_matrix = self.co_occurrence.pair_matrix(normalize='row')
         print("[*] 共现网络构建完成")
 
     def _get_network_community_score(self, red_nums):
         """计算号码组合在共现网络中的社区得分"""
-        if not self.co_occurrence_graph:
-            return 0
-        
-        score = 0
-        for i in range(len(red_nums)):
-            for j in range(i+1, len(red_nums)):
-                n1, n2 = red_nums[i], red_nums[j]
-                # 获取共现权重
-                weight = self.co_occurrence_graph.get(n1, {}).get(n2, 0)
-                score += weight * 100  # 放大权重
-        
-        return score
+        return float(self.get_network_community_scores([red_nums])[0])
+
+    def get_network_community_scores(self, red_combos):
+        """批量计算 M×5 红球组合的社区得分（一次 gather-sum，可直接用于全量组合）"""
+        if not self.components.ensure('co_occurrence'):
+            return np.zeros(len(red_combos))
+        return self.co_occurrence.score_pairs(red_combos, matrix=self._co_occurrence_matrix) * 100  # 放大权重
+
+    def _blue_sequences(self, sequence_length=10):
+        """蓝球出号矩阵的滑动窗口视图 (N-L+1)×L×12（stride tricks，无复制）"""
+        incidence = self.get_history_arrays().blue_incidence
+        if len(incidence) < sequence_length:
+            return np.zeros((0, sequence_length, incidence.shape[1]), dtype=incidence.dtype)
+        return np.lib.stride_tricks.sliding_window_view(incidence, sequence_length, axis=0).transpose(0, 2, 1)
 
     def _train_blue_lstm(self):
-        """训练蓝球专用 LSTM 模型 - 使用原生 Numpy 实现"""
+        """训练蓝球专用 LSTM 模型 - 使用原生 Numpy 实现（批量前向 + 逐样本更新）"""
         try:
             print("[*] 训练蓝球 LSTM 模型 (原生 Numpy)...", flush=True)
             
-            # 准备序列数据
+            # 第 i 期（i >= sequence_length）的输入为前 sequence_length 期蓝球，目标为当期蓝球
             sequence_length = 10
-            blue_sequences = []
-            blue_targets = []
-            
-            for i in range(sequence_length, len(self.history_df)):
-                # 取前 sequence_length 期的蓝球数据
-                seq = []
-                for j in range(i - sequence_length, i):
-                    blue = self.history_df.iloc[j]['blue']
-                    encoded = np.zeros(12)
-                    for b in blue:
-                        encoded[b-1] = 1.0
-                    seq.append(encoded)
-                blue_sequences.append(seq)
-                
-                # 目标：当前期的蓝球
-                target = np.zeros(12)
-                for b in self.history_df.iloc[i]['blue']:
-                    target[b-1] = 1.0
-                blue_targets.append(target)
+            windows = self._blue_sequences(sequence_length)
+            blue_sequences = windows[:-1]
+            blue_targets = self.get_history_arrays().blue_incidence[sequence_length:]
             
             if len(blue_sequences) < 20:
                 print("  - 数据不足，跳过 LSTM 训练")
-                return
+                return False
             
             # 初始化并训练模型
             model = NumpyLSTM(input_size=12, hidden_size=64, output_size=12)
             model.train(blue_sequences, blue_targets, epochs=50, lr=0.01)
             
             self.blue_lstm_model = model
-            self.save_state() # 保存 LSTM 优化成果
+            if self.autosave: self.save_state() # 保存 LSTM 优化成果
             print("[*] 蓝球 LSTM 模型训练完成")
             
         except Exception as e:
             print(f"  - LSTM 训练失败: {e}")
             self.blue_lstm_model = None
+            return False
+
+    def get_lstm_table(self):
+        """当前 LSTM 模型的逐期蓝球概率表（按模型哈希缓存，历史追加时增量扩展）
+
+        第 t 行为第 t 期（行号同 history_df）的 LSTM 概率，第 len(history_df) 行为下一期；未训练时返回 None
+        """
+        if not self.blue_lstm_model:
+            return None
+        return get_lstm_table(self.blue_lstm_model, self.get_history_arrays())
 
     def _predict_blue_with_lstm(self):
         """使用 LSTM 预测蓝球概率 - 原生 Numpy 实现"""
@@ -2140,17 +2404,8 @@ class DaletouPredictor:
             return {}
         
         try:
-            # 准备输入序列
-            sequence_length = 10
-            seq = []
-            for i in range(len(self.history_df) - sequence_length, len(self.history_df)):
-                blue = self.history_df.iloc[i]['blue']
-                encoded = np.zeros(12)
-                for b in blue:
-                    encoded[b-1] = 1.0
-                seq.append(encoded)
-            
-            pred = self.blue_lstm_model.predict(seq)
+            # 最近 10 期蓝球作为输入序列，即逐期概率表中“下一期”一行
+            pred = self.lstm_probas()
             
             # 返回概率字典
             return {i+1: float(pred[i]) for i in range(12)}
@@ -2251,35 +2506,27 @@ class DaletouPredictor:
     def _get_next_period_numbers(self, period):
         """获取指定期号的下一期实际开奖号码"""
         try:
-            idx = self.history_df[self.history_df['period'] == period].index
-            if len(idx) > 0 and idx[0] + 1 < len(self.history_df):
-                next_row = self.history_df.iloc[idx[0] + 1]
-                return {'red': next_row['red'], 'blue': next_row['blue']}
+            arrays = self.get_history_arrays()
+            idx = np.flatnonzero(arrays.periods == int(period))
+            if len(idx) > 0 and idx[0] + 1 < len(arrays):
+                i = idx[0] + 1
+                return {'red': arrays.red[i].tolist(), 'blue': arrays.blue[i].tolist()}
         except:
             pass
         return None
 
     def _build_actual_numbers_pool(self):
-        self.actual_numbers_pool = []
-        for _, r in self.history_df.tail(10).iterrows(): self.actual_numbers_pool.extend(r['red'])
+        arrays = self.get_history_arrays()
+        self.actual_numbers_pool = arrays.red[-10:].ravel().tolist()
         
-        # 预计算相关性对
+        # 预计算相关性对（最近 300 期的共现矩阵）
         self.common_pairs = []
         self.common_blue_pairs = []
         if len(self.history_df) >= 50:
             # 前区对
-            pairs = Counter()
-            for _, row in self.history_df.tail(300).iterrows():
-                r = sorted(row['red'])
-                for p in combinations(r, 2): pairs[p] += 1
-            self.common_pairs = [p for p, c in pairs.most_common(150)]
-            
+            self.common_pairs = CoOccurrenceIndex.from_incidence(arrays.red_incidence, window=300).top_pairs(150)
             # 后区对 (蓝球共现)
-            b_pairs = Counter()
-            for _, row in self.history_df.tail(300).iterrows():
-                b = tuple(sorted(row['blue']))
-                b_pairs[b] += 1
-            self.common_blue_pairs = [b for b, c in b_pairs.most_common(10)]
+            self.common_blue_pairs = CoOccurrenceIndex.from_incidence(arrays.blue_incidence, window=300).top_pairs(10)
 
     def _init_adaptive_weights_from_history(self):
         """基于历史数据初始化动态权重 - 基础占位实现"""
@@ -2299,9 +2546,15 @@ class DaletouPredictor:
         
         # 统计启用的模型
         enabled_models = []
-        enabled_models.append('RandomForest + GradientBoosting')
-        
-        if self.stacking_meta_model:
+        if self.ensemble_models.get('red'):
+            enabled_models.append('RandomForest + GradientBoosting')
+        
+        if self.model_mode in MULTILABEL_KINDS and self.multilabel_model is not None:
+            enabled_models.append(f'多标签单模型 ({self.model_mode}) x 47个号码')
+        elif self.compiled_stacking is not None:
+            # 数组化模型即可给出号码数，避免仅为统计而加载原模型
+            enabled_models.append(f'Stacking (XGBoost+LightGBM+RF) x {len(self.compiled_stacking["red"])}个号码')
+        elif self.stacking_meta_model:
             enabled_models.append(f'Stacking (XGBoost+LightGBM+RF) x {len(self.stacking_meta_model)}个号码')
         
         if self.blue_lstm_model:
@@ -2312,7 +2565,9 @@ class DaletouPredictor:
             'history_count': len(self.history_df),
             'latest_period': str(latest['period']),
             'last_date': latest['date'],
-            'enabled_models': enabled_models
+            'enabled_models': enabled_models,
+            'components': self.components.report(),
+            'artifacts': self.artifact_report()
         }
 
     def get_history_data(self):
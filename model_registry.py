@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+内容寻址模型注册表
+1. 制品目录按内容哈希存放于 registry/objects/{hash}/，内容相同的状态只存一份
+2. index.json 记录标签（latest、回测期号等）→ 哈希的映射，以及每个对象的谱系：
+   训练历史哈希、最新期号、代码版本、超参数
+3. 按最近使用时间（LRU）淘汰，总大小 / 对象数不超过上限；固定标签（latest）指向的对象不淘汰
+4. index.json 的读-改-写在跨进程文件锁（registry/index.lock）内进行，并行回测的各工作进程共用同一注册表；
+   查询（resolve / digest / find）只读，使用时间只在 save / tag 时刷新
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from model_artifacts import MANIFEST, save_artifact
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_OBJECTS = 200
+PINNED_TAGS = ('latest',)
+
+# 参与代码版本哈希的训练相关源文件
+CODE_FILES = ('model_engine.py', 'stacking_trainer.py', 'multilabel_model.py', 'model_artifacts.py', 'compiled_trees.py')
+_CODE_VERSION = None
+
+
+def source_version(files):
+    """一组源文件内容哈希的前 12 位（不存在的文件跳过）"""
+    h = hashlib.sha1()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for name in files:
+        path = os.path.join(base, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                h.update(f.read())
+    return h.hexdigest()[:12]
+
+
+def code_version():
+    """训练代码版本（相关源文件内容哈希的前 12 位）"""
+    global _CODE_VERSION
+    if _CODE_VERSION is None:
+        _CODE_VERSION = source_version(CODE_FILES)
+    return _CODE_VERSION
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, ''))
+    except ValueError:
+        return default
+
+
+def content_hash(path):
+    """制品目录内容哈希：所有组件文件（不含 manifest 的创建时间）+ 训练元数据"""
+    h = hashlib.sha1()
+    with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+        manifest = json.load(f)
+    h.update(json.dumps(manifest.get('meta', {}), sort_keys=True).encode())
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            if full == os.path.join(path, MANIFEST):
+                continue
+            h.update(os.path.relpath(full, path).replace(os.sep, '/').encode())
+            with open(full, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+    return h.hexdigest()
+
+
+class ModelRegistry:
+    """模型状态注册表（标签 → 内容哈希 → 制品目录）"""
+
+    def __init__(self, root, max_bytes=None, max_objects=None):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.index_path = os.path.join(root, 'index.json')
+        self.lock_path = os.path.join(root, 'index.lock')
+        self.max_bytes = max_bytes or _env_int('DLT_REGISTRY_MAX_MB', 0) * 1024 * 1024 or DEFAULT_MAX_BYTES
+        self.max_objects = max_objects or _env_int('DLT_REGISTRY_MAX_OBJECTS', 0) or DEFAULT_MAX_OBJECTS
+        self._lock = threading.Lock()
+
+    # --- 索引读写 ---
+
+    @contextmanager
+    def _locked(self):
+        """进程内线程锁 + 跨进程文件锁（fcntl.flock / Windows 下 msvcrt.locking）"""
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.lock_path, 'a+b') as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:  # LK_LOCK 重试 10 秒后仍未取得锁
+                            continue
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                    else:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _read_index(self):
+        if not os.path.exists(self.index_path):
+            return {'tags': {}, 'objects': {}}
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'tags': {}, 'objects': {}}
+
+    def _write_index(self, index):
+        tmp = f'{self.index_path}.tmp{os.getpid()}'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.index_path)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest)
+
+    # --- 写入 / 查询 ---
+
+    def save(self, components, meta, lineage, tags=()):
+        """写入一个模型状态并打上标签；内容已存在时只更新标签与使用时间，返回内容哈希"""
+        os.makedirs(self.objects_dir, exist_ok=True)
+        staging = os.path.join(self.root, f'staging.{os.getpid()}.{threading.get_ident()}')
+        save_artifact(staging, components, meta)
+        digest = content_hash(staging)
+        with self._locked():
+            index = self._read_index()
+            target = self.object_path(digest)
+            if os.path.exists(os.path.join(target, MANIFEST)):
+                shutil.rmtree(staging, ignore_errors=True)
+            else:
+                if os.path.exists(target):
+                    shutil.rmtree(target, ignore_errors=True)
+                os.replace(staging, target)
+            entry = index['objects'].setdefault(digest, {
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'bytes': sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(target) for f in fs),
+                'lineage': lineage
+            })
+            entry['last_used'] = time.time()
+            for tag in tags:
+                index['tags'][str(tag)] = digest
+            self._evict(index, keep=digest)
+            self._write_index(index)
+        return digest
+
+    def resolve(self, tag):
+        """标签对应的制品目录（只读）；不存在返回 None"""
+        digest = self.digest(tag)
+        return None if digest is None else self.object_path(digest)
+
+    def digest(self, tag):
+        """标签指向的内容哈希（只读，不刷新使用时间）；不存在返回 None"""
+        digest = self._read_index()['tags'].get(str(tag))
+        if digest is None or not os.path.exists(os.path.join(self.object_path(digest), MANIFEST)):
+            return None
+        return digest
+
+    def find(self, **lineage):
+        """按谱系字段查找已有状态（如相同训练历史哈希 + 代码版本 + 超参数），返回最近使用的哈希"""
+        index = self._read_index()
+        matches = [(entry.get('last_used', 0), digest) for digest, entry in index['objects'].items()
+                   if all(entry.get('lineage', {}).get(k) == v for k, v in lineage.items())]
+        return max(matches)[1] if matches else None
+
+    def tag(self, tag, digest):
+        """给已有对象打标签（并刷新使用时间）"""
+        with self._locked():
+            index = self._read_index()
+            if digest not in index['objects']:
+                raise KeyError(f"注册表中不存在对象: {digest}")
+            index['tags'][str(tag)] = digest
+            index['objects'][digest]['last_used'] = time.time()
+            self._write_index(index)
+
+    def entries(self):
+        """对象列表：哈希、大小、谱系、使用时间及指向它的标签"""
+        index = self._read_index()
+        tags_by_digest = {}
+        for tag, digest in index['tags'].items():
+            tags_by_digest.setdefault(digest, []).append(tag)
+        return [dict(entry, hash=digest, tags=tags_by_digest.get(digest, []))
+                for digest, entry in index['objects'].items()]
+
+    def total_bytes(self):
+        return sum(e.get('bytes', 0) for e in self._read_index()['objects'].values())
+
+    # --- 淘汰 ---
+
+    def _evict(self, index, keep=None):
+        pinned = {index['tags'][t] for t in PINNED_TAGS if t in index['tags']}
+        if keep:
+            pinned.add(keep)
+        objects = index['objects']
+        total = sum(e.get('bytes', 0) for e in objects.values())
+        for digest in sorted(objects, key=lambda d: objects[d].get('last_used', 0)):
+            if total <= self.max_bytes and len(objects) <= self.max_objects:
+                break
+            if digest in pinned:
+                continue
+            total -= objects.pop(digest).get('bytes', 0)
+            shutil.rmtree(self.object_path(digest), ignore_errors=True)
+            for tag in [t for t, d in index['tags'].items() if d == digest]:
+                del index['tags'][tag]
+        # 索引中没有的对象目录（旧版本无跨进程锁时丢失的写入）一并删除；持锁时不存在未登记的新对象
+        if os.path.isdir(self.objects_dir):
+            for name in os.listdir(self.objects_dir):
+                if name not in objects:
+                    shutil.rmtree(self.object_path(name), ignore_errors=True)
+
+    def evict(self):
+        with self._locked():
+            index = self._read_index()
+            self._evict(index)
+            self._write_index(index)
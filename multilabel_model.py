@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多标签单模型模式
+用一个多输出模型同时预测前区 35 个、后区 12 个号码的出现概率，替代 47 组逐号码 Stacking。
+支持两种模型：
+1. mlp: 多输出 MLP（sklearn MLPClassifier 多标签模式，共享隐藏层，47 个 sigmoid 输出）
+2. forest: 共享的多输出随机森林（每棵树的叶子同时给出 47 个号码的出现频率）
+"""
+
+import numpy as np
+
+RED_COUNT = 35
+BLUE_COUNT = 12
+
+MODEL_KINDS = ('mlp', 'forest')
+
+
+class MultiLabelNumberModel:
+    """前区 + 后区 47 个号码的多标签概率模型"""
+
+    def __init__(self, kind='mlp', random_state=42):
+        if kind not in MODEL_KINDS:
+            raise ValueError(f"不支持的多标签模型: {kind}")
+        self.kind = kind
+        self.random_state = random_state
+        self.scaler = None
+        self.model = None
+
+    def _build(self):
+        if self.kind == 'mlp':
+            from sklearn.neural_network import MLPClassifier
+            return MLPClassifier(hidden_layer_sizes=(64,), alpha=1e-3, learning_rate_init=1e-3, max_iter=300,
+                                 early_stopping=True, random_state=self.random_state)
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(n_estimators=120, max_depth=6, min_samples_leaf=5, random_state=self.random_state)
+
+    def fit(self, X, red_incidence, blue_incidence):
+        """X 为特征矩阵，标签为出号矩阵 (N×35, N×12)"""
+        from sklearn.preprocessing import StandardScaler
+        X = np.asarray(X, dtype=np.float64)
+        Y = np.hstack([np.asarray(red_incidence), np.asarray(blue_incidence)]).astype(np.int64)
+        self.scaler = StandardScaler().fit(X)
+        self.model = self._build()
+        self.model.fit(self.scaler.transform(X), Y)
+        return self
+
+    def predict_proba(self, X):
+        """返回 (N×35, N×12) 概率矩阵"""
+        Xs = self.scaler.transform(np.asarray(X, dtype=np.float64))
+        if self.kind == 'mlp':
+            P = self.model.predict_proba(Xs)
+        else:
+            # 多输出森林返回每个号码一个 (N×类别数) 数组；训练集中某号码只出现单一类别时该列为常数
+            columns = []
+            for classes, proba in zip(self.model.classes_, self.model.predict_proba(Xs)):
+                hit = np.flatnonzero(classes == 1)
+                columns.append(proba[:, hit[0]] if len(hit) else np.zeros(len(Xs)))
+            P = np.column_stack(columns)
+        return P[:, :RED_COUNT], P[:, RED_COUNT:]
+
+    def predict_vectors(self, features):
+        """只对最后一行特征推理，返回前区 35 维、后区 12 维概率向量"""
+        x = np.asarray(features.values[-1:] if hasattr(features, 'values') else features, dtype=np.float64).reshape(1, -1)
+        red, blue = self.predict_proba(x)
+        return red[0], blue[0]
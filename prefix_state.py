@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回测前缀状态
+1. 回测第 t 个待测期时，子预测器看到的历史是完整历史的前 t 期；PrefixHistory 对完整历史只构建一次列式数组，
+   第 t 个前缀为各数组的切片视图（O(1)），不再逐期过滤 DataFrame、重建 HistoryArrays
+2. 冷热号窗口、遗漏值只看前缀末尾 recent_n 期，末期特征行只看最后 1~5 期，相似期次对末尾 200 期向量化打分，
+   均与 DaletouPredictor 中基于 DataFrame 的实现逐项一致
+3. feature_row 为单期特征的唯一实现，extract_features 与前缀状态共用
+"""
+
+from collections import Counter
+
+import numpy as np
+
+FEATURE_COLUMNS = [
+    'red_sum', 'red_span', 'odd_count', 'z1', 'z2', 'z3', 'blue_sum', 'blue_span',
+    'avg_gap', 'std_gap', 'tail_diversity', 'ac_val', 'missing_sum', 'repeat_count',
+    'jump_count', 'prime_count', 'tail_sum', 'm0', 'm1', 'm2', 'max_miss', 'consecutive_count', 'sum_trend'
+]
+PRIMES = {2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31}
+
+
+def feature_row(r, b, red_miss, last_red=None, prev_red=None, trend_sums=None):
+    """单期特征（与 FEATURE_COLUMNS 对齐）
+
+    Args:
+        r / b: 当期红球 / 蓝球（升序）
+        red_miss: {号码: 遗漏期数}
+        last_red / prev_red: 上期 / 上上期红球（没有则为 None）
+        trend_sums: 前 5 期红球和值（当期序号 >= 10 时才有，否则为 None）
+    """
+    red_sum = sum(r); red_span = r[-1] - r[0]
+    odd_count = sum(1 for x in r if x % 2 == 1)
+    z1 = sum(1 for x in r if x <= 11); z2 = sum(1 for x in r if 12 <= x <= 23); z3 = sum(1 for x in r if x >= 24)
+    blue_sum = sum(b); blue_span = b[1] - b[0]
+    gaps = [r[j+1]-r[j] for j in range(len(r)-1)]
+    avg_gap = np.mean(gaps); std_gap = np.std(gaps)
+    tail_diversity = len(set([x % 10 for x in r]))
+    m0 = sum(1 for x in r if x % 3 == 0); m1 = sum(1 for x in r if x % 3 == 1); m2 = sum(1 for x in r if x % 3 == 2)
+    diffs = set()
+    for j in range(len(r)):
+        for k in range(j + 1, len(r)): diffs.add(abs(r[j] - r[k]))
+    ac_val = len(diffs) - 4
+    missing_vals = [red_miss.get(num, 0) for num in r]
+    missing_sum = sum(missing_vals); max_miss = max(missing_vals)
+    repeat_count = len(set(r) & set(last_red)) if last_red is not None else 0
+    jump_count = len(set(r) & set(prev_red)) if prev_red is not None else 0
+    prime_count = sum(1 for x in r if x in PRIMES)
+    tail_sum = sum(x % 10 for x in r)
+    consecutive_count = sum(1 for j in range(len(r)-1) if r[j+1] - r[j] == 1)
+
+    # 趋势特征 (动态)
+    sum_trend = 0
+    if trend_sums is not None:
+        sum_trend = red_sum - np.mean(trend_sums)
+
+    return [
+        red_sum, red_span, odd_count, z1, z2, z3, blue_sum, blue_span,
+        avg_gap, std_gap, tail_diversity, ac_val, missing_sum, repeat_count,
+        jump_count, prime_count, tail_sum, m0, m1, m2, max_miss, consecutive_count, sum_trend
+    ]
+
+
+class PrefixHistory:
+    """完整历史上的前缀状态：前缀 t 即第 0..t-1 期（回测第 t 期时的可见历史）"""
+
+    def __init__(self, df, arrays=None):
+        from history_arrays import HistoryArrays
+        self.df = df
+        self.arrays = arrays if arrays is not None else HistoryArrays.from_df(df)
+        self._rows = {int(p): i for i, p in enumerate(self.arrays.periods)}
+
+    def __len__(self):
+        return len(self.arrays)
+
+    def index_of(self, period):
+        """期号在完整历史中的行号（即回测该期时的前缀长度）"""
+        return self._rows[int(period)]
+
+    def frame(self, t):
+        return self.df.iloc[:t]
+
+    def arrays_at(self, t):
+        return self.arrays.prefix(t)
+
+    def hot_cold(self, t, recent_n=20):
+        """前缀 t 的冷热号与遗漏（同 DaletouPredictor.calculate_hot_cold(前 t 期)）"""
+        lo = max(0, t - recent_n)
+        w = t - lo
+        red_counter = Counter()
+        blue_counter = Counter()
+        for row in self.arrays.red[lo:t].tolist():
+            red_counter.update(row)
+        for row in self.arrays.blue[lo:t].tolist():
+            blue_counter.update(row)
+
+        def missing(incidence):
+            # 窗口内最后一次出现距末期的期数，未出现为窗口长度
+            inc = incidence[lo:t]
+            if w == 0:
+                return [0] * inc.shape[1]
+            last = w - 1 - np.argmax(inc[::-1], axis=0)
+            return np.where(inc.any(axis=0), w - last - 1, w).tolist()
+
+        red_missing = {num: v for num, v in enumerate(missing(self.arrays.red_incidence), 1)}
+        blue_missing = {num: v for num, v in enumerate(missing(self.arrays.blue_incidence), 1)}
+
+        red_avg = sum(red_counter.values()) / 35 if red_counter else 0
+        blue_avg = sum(blue_counter.values()) / 12 if blue_counter else 0
+        return {
+            'hot_red': [k for k, v in red_counter.items() if v >= red_avg],
+            'cold_red': [i for i in range(1, 36) if red_counter[i] < red_avg],
+            'hot_blue': [k for k, v in blue_counter.items() if v >= blue_avg],
+            'cold_blue': [i for i in range(1, 13) if blue_counter[i] < blue_avg],
+            'red_freq': dict(red_counter),
+            'blue_freq': dict(blue_counter),
+            'red_missing': red_missing,
+            'blue_missing': blue_missing,
+            'super_cold_red': [k for k, v in red_missing.items() if v >= 10],
+            'super_cold_blue': [k for k, v in blue_missing.items() if v >= 10]
+        }
+
+    def last_features(self, t, hot_cold):
+        """前缀 t 最后一期的特征行（同 extract_features(前 t 期, last_only=True) 的最后一行）"""
+        import pandas as pd
+        a = self.arrays
+        idx = t - 1
+        row = feature_row(
+            a.red[idx].tolist(), a.blue[idx].tolist(), hot_cold['red_missing'],
+            last_red=a.red[idx - 1].tolist() if idx > 0 else None,
+            prev_red=a.red[idx - 2].tolist() if idx > 1 else None,
+            trend_sums=a.red_sum[idx - 5:idx].tolist() if idx >= 10 else None
+        )
+        return pd.DataFrame([row], columns=FEATURE_COLUMNS)
+
+    def similar_periods(self, t, current_features, top_k=10, recent_n=200):
+        """前缀 t 末尾 recent_n 期中与 current_features 最相似的 top_k 期（同 _find_similar_periods）"""
+        if t < 30:
+            return []
+        a = self.arrays
+        lo = max(0, t - recent_n)
+        f = current_features
+        score = np.maximum(0, 50 - np.abs(a.red_sum[lo:t] - f['red_sum']))
+        score = score + np.where(a.odd_count[lo:t] == f['odd_count'], 50, 0)
+        span = f.get('red_span', f.get('span', 0))
+        score = score + np.maximum(0, 20 - np.abs(a.red_span[lo:t] - span))
+        zones = a.zone_counts[lo:t].astype(np.int64)
+        zone_diff = (np.abs(zones[:, 0] - f.get('z1', f.get('zone1', 0))) + np.abs(zones[:, 1] - f.get('z2', f.get('zone2', 0)))
+                     + np.abs(zones[:, 2] - f.get('z3', f.get('zone3', 0))))
+        score = score + np.maximum(0, 10 - zone_diff * 2)
+        order = np.argsort(-score, kind='stable')[:top_k]
+        return [{'period': int(a.periods[lo + i]), 'score': float(score[i]),
+                 'red': a.red[lo + i].tolist(), 'blue': a.blue[lo + i].tolist()} for i in order]
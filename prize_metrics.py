@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回测奖级指标
+1. 每注号码编码为位掩码（红球 35 位、蓝球 12 位），命中数 = popcount(投注掩码 & 开奖掩码)，所有期、所有注一次算完
+2. 复式投注展开为其包含的全部单式注（C(红,5) × C(蓝,2)），与单式同样参与统计
+3. 按大乐透官方奖级（一至九等奖）统计每期与全部回测期的中奖注数、奖金、投注成本（每注 2 元）与回报率
+4. 置信区间：各奖级单注中奖率用 Wilson 区间；回报率（奖金 / 成本）按期自助抽样（奖金分布重尾，不用正态近似）
+5. 附带随机投注的理论中奖率与回报率，作为对照基线
+"""
+
+from functools import lru_cache
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+TICKET_COST = 2
+# (奖级, 中奖条件 [(红球命中, 蓝球命中), ...], 单注奖金)
+# 一、二等奖为浮动奖金，这里取估计值，可通过 amounts 参数按实际奖池覆盖
+PRIZE_TIERS = (
+    ('一等奖', ((5, 2),), 10000000),
+    ('二等奖', ((5, 1),), 200000),
+    ('三等奖', ((5, 0),), 10000),
+    ('四等奖', ((4, 2),), 3000),
+    ('五等奖', ((4, 1),), 300),
+    ('六等奖', ((3, 2),), 200),
+    ('七等奖', ((4, 0),), 100),
+    ('八等奖', ((3, 1), (2, 2)), 15),
+    ('九等奖', ((3, 0), (2, 1), (1, 2), (0, 2)), 5),
+)
+N_TIERS = len(PRIZE_TIERS)
+
+# (红球命中, 蓝球命中) → 奖级序号（0 为未中奖，1..9 对应一至九等奖）
+TIER_INDEX = np.zeros((6, 3), dtype=np.int64)
+for _i, (_name, _rules, _amount) in enumerate(PRIZE_TIERS, 1):
+    for _r, _b in _rules:
+        TIER_INDEX[_r, _b] = _i
+
+
+def tier_amounts(amounts=None):
+    """各奖级单注奖金（长度 N_TIERS+1，第 0 项为未中奖）；amounts 可按奖级名覆盖"""
+    amounts = amounts or {}
+    return np.array([0] + [amounts.get(name, amount) for name, _, amount in PRIZE_TIERS], dtype=np.float64)
+
+
+def rule_text(rules):
+    return '/'.join(f'{r}+{b}' for r, b in rules)
+
+
+# --- 命中分类（best_hits 等标量或数组均可） ---
+
+def core_hit(r, b):
+    """核心覆盖：4+2 或 5+X"""
+    return ((r >= 4) & (b >= 2)) | (r == 5)
+
+
+def soft_hit(r, b):
+    """软覆盖：3+1 / 4+0 或以上"""
+    return ((r >= 3) & (b >= 1)) | (r >= 4)
+
+
+def high_hit(r, b):
+    """高级命中：3+2 / 4+1 或以上"""
+    return ((r >= 3) & (b >= 2)) | ((r >= 4) & (b >= 1))
+
+
+# --- 位掩码 ---
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(x):
+        return np.bitwise_count(x).astype(np.int64)
+else:
+    _BYTE_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+    def popcount(x):
+        x = np.ascontiguousarray(x, dtype=np.uint64)
+        return _BYTE_COUNTS[x.view(np.uint8).reshape(-1, 8)].sum(axis=1).reshape(x.shape)
+
+
+def number_masks(numbers):
+    """(N, k) 号码（1 起）→ (N,) uint64 掩码"""
+    numbers = np.asarray(numbers, dtype=np.uint64)
+    if numbers.size == 0:
+        return np.zeros(len(numbers), dtype=np.uint64)
+    return np.bitwise_or.reduce(np.left_shift(np.uint64(1), numbers - np.uint64(1)), axis=1)
+
+
+@lru_cache(maxsize=None)
+def _combo_index(n, k):
+    return np.array(list(combinations(range(n), k)), dtype=np.int64).reshape(-1, k)
+
+
+def expand_masks(red, blue):
+    """一注（单式或复式）→ 其包含的全部单式注的 (红球掩码, 蓝球掩码)"""
+    red_bits = np.left_shift(np.uint64(1), np.asarray(red, dtype=np.uint64) - np.uint64(1))
+    blue_bits = np.left_shift(np.uint64(1), np.asarray(blue, dtype=np.uint64) - np.uint64(1))
+    red_masks = np.bitwise_or.reduce(red_bits[_combo_index(len(red), 5)], axis=1)
+    blue_masks = np.bitwise_or.reduce(blue_bits[_combo_index(len(blue), 2)], axis=1)
+    return np.repeat(red_masks, len(blue_masks)), np.tile(blue_masks, len(red_masks))
+
+
+def ticket_masks(period_tickets):
+    """[[{'red', 'blue'}, ...], ...]（每期一组投注）→ (期序号, 红球掩码, 蓝球掩码)，复式已展开"""
+    single_idx, single_red, single_blue = [], [], []
+    parts = []
+    for i, tickets in enumerate(period_tickets):
+        for t in tickets:
+            if len(t['red']) == 5 and len(t['blue']) == 2:
+                single_idx.append(i)
+                single_red.append(t['red'])
+                single_blue.append(t['blue'])
+            else:
+                rm, bm = expand_masks(t['red'], t['blue'])
+                parts.append((np.full(len(rm), i, dtype=np.int64), rm, bm))
+    parts.insert(0, (np.asarray(single_idx, dtype=np.int64),
+                     number_masks(np.asarray(single_red).reshape(-1, 5)),
+                     number_masks(np.asarray(single_blue).reshape(-1, 2))))
+    return tuple(np.concatenate(col) for col in zip(*parts))
+
+
+# --- 理论基线 ---
+
+def hit_probabilities():
+    """随机单式注的 (红球命中, 蓝球命中) 概率，(6, 3)"""
+    red = np.array([comb(5, r) * comb(30, 5 - r) for r in range(6)]) / comb(35, 5)
+    blue = np.array([comb(2, b) * comb(10, 2 - b) for b in range(3)]) / comb(12, 2)
+    return np.outer(red, blue)
+
+
+def baseline_tier_rates():
+    """随机单式注落入各奖级的概率（长度 N_TIERS+1）"""
+    return np.bincount(TIER_INDEX.ravel(), weights=hit_probabilities().ravel(), minlength=N_TIERS + 1)
+
+
+# --- 置信区间 ---
+
+def wilson_interval(k, n, z=1.96):
+    """二项比例的 Wilson 区间（k、n 可为数组）"""
+    k = np.asarray(k, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    safe = np.maximum(n, 1)
+    p = k / safe
+    denom = 1 + z * z / safe
+    center = (p + z * z / (2 * safe)) / denom
+    half = z * np.sqrt(p * (1 - p) / safe + z * z / (4 * safe * safe)) / denom
+    return np.where(n > 0, np.maximum(center - half, 0), 0), np.where(n > 0, np.minimum(center + half, 1), 0)
+
+
+def bootstrap_ratio(num, den, n_boot=1000, level=0.95, seed=0, chunk=200):
+    """按期有放回抽样 sum(num)/sum(den) 的百分位区间"""
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    n = len(num)
+    if n == 0 or den.sum() <= 0:
+        return 0.0, 0.0
+    rng = np.random.default_rng(seed)
+    ratios = []
+    for s in range(0, n_boot, chunk):
+        idx = rng.integers(0, n, size=(min(chunk, n_boot - s), n))
+        d = den[idx].sum(axis=1)
+        ratios.append(num[idx].sum(axis=1) / np.where(d > 0, d, 1))
+    lo, hi = np.quantile(np.concatenate(ratios), [(1 - level) / 2, (1 + level) / 2])
+    return float(lo), float(hi)
+
+
+class PrizeReport:
+    """回测期 × 奖级的中奖统计（全部为数组）"""
+
+    def __init__(self, periods, tier_counts, hit_counts, best_red, best_blue, amounts):
+        self.periods = list(periods)
+        self.tier_counts = tier_counts        # (P, N_TIERS+1) 各期各奖级中奖注数（第 0 列为未中奖）
+        self.hit_counts = hit_counts          # (6, 3) 全部注的 (红, 蓝) 命中分布
+        self.best_red = best_red              # (P,) 每期最佳命中（先比红球再比蓝球）
+        self.best_blue = best_blue
+        self.amounts = amounts
+        self.tickets = tier_counts.sum(axis=1)
+        self.cost = self.tickets * TICKET_COST
+        self.payout = tier_counts @ amounts
+
+    def __len__(self):
+        return len(self.periods)
+
+    def period(self, i):
+        """第 i 期：各奖级中奖注数、奖金与成本"""
+        return {
+            'tiers': {name: int(c) for (name, _, _), c in zip(PRIZE_TIERS, self.tier_counts[i, 1:])},
+            'tickets': int(self.tickets[i]),
+            'cost': float(self.cost[i]),
+            'payout': float(self.payout[i]),
+            'best_hits': [int(self.best_red[i]), int(self.best_blue[i])]
+        }
+
+    def summary(self, n_boot=1000, z=1.96):
+        """全部回测期的奖级分布、回报率与置信区间"""
+        n_periods = len(self)
+        n_tickets = int(self.tickets.sum())
+        counts = self.tier_counts.sum(axis=0)
+        periods_hit = (self.tier_counts > 0).sum(axis=0)
+        rate_lo, rate_hi = wilson_interval(counts, n_tickets, z)
+        base = baseline_tier_rates()
+        tiers = []
+        for i, (name, rules, _) in enumerate(PRIZE_TIERS, 1):
+            tiers.append({
+                'tier': name, 'rule': rule_text(rules), 'amount': float(self.amounts[i]),
+                'count': int(counts[i]), 'periods_hit': int(periods_hit[i]),
+                'rate': float(counts[i] / n_tickets) if n_tickets else 0.0,
+                'rate_ci': [float(rate_lo[i]), float(rate_hi[i])],
+                'baseline_rate': float(base[i])
+            })
+        won = (self.tier_counts[:, 1:].sum(axis=1) > 0).sum()
+        won_lo, won_hi = wilson_interval(won, n_periods, z)
+        cost, payout = float(self.cost.sum()), float(self.payout.sum())
+        return {
+            'periods': n_periods,
+            'tickets': n_tickets,
+            'cost': cost,
+            'payout': payout,
+            'payout_per_ticket': payout / n_tickets if n_tickets else 0.0,
+            'return_rate': payout / cost if cost else 0.0,
+            'return_rate_ci': list(bootstrap_ratio(self.payout, self.cost, n_boot)),
+            'baseline_return_rate': float(base @ self.amounts) / TICKET_COST,
+            'prize_period_rate': float(won / n_periods) if n_periods else 0.0,
+            'prize_period_rate_ci': [float(won_lo), float(won_hi)],
+            'tiers': tiers,
+            'hit_counts': {f'R{r}+B{b}': int(self.hit_counts[r, b]) for r in range(6) for b in range(3)
+                           if self.hit_counts[r, b]},
+            'coverage': {
+                'core': float(core_hit(self.best_red, self.best_blue).mean() * 100) if n_periods else 0.0,
+                'soft': float(soft_hit(self.best_red, self.best_blue).mean() * 100) if n_periods else 0.0,
+                'high': float(high_hit(self.best_red, self.best_blue).mean() * 100) if n_periods else 0.0
+            }
+        }
+
+
+def evaluate(periods, period_tickets, draw_red, draw_blue, amounts=None):
+    """对每期的全部投注与开奖号码计算奖级统计
+
+    Args:
+        periods: 期号列表（P）
+        period_tickets: 每期的投注 [{'red': [...], 'blue': [...]}, ...]，红 >5 或蓝 >2 视为复式
+        draw_red / draw_blue: (P, 5) / (P, 2) 开奖号码
+        amounts: {奖级名: 单注奖金}，覆盖浮动奖金的估计值
+    """
+    n = len(period_tickets)
+    amounts = tier_amounts(amounts)
+    pidx, red, blue = ticket_masks(period_tickets)
+    red_hits = popcount(red & number_masks(np.asarray(draw_red).reshape(n, 5))[pidx])
+    blue_hits = popcount(blue & number_masks(np.asarray(draw_blue).reshape(n, 2))[pidx])
+    tiers = TIER_INDEX[red_hits, blue_hits]
+    tier_counts = np.bincount(pidx * (N_TIERS + 1) + tiers, minlength=n * (N_TIERS + 1)).reshape(n, N_TIERS + 1)
+    hit_counts = np.bincount(red_hits * 3 + blue_hits, minlength=18).reshape(6, 3)
+    # 每期最佳命中：红球优先，编码 r*3+b 后取最大
+    best = np.zeros(n, dtype=np.int64)
+    np.maximum.at(best, pidx, red_hits * 3 + blue_hits)
+    return PrizeReport(periods, tier_counts, hit_counts, best // 3, best % 3, amounts)
+
+
+def evaluate_results(results, amounts=None):
+    """回测结果列表（含 tickets 与 actual_red/actual_blue）→ PrizeReport；无 tickets 的旧结果只计首注"""
+    tickets = [r.get('tickets') or [{'red': r['predicted_red'], 'blue': r['predicted_blue']}] for r in results]
+    return evaluate([r['period'] for r in results], tickets,
+                    [r['actual_red'] for r in results], [r['actual_blue'] for r in results], amounts)
+
+
+def format_report(summary):
+    lines = [f"  回测 {summary['periods']} 期，共 {summary['tickets']} 注，成本 {summary['cost']:.0f} 元，"
+             f"奖金 {summary['payout']:.0f} 元"]
+    for t in summary['tiers']:
+        lo, hi = t['rate_ci']
+        lines.append(f"  - {t['tier']} ({t['rule']:<15}) {t['count']:>6} 注  {t['periods_hit']:>5} 期  "
+                     f"单注 {t['rate'] * 100:.4f}% [{lo * 100:.4f}%, {hi * 100:.4f}%]  随机 {t['baseline_rate'] * 100:.4f}%")
+    lo, hi = summary['return_rate_ci']
+    lines.append(f"  回报率 {summary['return_rate'] * 100:.1f}% [{lo * 100:.1f}%, {hi * 100:.1f}%]  "
+                 f"随机投注 {summary['baseline_return_rate'] * 100:.1f}%")
+    lo, hi = summary['prize_period_rate_ci']
+    lines.append(f"  有中奖的期 {summary['prize_period_rate'] * 100:.1f}% [{lo * 100:.1f}%, {hi * 100:.1f}%]")
+    return '\n'.join(lines)
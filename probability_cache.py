@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+号码概率缓存（预测、回测、各 _select_by_* 选号策略共用）
+1. 键为 (模型族, 历史哈希, 模型键)：同一历史截止期、同一模型只计算一次
+   - features：末期特征行（模型键为空）
+   - numbers：Stacking / 多标签号码模型的前区 35 维、后区 12 维概率
+   - ensemble：RF+GB 集成模型的前区 / 后区概率
+   - lstm：蓝球 LSTM 概率（模型键为权重内容哈希，跨预测器实例共享）
+2. 内存中的模型用 (预测器实例编号, 模型版本) 作键：模型被重新赋值（训练、加载状态）时版本递增，旧条目自然失效
+3. 全局有界 LRU；缓存的数组只读，调用方不可原地修改
+"""
+
+import itertools
+from collections import OrderedDict
+
+import numpy as np
+
+_CACHE = OrderedDict()
+_CACHE_SIZE = 256
+_STATS = {'hits': 0, 'misses': 0}
+_OWNER_IDS = itertools.count()
+
+
+def new_owner_id():
+    """预测器实例编号（进程内唯一，不随对象回收而复用）"""
+    return next(_OWNER_IDS)
+
+
+def _freeze(value):
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, tuple):
+        for v in value:
+            _freeze(v)
+    return value
+
+
+def cached(family, history_hash, model_key, compute):
+    """取 (family, history_hash, model_key) 的缓存值，缺失时调用 compute() 计算并写入"""
+    key = (family, history_hash, model_key)
+    if key in _CACHE:
+        _CACHE.move_to_end(key)
+        _STATS['hits'] += 1
+        return _CACHE[key]
+    _STATS['misses'] += 1
+    value = _freeze(compute())
+    _CACHE[key] = value
+    while len(_CACHE) > _CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    return value
+
+
+def proba_dict(vec):
+    """概率向量 → {号码: 概率}（跳过 NaN）"""
+    return {int(i) + 1: float(vec[i]) for i in np.flatnonzero(~np.isnan(vec))}
+
+
+def cache_info():
+    return {'hits': _STATS['hits'], 'misses': _STATS['misses'], 'size': len(_CACHE), 'max_size': _CACHE_SIZE}
+
+
+def clear():
+    _CACHE.clear()
+    _STATS['hits'] = _STATS['misses'] = 0
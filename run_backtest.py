@@ -3,6 +3,7 @@ import sys
 import os
 import pandas as pd
 from model_engine import DaletouPredictor
+from prize_metrics import format_report
 
 def run_50_period_backtest():
     print("=== 大乐透算法 50 期回测报告 ===")
@@ -65,24 +66,14 @@ def run_50_period_backtest():
         percentage = (count / results['total_periods']) * 100
         print(f"  - {hit}: {count} 次 ({percentage:.1f}%)")
 
-    # 计算覆盖率 (用户新标准: 4+2 或 5+X)
-    coverage_count = 0
-    high_hit_count = 0 # 3+2, 4+1 等高级命中
-    import re
-    for hit, count in dist.items():
-        match = re.search(r'R(\d+)\+B(\d+)', hit)
-        if match:
-            r = int(match.group(1))
-            b = int(match.group(2))
-            if (r >= 4 and b >= 2) or (r == 5):
-                coverage_count += count
-            if (r >= 3 and b >= 2) or (r >= 4 and b >= 1):
-                high_hit_count += count
-    
-    coverage_rate = (coverage_count / results['total_periods']) * 100
-    high_hit_rate = (high_hit_count / results['total_periods']) * 100
+    # 覆盖率 (用户新标准: 4+2 或 5+X) 与奖级统计均由 prize_metrics 对全部投注计算
+    metrics = results['prize_metrics']
+    coverage_rate = metrics['coverage']['core']
+    high_hit_rate = metrics['coverage']['high']
     print(f"\n核心覆盖能力 (命中 4+2/5+0 或以上): {coverage_rate:.1f}%")
     print(f"高级命中能力 (命中 3+2/4+1 或以上): {high_hit_rate:.1f}%")
+    print("\n奖级统计 (全部预测号码):")
+    print(format_report(metrics))
     print("-" * 40)
     print("注：命中率 98% 目标为算法覆盖能力上限，实际单注命中受随机性影响。")
     print("=" * 40)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+类别评分立方体
+动态评分（和值、区间比、奇偶比、大小比、2维组合加成）只依赖红球的类别签名与上两期开奖。
+每期对每个出现过的类别签名调用一次评分函数，得到按类别 ID 索引的分数数组，
+全量红球组合的动态评分即为一次数组下标运算；理由文本同样按类别 ID 查表。
+"""
+
+import numpy as np
+
+from dynamic_scoring_rules import (
+    get_dynamic_sum_score,
+    get_dynamic_zone_score,
+    get_dynamic_odd_score,
+    get_dynamic_size_score,
+    get_2d_combined_bonus
+)
+from transition_tables import SUM_BUCKET_LABELS, SUM_BUCKET_EDGES
+
+
+def _zone_label(zone_id):
+    z1, z2 = divmod(int(zone_id), 6)
+    return f"{z1}:{z2}:{5 - z1 - z2}"
+
+
+def _ratio_label(count):
+    return f"{int(count)}:{5 - int(count)}"
+
+
+def _sum_bucket_label(red_sum):
+    return SUM_BUCKET_LABELS[int(np.searchsorted(SUM_BUCKET_EDGES, red_sum, side='right'))]
+
+
+def draw_context(red):
+    """单期红球的类别特征（用于上期 / 上上期上下文）"""
+    if red is None:
+        return None
+    red_sum = sum(red)
+    z1 = sum(1 for x in red if x <= 11)
+    z2 = sum(1 for x in red if 12 <= x <= 23)
+    odd = sum(1 for x in red if x % 2 == 1)
+    small = sum(1 for x in red if x <= 17)
+    return {
+        'red_sum': red_sum,
+        'sum_range': _sum_bucket_label(red_sum),
+        'zone_ratio': _zone_label(z1 * 6 + z2),
+        'odd_ratio': _ratio_label(odd),
+        'size_ratio': _ratio_label(small),
+    }
+
+
+class CategoryScoreCube:
+    """某一期（给定上两期开奖与转移表）下，按类别 ID 索引的动态评分"""
+
+    def __init__(self, red_table, last_red=None, prev2_red=None, tables=None):
+        self.last = draw_context(last_red)
+        # 上上期只在有上期时参与评分（与逐注评分逻辑一致）
+        self.prev2 = draw_context(prev2_red) if self.last is not None else None
+        t = red_table.category_tuples
+        last, prev2 = self.last, self.prev2
+
+        # 各分量只依赖签名中的一维或几维，先按分量自身的取值去重求值，再按类别组装
+        sums = {int(s): get_dynamic_sum_score(int(s), last['red_sum'] if last else None,
+                                              prev2['red_sum'] if prev2 else None, tables=tables)
+                for s in np.unique(t[:, 0])}
+        zones = {int(z): get_dynamic_zone_score(_zone_label(z), last['zone_ratio'] if last else None, tables=tables)
+                 for z in np.unique(t[:, 1])}
+        odds = {int(o): get_dynamic_odd_score(_ratio_label(o), last['odd_ratio'] if last else None,
+                                              prev2['odd_ratio'] if prev2 else None, tables=tables)
+                for o in np.unique(t[:, 2])}
+        sizes = {int(z): get_dynamic_size_score(_ratio_label(z), last['size_ratio'] if last else None,
+                                                prev2['size_ratio'] if prev2 else None, tables=tables)
+                 for z in np.unique(t[:, 3])}
+
+        combos = {}
+        if last is not None:
+            for bucket, zone, odd, size in {(_sum_bucket_label(s), z, o, sz) for s, z, o, sz in t.tolist()}:
+                curr = {'sum_range': bucket, 'zone_ratio': _zone_label(zone),
+                        'odd_ratio': _ratio_label(odd), 'size_ratio': _ratio_label(size)}
+                combos[(bucket, zone, odd, size)] = get_2d_combined_bonus(curr, last, tables=tables)
+
+        n = len(t)
+        self.scores = np.zeros(n)
+        # 理由分两段：和值理由（逐注评分中位于跨度之前）与其余动态理由
+        self.sum_reasons = []
+        self.other_reasons = []
+        for i, (s, z, o, sz) in enumerate(t.tolist()):
+            sum_score, sum_reason = sums[s]
+            zone_score, zone_reason = zones[z]
+            odd_score, odd_reason = odds[o]
+            size_score, size_reason = sizes[sz]
+            total = sum_score + zone_score + odd_score + size_score
+            reasons = [zone_reason, odd_reason, size_reason]
+            if last is not None:
+                combo_bonus, combo_reasons = combos[(_sum_bucket_label(s), z, o, sz)]
+                if combo_bonus > 0:
+                    total += combo_bonus
+                    reasons.extend(combo_reasons)
+            self.scores[i] = total
+            self.sum_reasons.append(sum_reason)
+            self.other_reasons.append(reasons)
+
+    def gather(self, categories):
+        """按类别 ID 数组一次取出动态评分"""
+        return self.scores[np.asarray(categories)]
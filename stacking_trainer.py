@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+逐号码 Stacking / 集成模型并行训练
+1. 特征矩阵只构建一次，所有号码的训练任务以只读方式共享（线程池，无需复制）
+2. 标签直接取自出号矩阵的列
+3. 每个号码使用确定的随机种子，结果与并行度、调度顺序无关
+4. 按模型族（XGBoost / LightGBM / RF / GB / Meta）累计耗时并输出报告
+5. 走查式回测的增量更新：XGBoost / LightGBM 在上一期模型上继续提升，随机森林滚动替换部分树
+"""
+
+import copy
+import os
+import time
+from collections import defaultdict
+
+import numpy as np
+
+# 基础种子沿用原实现的 42，号码 n 的种子为 BASE_SEED + 区域偏移 + n
+BASE_SEED = 42
+SEED_OFFSETS = {'red': 0, 'blue': 1000}
+
+# 基模型参数
+XGB_PARAMS = {'objective': 'binary:logistic', 'max_depth': 4, 'eta': 0.05, 'eval_metric': 'logloss'}
+XGB_ROUNDS = 60
+LGB_PARAMS = {'n_estimators': 60, 'max_depth': 4, 'learning_rate': 0.05}
+RF_PARAMS = {'n_estimators': 60, 'max_depth': 6}
+
+# 增量更新：每期追加的提升轮数 / 替换的森林树数
+UPDATE_ROUNDS = 3
+RF_REFRESH_TREES = 6
+
+
+def default_workers():
+    """训练并行度：环境变量 DLT_TRAIN_WORKERS，否则为 CPU 核数"""
+    try:
+        return max(1, int(os.environ.get('DLT_TRAIN_WORKERS', '')))
+    except ValueError:
+        return os.cpu_count() or 1
+
+
+def number_seed(target_key, n, base_seed=BASE_SEED):
+    return base_seed + SEED_OFFSETS.get(target_key, 0) + int(n)
+
+
+def fit_number_stack(X, y, seed, target_key=None):
+    """训练单个号码的 Stacking（XGBoost + LightGBM + RF → LogisticRegression）
+
+    Returns:
+        (models, timings): 模型字典与各模型族耗时（秒）
+    """
+    import xgboost as xgb
+    from lightgbm import LGBMClassifier
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+
+    timings = {}
+    # 并行在号码层面进行，单个模型固定单线程，避免线程超额订阅
+    t0 = time.time()
+    dtrain = xgb.DMatrix(X, label=y, nthread=1)
+    xgb_model = xgb.train(dict(XGB_PARAMS, seed=seed, nthread=1), dtrain, num_boost_round=XGB_ROUNDS, verbose_eval=False)
+    xgb_proba = xgb_model.predict(dtrain)
+    timings['xgb'] = time.time() - t0
+
+    t0 = time.time()
+    lgb_model = LGBMClassifier(**LGB_PARAMS, random_state=seed, n_jobs=1, verbose=-1)
+    lgb_model.fit(X, y)
+    lgb_proba = lgb_model.predict_proba(X)[:, 1]
+    timings['lgb'] = time.time() - t0
+
+    t0 = time.time()
+    rf_model = RandomForestClassifier(**RF_PARAMS, random_state=seed, n_jobs=1)
+    rf_model.fit(X, y)
+    rf_proba = rf_model.predict_proba(X)[:, 1]
+    timings['rf'] = time.time() - t0
+
+    t0 = time.time()
+    meta_X = np.column_stack([xgb_proba, lgb_proba, rf_proba])
+    meta_model = LogisticRegression(random_state=seed, max_iter=1000)
+    meta_model.fit(meta_X, y)
+    timings['meta'] = time.time() - t0
+
+    return {'xgb': xgb_model, 'lgb': lgb_model, 'rf': rf_model, 'meta': meta_model}, timings
+
+
+def update_number_stack(models, X, y, seed, target_key=None, rounds=UPDATE_ROUNDS, refresh_trees=RF_REFRESH_TREES):
+    """在已有单号码 Stacking 上增量更新（X / y 为截至当前期之前的全部训练行）
+
+    - XGBoost: 以旧模型为起点（xgb_model=）继续提升 rounds 轮
+    - LightGBM: 以旧 booster 为 init_model 继续提升 rounds 轮
+    - RF: warm_start 追加 refresh_trees 棵在新数据上训练的树，并淘汰同样数量的最旧树（规模不变）
+    - Meta: 在新的基模型输出上重新拟合（仅 3 维特征，开销很小）
+    """
+    import xgboost as xgb
+    from lightgbm import LGBMClassifier
+    from sklearn.linear_model import LogisticRegression
+
+    timings = {}
+    t0 = time.time()
+    dtrain = xgb.DMatrix(X, label=y, nthread=1)
+    xgb_model = xgb.train(dict(XGB_PARAMS, seed=seed, nthread=1), dtrain, num_boost_round=rounds,
+                          xgb_model=models['xgb'], verbose_eval=False)
+    xgb_proba = xgb_model.predict(dtrain)
+    timings['xgb'] = time.time() - t0
+
+    t0 = time.time()
+    lgb_model = LGBMClassifier(**dict(LGB_PARAMS, n_estimators=rounds), random_state=seed, n_jobs=1, verbose=-1)
+    lgb_model.fit(X, y, init_model=models['lgb'].booster_)
+    lgb_proba = lgb_model.predict_proba(X)[:, 1]
+    timings['lgb'] = time.time() - t0
+
+    t0 = time.time()
+    # 在副本上更新：warm_start 会原地追加树，失败时上一期模型（previous 仍引用）保持不变；
+    # 已训练的树本身不会被修改，浅复制对象并复制树列表即可
+    rf_model = copy.copy(models['rf'])
+    rf_model.estimators_ = list(rf_model.estimators_)
+    n_trees = len(rf_model.estimators_)
+    # 每次追加的树使用不同的随机状态，保证可复现且不与已有树重复
+    rf_model.set_params(warm_start=True, n_estimators=n_trees + refresh_trees, random_state=seed + len(y), n_jobs=1)
+    rf_model.fit(X, y)
+    rf_model.estimators_ = rf_model.estimators_[refresh_trees:]
+    rf_model.set_params(n_estimators=len(rf_model.estimators_), warm_start=False)
+    rf_proba = rf_model.predict_proba(X)[:, 1]
+    timings['rf'] = time.time() - t0
+
+    t0 = time.time()
+    meta_X = np.column_stack([xgb_proba, lgb_proba, rf_proba])
+    meta_model = LogisticRegression(random_state=seed, max_iter=1000)
+    meta_model.fit(meta_X, y)
+    timings['meta'] = time.time() - t0
+
+    return {'xgb': xgb_model, 'lgb': lgb_model, 'rf': rf_model, 'meta': meta_model}, timings
+
+
+def fit_number_ensemble(X, y, seed, target_key='red'):
+    """训练单个号码的 RF(+GB) 集成模型（供 _select_by_ensemble* 使用）"""
+    from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+
+    timings = {}
+    t0 = time.time()
+    if target_key == 'red':
+        rf = RandomForestClassifier(n_estimators=50, max_depth=5, random_state=seed, n_jobs=1)
+    else:
+        rf = RandomForestClassifier(n_estimators=30, max_depth=3, random_state=seed, n_jobs=1)
+    rf.fit(X, y)
+    timings['rf'] = time.time() - t0
+    models = {'rf': rf}
+    if target_key == 'red':
+        t0 = time.time()
+        gb = GradientBoostingClassifier(n_estimators=50, max_depth=3, random_state=seed)
+        gb.fit(X, y)
+        timings['gb'] = time.time() - t0
+        models['gb'] = gb
+    return models, timings
+
+
+def train_per_number(X, incidence, target_key, fit_fn=fit_number_stack, min_positive=5, workers=None,
+                     base_seed=BASE_SEED, previous=None, update_fn=update_number_stack, **fit_kwargs):
+    """按号码并行训练
+
+    Args:
+        X: 特征矩阵（所有任务共享，只读）
+        incidence: 出号矩阵 (N×号码数)，第 n-1 列即号码 n 的标签
+        target_key: 'red' / 'blue'（决定种子偏移）
+        fit_fn: 单号码训练函数 fit_fn(X, y, seed, target_key, **fit_kwargs) -> (models, timings)
+        min_positive: 正样本少于该值的号码跳过
+        workers: 并行线程数（默认 default_workers()）
+        previous: 上一期的 {号码: 模型字典}；提供时已有模型的号码走 update_fn 增量更新，其余号码完整训练
+
+    Returns:
+        (models_dict, report): {号码: 模型字典}，report 含各模型族累计耗时、墙钟时间与失败号码
+    """
+    from joblib import Parallel, delayed
+
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    X.setflags(write=False)
+    incidence = np.asarray(incidence)
+    workers = workers or default_workers()
+    numbers = [n for n in range(1, incidence.shape[1] + 1) if incidence[:, n - 1].sum() >= min_positive]
+
+    def _task(n):
+        y = incidence[:, n - 1].astype(np.int64)
+        seed = number_seed(target_key, n, base_seed)
+        try:
+            if previous and n in previous:
+                models, timings = update_fn(previous[n], X, y, seed, target_key)
+            else:
+                models, timings = fit_fn(X, y, seed, target_key, **fit_kwargs)
+            return n, models, timings, None
+        except Exception as e:
+            return n, None, {}, str(e)
+
+    t0 = time.time()
+    results = Parallel(n_jobs=workers, prefer='threads')(delayed(_task)(n) for n in numbers)
+
+    models_dict = {}
+    family_time = defaultdict(float)
+    failures = {}
+    for n, models, timings, error in results:
+        if error is not None:
+            failures[n] = error
+            continue
+        models_dict[n] = models
+        for family, seconds in timings.items():
+            family_time[family] += seconds
+    report = {
+        'target': target_key,
+        'workers': workers,
+        'numbers': len(models_dict),
+        'wall_time': time.time() - t0,
+        'family_time': dict(family_time),
+        'failures': failures
+    }
+    return models_dict, report
+
+
+FAMILY_NAMES = {'xgb': 'XGBoost', 'lgb': 'LightGBM', 'rf': 'RandomForest', 'gb': 'GradientBoosting', 'meta': 'Meta-LR'}
+
+
+def format_report(report):
+    """耗时报告文本（各模型族耗时为所有号码的累计值，墙钟为整批并行耗时）"""
+    families = ' | '.join(f"{FAMILY_NAMES.get(k, k)} {v:.1f}s" for k, v in report['family_time'].items())
+    return (f"{report['target']} {report['numbers']}个号码, {report['workers']}线程, "
+            f"墙钟 {report['wall_time']:.1f}s ({families})")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+启动耗时剖析
+1. timed(name) 记录各启动阶段（历史解析、模型制品打开、预测器构建等）的耗时
+2. lazy_import(name) 在首次真正需要时导入重型依赖（xgboost / lightgbm / sklearn / requests / bs4 ...），并记录导入耗时
+3. importtime_breakdown(target) 在子进程中以 python -X importtime 导入目标模块，按顶层包汇总自身耗时
+
+用法：
+    python startup_profile.py                 # 剖析 app 的导入
+    python startup_profile.py model_engine    # 剖析指定模块
+"""
+
+import importlib
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_EVENTS = []
+
+
+@contextmanager
+def timed(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _EVENTS.append((name, time.perf_counter() - t0))
+
+
+def lazy_import(name):
+    """导入模块；首次导入（不在 sys.modules 中）时记录耗时"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with timed(f'import {name}'):
+        return importlib.import_module(name)
+
+
+def events():
+    """已记录的 (阶段, 秒) 列表，按发生顺序"""
+    return list(_EVENTS)
+
+
+def report():
+    return [{'stage': name, 'seconds': round(seconds, 4)} for name, seconds in _EVENTS]
+
+
+def format_report(rows=None):
+    rows = report() if rows is None else rows
+    if not rows:
+        return "[*] 启动剖析: 暂无记录"
+    lines = ["[*] 启动剖析:"]
+    for r in rows:
+        lines.append(f"  - {r['stage']:<28} {r['seconds'] * 1000:>9.1f} ms")
+    return '\n'.join(lines)
+
+
+def importtime_breakdown(target='app', top=15):
+    """子进程中 `python -X importtime -c "import target"`，按顶层包汇总自身耗时（微秒）
+
+    Returns:
+        (total_us, [(包名, 自身耗时us), ...])，按耗时降序取前 top 个
+    """
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {target}'],
+                          cwd=cwd, capture_output=True, text=True)
+    per_package = defaultdict(int)
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        self_us, cumulative_us, name = int(parts[0]), int(parts[1]), parts[2].strip()
+        per_package[name.split('.')[0]] += self_us
+        # 目标模块本身位于最外层（名称前只有一个空格），其累计耗时即总耗时
+        if parts[2].rstrip() == f' {target}':
+            total = cumulative_us
+    if not total:
+        total = sum(per_package.values())
+    return total, sorted(per_package.items(), key=lambda x: x[1], reverse=True)[:top]
+
+
+def format_breakdown(target='app', top=15):
+    total, rows = importtime_breakdown(target, top)
+    lines = [f"[*] import {target}: {total / 1000:.1f} ms"]
+    for package, us in rows:
+        lines.append(f"  - {package:<28} {us / 1000:>9.1f} ms  {us / total * 100 if total else 0:>5.1f}%")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    print(format_breakdown(sys.argv[1] if len(sys.argv) > 1 else 'app'))
@@ -424,6 +424,7 @@ function updateLiveStats(data) {
             <div class="stat-item"><div class="stat-value">${data.current_avg_red}</div><div class="stat-label">平均红球命中</div></div>
             <div class="stat-item"><div class="stat-value">${data.current_avg_blue}</div><div class="stat-label">平均蓝球命中</div></div>
             <div class="stat-item"><div class="stat-value">${data.current_core_cov.toFixed(1)}%</div><div class="stat-label">核心覆盖率</div></div>
+            <div class="stat-item"><div class="stat-value">${(data.current_return_rate || 0).toFixed(1)}%</div><div class="stat-label">奖金回报率</div></div>
         </div>
     `;
 }
@@ -0,0 +1,48 @@
+"""并行回测：多个 worker 进程同时为各期打注册表标签，全部保留"""
+
+import os
+
+import pytest
+
+from backtest_engine import run_backtest
+from model_engine import ENSEMBLE_AVAILABLE, DaletouPredictor
+
+HISTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'daletou_history_full.txt')
+
+
+@pytest.mark.skipif(not ENSEMBLE_AVAILABLE, reason='需要 scikit-learn')
+def test_parallel_backtest_keeps_every_period_tag(tmp_path):
+    predictor = DaletouPredictor(history_path=HISTORY)
+    predictor.assets_dir = str(tmp_path)
+    predictor.autosave = False
+    predictor.model_mode = 'forest'
+    predictor._build_multilabel_model(predictor.history_df)
+    latest = predictor.save_state()
+
+    periods = [int(p) for p in predictor.history_df['period'].iloc[-24:]]
+    results = list(run_backtest(predictor.history_df, periods, model_mode='forest', assets_dir=str(tmp_path),
+                                train_ensemble=False, workers=3, predict_mode='batch'))
+
+    assert [int(r['period']) for r in results] == periods
+    assert all(r['model_state'] == latest for r in results)
+    assert all(predictor.registry.digest(p) == latest for p in periods)
+
+
+@pytest.mark.skipif(not ENSEMBLE_AVAILABLE, reason='需要 scikit-learn')
+def test_parallel_rerun_reuses_every_period(tmp_path):
+    predictor = DaletouPredictor(history_path=HISTORY)
+    predictor.assets_dir = str(tmp_path)
+    predictor.autosave = False
+    predictor.model_mode = 'forest'
+    predictor._build_multilabel_model(predictor.history_df)
+    predictor.save_state()
+
+    start, end = predictor.history_df['period'].iloc[-12], predictor.history_df['period'].iloc[-1]
+    kwargs = dict(train_ensemble=False, workers=3, predict_mode='batch')
+    first = list(predictor.iter_validation(start, end, **kwargs))
+    second = list(predictor.iter_validation(start, end, **kwargs))
+
+    assert len(first) == len(second) == 12
+    assert not any(r.get('cached') for r in first)
+    assert all(r.get('cached') for r in second)
+    assert [r['tickets'] for r in first] == [r['tickets'] for r in second]
@@ -0,0 +1,60 @@
+"""模型注册表：多进程并发写入 index.json 不丢失标签 / 对象"""
+
+import multiprocessing as mp
+import os
+
+from model_registry import ModelRegistry
+
+
+def _save(registry, value, tags=()):
+    return registry.save({'weights': ('json', {'value': value})}, {'value': value}, {'value': value}, tags=tags)
+
+
+def _tag_worker(root, worker, digest, count):
+    registry = ModelRegistry(root)
+    for k in range(count):
+        registry.tag(f'{worker}-{k}', digest)
+        assert registry.resolve('latest') is not None
+
+
+def _save_worker(root, worker, count):
+    registry = ModelRegistry(root)
+    for k in range(count):
+        _save(registry, f'{worker}-{k}', tags=(f'{worker}-{k}',))
+
+
+def _run(target, args_list):
+    ctx = mp.get_context('spawn')
+    procs = [ctx.Process(target=target, args=args) for args in args_list]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+
+
+def test_concurrent_tags_survive(tmp_path):
+    root = str(tmp_path / 'registry')
+    digest = _save(ModelRegistry(root), 'base', tags=('latest',))
+    _run(_tag_worker, [(root, w, digest, 40) for w in range(8)])
+    tags = {e['hash']: e['tags'] for e in ModelRegistry(root).entries()}[digest]
+    assert len(tags) == 8 * 40 + 1
+
+
+def test_concurrent_saves_are_indexed(tmp_path):
+    root = str(tmp_path / 'registry')
+    _run(_save_worker, [(root, w, 5) for w in range(4)])
+    registry = ModelRegistry(root)
+    entries = registry.entries()
+    assert len(entries) == 20
+    assert sorted(os.listdir(registry.objects_dir)) == sorted(e['hash'] for e in entries)
+    assert all(registry.digest(f'{w}-{k}') for w in range(4) for k in range(5))
+
+
+def test_resolve_does_not_rewrite_index(tmp_path):
+    root = str(tmp_path / 'registry')
+    registry = ModelRegistry(root)
+    _save(registry, 'base', tags=('latest',))
+    before = os.stat(registry.index_path).st_mtime_ns
+    assert registry.resolve('latest') is not None
+    assert os.stat(registry.index_path).st_mtime_ns == before
@@ -0,0 +1,46 @@
+"""predict 生成模式：batch 与 exhaustive 结果一致，未知模式报错"""
+
+import os
+
+import pytest
+
+from model_engine import DaletouPredictor
+
+HISTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'daletou_history_full.txt')
+
+
+@pytest.fixture(scope='module')
+def predictor(tmp_path_factory):
+    predictor = DaletouPredictor(history_path=HISTORY)
+    predictor.assets_dir = str(tmp_path_factory.mktemp('assets'))
+    predictor.autosave = False
+    predictor.is_trained = True
+    predictor.components.ensure_all(('markov', 'patterns', 'dynamic_weights'))
+    return predictor
+
+
+def _tickets(predictor, mode, **kwargs):
+    period = str(int(predictor.history_df['period'].iloc[-1]) + 1)
+    return [(c['red'], c['blue'], c['score']) for c in predictor.predict(period, n_compound=0, mode=mode, **kwargs)]
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(must_red=[3, 17, 22, 30], n_combinations=10),
+    dict(must_red=[3, 17, 22, 30], n_combinations=20, is_backtest=True),
+])
+def test_batch_matches_exhaustive(predictor, kwargs):
+    exhaustive = _tickets(predictor, 'exhaustive', **kwargs)
+    assert exhaustive
+    assert _tickets(predictor, 'batch', **kwargs) == exhaustive
+
+
+def test_unknown_mode_raises(predictor):
+    with pytest.raises(ValueError):
+        _tickets(predictor, 'fast')
+
+
+def test_predict_endpoint_rejects_unknown_mode():
+    from app import app
+    response = app.test_client().post('/api/predict', json={'period': '26001', 'mode': 'fast'})
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
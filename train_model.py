@@ -73,13 +73,13 @@ def train_model():
             print()
             
             # 检查模型文件
-            model_file = 'model_assets/model_state_latest.pkl'
-            if os.path.exists(model_file):
-                file_size = os.path.getsize(model_file) / 1024 / 1024  # MB
-                print(f"💾 模型文件: {model_file}")
+            model_file = predictor.registry.resolve('latest')
+            if model_file:
+                file_size = sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(model_file) for f in fs) / 1024 / 1024  # MB
+                print(f"💾 模型目录: {model_file}")
                 print(f"📦 文件大小: {file_size:.2f} MB")
             else:
-                print(f"⚠️  警告: 模型文件未找到 {model_file}")
+                print(f"⚠️  警告: 模型注册表中未找到 latest 状态")
             
             print()
             print("=" * 80)
@@ -89,8 +89,8 @@ def train_model():
             print("V12.4 动态评分系统说明:")
             print("  1. 评分逻辑已集成到 model_engine.py 中")
             print("  2. 动态评分配置文件: dynamic_scoring_rules.py")
-            print("  3. 2维组合转移概率: 2d_combined_transitions.json")
-            print("  4. 基于2831期全量历史数据统计")
+            print("  3. 转移概率表: transition_tables.py（根据历史数据自动生成）")
+            print("  4. 基于全量历史数据统计，历史更新后自动重建")
             print()
             print("可以开始预测了！")
             print("=" * 80)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+命名训练组件与依赖跟踪
+1. 每个组件登记构建函数与依赖组件，ensure() 时先确保依赖，再按需构建自身
+2. 组件记录构建时的历史版本（历史哈希）：
+   - fresh:  已构建，且历史未变化
+   - stale:  已构建（或从磁盘恢复），但历史已变化
+   - absent: 从未构建 / 恢复，或被作废（作废组件时连带作废依赖它的组件）
+3. 从模型状态文件恢复的组件通过 mark_built() 登记，不触发重新训练
+4. 构建函数返回 False（条件不满足）时按当前历史版本记录失败，历史变化前不再重试
+5. 登记了 refit_every 的组件：当前历史是构建时历史的延续、且新增期数少于 refit_every 时沿用 stale 的构建结果
+   （回测逐期推进时不必每期重训，也不会用到目标期之后的数据）
+"""
+
+import time
+
+FRESH = 'fresh'
+STALE = 'stale'
+ABSENT = 'absent'
+
+
+class ComponentRegistry:
+    """训练组件注册表
+
+    version_fn 返回当前历史版本，period_fn 返回当前最新期号；
+    rows_fn 返回当前历史期数，prefix_version_fn(n) 返回当前历史前 n 期的版本（用于 refit_every 的延续判断）
+    """
+
+    def __init__(self, version_fn, period_fn=None, rows_fn=None, prefix_version_fn=None):
+        self._version_fn = version_fn
+        self._period_fn = period_fn
+        self._rows_fn = rows_fn
+        self._prefix_version_fn = prefix_version_fn
+        self._components = {}
+        self._records = {}
+        self._failures = {}
+
+    def register(self, name, build_fn, deps=(), lazy=False, label='', refit_every=0):
+        """登记组件；lazy=True 仅作标记（不参与默认训练、由使用方 ensure() 按需构建的组件）；
+        refit_every > 0 时历史延续不足 refit_every 期沿用上次构建"""
+        for dep in deps:
+            if dep not in self._components:
+                raise ValueError(f"组件 {name} 依赖未登记的组件: {dep}")
+        self._components[name] = {'build': build_fn, 'deps': tuple(deps), 'lazy': lazy, 'label': label or name,
+                                  'refit_every': refit_every}
+
+    @property
+    def names(self):
+        return list(self._components)
+
+    def status(self, name, _version=None):
+        record = self._records.get(name)
+        if record is None:
+            return ABSENT
+        version = self._version_fn() if _version is None else _version
+        return FRESH if record['version'] == version else STALE
+
+    def ensure(self, name):
+        """确保组件为 fresh（必要时先构建依赖），返回组件是否已可用"""
+        component = self._components[name]
+        if self._reusable(name):
+            return True
+        for dep in component['deps']:
+            self.ensure(dep)
+        version = self._version_fn()
+        if self.status(name, version) == FRESH:
+            return True
+        if self._failures.get(name) == version:
+            return False
+        t0 = time.time()
+        result = component['build']()
+        # 构建函数返回 False 表示条件不满足（如依赖库缺失、数据不足），不登记为已构建
+        if result is False:
+            self._failures[name] = version
+            return False
+        self._failures.pop(name, None)
+        period = self._period_fn() if self._period_fn else None
+        rows = self._rows_fn() if self._rows_fn else None
+        self._record(name, version, period, 'train', time.time() - t0, rows)
+        return True
+
+    def _reusable(self, name):
+        """stale 组件能否沿用：登记了 refit_every，当前历史是构建时历史的延续，且新增期数少于 refit_every"""
+        refit_every = self._components[name]['refit_every']
+        record = self._records.get(name)
+        if not refit_every or record is None or record['rows'] is None or self._rows_fn is None:
+            return False
+        added = self._rows_fn() - record['rows']
+        return 0 < added < refit_every and self._prefix_version_fn(record['rows']) == record['version']
+
+    def ensure_all(self, names):
+        for name in names:
+            self.ensure(name)
+
+    def mark_built(self, name, version=None, period=None, source='load'):
+        """登记从磁盘恢复的组件；version 与当前历史不一致时该组件为 stale"""
+        self._record(name, version, period, source)
+
+    def invalidate(self, name=None):
+        """作废组件记录（连同依赖它的组件）；name 为 None 时作废全部"""
+        if name is None:
+            self._records.clear()
+            self._failures.clear()
+            return
+        self._records.pop(name, None)
+        self._failures.pop(name, None)
+        for other, component in self._components.items():
+            if name in component['deps'] and other in self._records:
+                self.invalidate(other)
+
+    def report(self):
+        """各组件状态：{组件: {status, label, lazy, period, source, duration}}"""
+        version = self._version_fn()
+        out = {}
+        for name, component in self._components.items():
+            record = self._records.get(name) or {}
+            out[name] = {
+                'status': self.status(name, version),
+                'label': component['label'],
+                'lazy': component['lazy'],
+                'period': record.get('period'),
+                'source': record.get('source'),
+                'duration': round(record['duration'], 2) if record.get('duration') is not None else None
+            }
+        return out
+
+    def _record(self, name, version, period, source, duration=None, rows=None):
+        self._records[name] = {
+            'version': version,
+            'period': period,
+            'duration': duration,
+            'source': source,
+            'rows': rows
+        }
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+动态评分转移表构建（替代 dynamic_scoring_rules 中手工维护的常量与 2d_combined_transitions.json）
+1. 从列式历史数据一次向量化计算全部单维度 / 2 维组合转移概率
+2. 以类别 ID 为下标存为紧凑数组，并以历史数据哈希为键缓存，历史更新后自动重建
+"""
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from history_arrays import HistoryArrays
+
+# 单维度规则的和值区间（闭区间），其余归为 other
+SUM_RANGE_LABELS = ('40-60', '61-80', '81-100', '101-120', '121-140', '141-160', 'other')
+SUM_RANGE_BOUNDS = ((40, 60), (61, 80), (81, 100), (101, 120), (121, 140), (141, 160))
+# 2 维组合规则的和值区间
+SUM_BUCKET_EDGES = (70, 90, 110, 130)
+SUM_BUCKET_LABELS = ('<70', '70-90', '90-110', '110-130', '130+')
+
+# 单维度表保留每个状态概率最高的前 3 个后继（与原手工表一致）
+SINGLE_TOP_K = 3
+# 2 维组合表保留前 5 个且概率 >= 10% 的后继（与原分析脚本导出规则一致）
+COMBINED_TOP_K = 5
+COMBINED_MIN_PROB = 0.10
+# 状态样本数低于该值时不参与动态评分
+MIN_SAMPLES = 20
+
+
+def _ratio_labels():
+    return tuple(f"{i}:{5 - i}" for i in range(6))
+
+
+def _zone_labels():
+    labels = []
+    for i in range(36):
+        z1, z2 = divmod(i, 6)
+        labels.append(f"{z1}:{z2}:{5 - z1 - z2}" if z1 + z2 <= 5 else None)
+    return tuple(labels)
+
+
+# 类别编码: 名称 -> 标签元组（下标即类别 ID，None 表示不可能出现的 ID）
+CATEGORY_LABELS = {
+    'sum_range': SUM_RANGE_LABELS,
+    'sum_bucket': SUM_BUCKET_LABELS,
+    'zone_ratio': _zone_labels(),
+    'odd_ratio': _ratio_labels(),
+    'size_ratio': _ratio_labels(),
+}
+CATEGORY_IDS = {
+    name: {label: i for i, label in enumerate(labels) if label is not None}
+    for name, labels in CATEGORY_LABELS.items()
+}
+
+# 2 维组合: 名称 -> (维度1, 维度2)
+COMBINED_DIMENSIONS = OrderedDict([
+    ('和值区间+区间比', ('sum_bucket', 'zone_ratio')),
+    ('和值区间+奇偶比', ('sum_bucket', 'odd_ratio')),
+    ('和值区间+大小比', ('sum_bucket', 'size_ratio')),
+    ('区间比+奇偶比', ('zone_ratio', 'odd_ratio')),
+    ('区间比+大小比', ('zone_ratio', 'size_ratio')),
+    ('奇偶比+大小比', ('odd_ratio', 'size_ratio')),
+])
+
+
+def encode_red_categories(red):
+    """将红球数组 (M×5) 编码为各类别 ID 数组"""
+    red = np.asarray(red, dtype=np.int16).reshape(-1, 5)
+    red_sum = red.sum(axis=1)
+    sum_range = np.full(len(red), len(SUM_RANGE_BOUNDS), dtype=np.int64)
+    for i, (lo, hi) in enumerate(SUM_RANGE_BOUNDS):
+        sum_range[(red_sum >= lo) & (red_sum <= hi)] = i
+    z1 = (red <= 11).sum(axis=1)
+    z2 = ((red >= 12) & (red <= 23)).sum(axis=1)
+    return {
+        'sum_range': sum_range,
+        'sum_bucket': np.searchsorted(SUM_BUCKET_EDGES, red_sum, side='right').astype(np.int64),
+        'zone_ratio': (z1 * 6 + z2).astype(np.int64),
+        'odd_ratio': (red % 2 == 1).sum(axis=1).astype(np.int64),
+        'size_ratio': (red <= 17).sum(axis=1).astype(np.int64),
+    }
+
+
+def category_id(name, label):
+    """标签 → 类别 ID（未知标签返回 None）"""
+    if label is None:
+        return None
+    return CATEGORY_IDS[name].get(label)
+
+
+def _transition_table(prev_ids, next_ids, n_states, top_k, min_prob=0.0):
+    """统计转移概率矩阵，并标记每行参与评分的后继（前 top_k 且概率 >= min_prob，样本数足够）"""
+    counts = np.bincount(prev_ids * n_states + next_ids, minlength=n_states * n_states).reshape(n_states, n_states)
+    totals = counts.sum(axis=1, keepdims=True)
+    probs = np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0)
+    mask = np.zeros(counts.shape, dtype=bool)
+    top = np.argsort(-counts, axis=1, kind='stable')[:, :top_k]
+    np.put_along_axis(mask, top, True, axis=1)
+    mask &= (counts > 0) & (probs >= min_prob) & (totals >= MIN_SAMPLES)
+    return probs.astype(np.float32), mask
+
+
+class TransitionTables:
+    """按类别 ID 索引的转移概率表集合"""
+
+    def __init__(self, history_hash=None):
+        self.history_hash = history_hash
+        self.periods = 0
+        # 名称 -> (probs[上期ID, 本期ID], mask[上期ID, 本期ID])
+        self.single = {}
+        self.combined = {}
+
+    @classmethod
+    def build(cls, arrays):
+        """一次向量化遍历由 HistoryArrays 构建全部转移表"""
+        tables = cls(arrays.history_hash)
+        tables.periods = len(arrays)
+        if len(arrays) < 2:
+            return tables
+        cats = encode_red_categories(arrays.red)
+        for name in ('sum_range', 'zone_ratio', 'odd_ratio', 'size_ratio'):
+            ids = cats[name]
+            tables.single[name] = _transition_table(ids[:-1], ids[1:], len(CATEGORY_LABELS[name]), SINGLE_TOP_K)
+        for combo_name, (d1, d2) in COMBINED_DIMENSIONS.items():
+            n2 = len(CATEGORY_LABELS[d2])
+            ids = cats[d1] * n2 + cats[d2]
+            n_states = len(CATEGORY_LABELS[d1]) * n2
+            tables.combined[combo_name] = _transition_table(
+                ids[:-1], ids[1:], n_states, COMBINED_TOP_K, COMBINED_MIN_PROB)
+        return tables
+
+    def single_prob(self, name, last_id, curr_id):
+        """单维度转移概率；状态不在表中或后继未入选时返回 None"""
+        if name not in self.single or last_id is None or curr_id is None:
+            return None
+        probs, mask = self.single[name]
+        return float(probs[last_id, curr_id]) if mask[last_id, curr_id] else None
+
+    def has_state(self, name, last_id):
+        return name in self.single and last_id is not None and bool(self.single[name][1][last_id].any())
+
+    def combined_prob(self, combo_name, last_ids, curr_ids):
+        """2 维组合转移概率；last_ids / curr_ids 为 (维度1 ID, 维度2 ID)"""
+        if combo_name not in self.combined or None in last_ids or None in curr_ids:
+            return None
+        n2 = len(CATEGORY_LABELS[COMBINED_DIMENSIONS[combo_name][1]])
+        last_state = last_ids[0] * n2 + last_ids[1]
+        curr_state = curr_ids[0] * n2 + curr_ids[1]
+        probs, mask = self.combined[combo_name]
+        return float(probs[last_state, curr_state]) if mask[last_state, curr_state] else None
+
+
+_TABLE_CACHE = OrderedDict()
+_TABLE_CACHE_SIZE = 8
+
+
+def get_transition_tables(arrays):
+    """按历史哈希获取转移表，哈希变化时重建"""
+    key = arrays.history_hash
+    tables = _TABLE_CACHE.get(key)
+    if tables is None:
+        tables = TransitionTables.build(arrays)
+        _TABLE_CACHE[key] = tables
+        while len(_TABLE_CACHE) > _TABLE_CACHE_SIZE:
+            _TABLE_CACHE.popitem(last=False)
+    else:
+        _TABLE_CACHE.move_to_end(key)
+    return tables
+
+
+_DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'daletou_history_full.txt')
+_default_state = {'mtime': None, 'tables': None}
+
+
+def get_default_tables(history_path=_DEFAULT_HISTORY):
+    """基于完整历史文件的转移表（文件变化后自动重建）；文件缺失时返回空表"""
+    mtime = os.path.getmtime(history_path) if os.path.exists(history_path) else None
+    if _default_state['tables'] is None or _default_state['mtime'] != mtime:
+        if mtime is None:
+            _default_state['tables'] = TransitionTables()
+        else:
+            with open(history_path, 'r', encoding='utf-8') as f:
+                _default_state['tables'] = get_transition_tables(HistoryArrays.from_text(f.read()))
+        _default_state['mtime'] = mtime
+    return _default_state['tables']